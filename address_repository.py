@@ -0,0 +1,213 @@
+from typing import TYPE_CHECKING, Any, Iterable, Sequence, Union
+from uuid import uuid4
+
+from sqlalchemy import Column, DateTime, ForeignKey, Index, String, delete, insert, literal, select, update
+from sqlalchemy.dialects.mysql import DATETIME as MYSQL_DATETIME
+from sqlalchemy.orm import Session
+
+from customer_repository import Customer, CustomerNotFound, _utcnow, lookup_chunk_size
+from db import Base
+from models.address import AddressCreate, AddressRead, AddressUpdate
+from models.customer import CustomerRead, CustomerWithAddresses
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+# Related data a customer read can embed with `include=`
+CUSTOMER_INCLUDES = ("addresses",)
+
+
+class AddressNotFound(Exception):
+    pass
+
+
+_timestamp = DateTime(timezone=True).with_variant(MYSQL_DATETIME(timezone=True, fsp=6), "mysql")
+
+
+class Address(Base):
+    __tablename__ = "addresses"
+    __table_args__ = (
+        # A customer's addresses, and a page of customers' (IN), in order
+        Index("ix_addresses_university_id_created_at", "university_id", "created_at"),
+    )
+
+    address_id = Column(String(36), primary_key=True)
+    university_id = Column(
+        String(32), ForeignKey("customers.university_id", ondelete="CASCADE"), nullable=False
+    )
+
+    street = Column(String(255), nullable=False)
+    city = Column(String(100), nullable=False)
+    state = Column(String(100), nullable=False)
+    postal_code = Column(String(20), nullable=False)
+    country = Column(String(100), nullable=False)
+
+    # Set here and returned as written, so microseconds on MySQL too
+    created_at = Column(_timestamp, nullable=False)
+    updated_at = Column(_timestamp, nullable=False)
+
+
+class AddressRepository:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _to_read_model(self, a) -> AddressRead:
+        return AddressRead(
+            address_id=a.address_id,
+            street=a.street,
+            city=a.city,
+            state=a.state,
+            postal_code=a.postal_code,
+            country=a.country,
+            created_at=a.created_at,
+            updated_at=a.updated_at,
+        )
+
+    def list_for_customer(self, university_id: str) -> list[AddressRead]:
+        rows = self.db.execute(_select_for_customers([university_id])).all()
+        if not rows and self.db.execute(_select_customer(university_id)).first() is None:
+            raise CustomerNotFound("Customer not found")
+        return [self._to_read_model(row) for row in rows]
+
+    def for_customers(self, university_ids: Iterable[str]) -> dict[str, list[AddressRead]]:
+        """Addresses of many customers, one `IN (...)` query per
+        lookup_chunk_size ids instead of one per customer. Customers without
+        addresses map to an empty list."""
+        found: dict[str, list[AddressRead]] = {
+            _canonical_id(university_id): [] for university_id in university_ids
+        }
+        pending = list(found)
+        for start in range(0, len(pending), lookup_chunk_size):
+            for row in self.db.execute(_select_for_customers(pending[start:start + lookup_chunk_size])):
+                found[_canonical_id(row.university_id)].append(self._to_read_model(row))
+        return found
+
+    def create(self, university_id: str, address_in: AddressCreate) -> AddressRead:
+        # INSERT ... SELECT from customers: no row (and no separate existence
+        # check) if the customer doesn't exist
+        values = _new_row(address_in)
+        result = self.db.execute(_insert_for_customer(university_id, values))
+        if result.rowcount == 0:
+            self.db.rollback()
+            raise CustomerNotFound("Customer not found")
+        self.db.commit()
+        return AddressRead.model_validate(values)
+
+    def update(self, university_id: str, address_id: str, update_in: AddressUpdate) -> AddressRead:
+        result = self.db.execute(_update_statement(university_id, address_id, update_in))
+        if result.rowcount == 0:
+            self.db.rollback()
+            raise AddressNotFound("Address not found")
+        row = self.db.execute(_select_address(university_id, address_id)).first()
+        self.db.commit()
+        return self._to_read_model(row)
+
+    def delete(self, university_id: str, address_id: str) -> None:
+        result = self.db.execute(_delete_statement(university_id, address_id))
+        if result.rowcount == 0:
+            self.db.rollback()
+            raise AddressNotFound("Address not found")
+        self.db.commit()
+
+
+def _new_row(address_in: AddressCreate) -> dict[str, Any]:
+    now = _utcnow()
+    return {**address_in.model_dump(), "address_id": str(uuid4()), "created_at": now, "updated_at": now}
+
+
+def _select_addresses():
+    # Plain row tuples, as in customer_repository
+    return select(*Address.__table__.columns)
+
+
+def _select_for_customers(university_ids: Sequence[str]):
+    return (
+        _select_addresses()
+        .where(Address.university_id.in_(list(university_ids)))
+        .order_by(Address.university_id, Address.created_at, Address.address_id)
+    )
+
+
+def _select_address(university_id: str, address_id: str):
+    return _select_addresses().where(Address.address_id == address_id, Address.university_id == university_id)
+
+
+def _select_customer(university_id: str):
+    return select(Customer.university_id).where(Customer.university_id == university_id)
+
+
+def _canonical_id(university_id: str) -> str:
+    # Rows written before keys were canonicalized (see `migrations.py
+    # fold-keys`) can hold "abc123", which MySQL's collation still matches
+    # to "ABC123"
+    return university_id.upper()
+
+
+def _insert_for_customer(university_id: str, values: dict[str, Any]):
+    # The canonical id passed in, not the customer row's: that may be a
+    # legacy spelling of it
+    names = list(values)
+    source = select(literal(university_id), *(literal(values[name]) for name in names)).where(
+        Customer.university_id == university_id
+    )
+    return insert(Address).from_select(["university_id", *names], source)
+
+
+def _update_statement(university_id: str, address_id: str, update_in: AddressUpdate):
+    data = update_in.model_dump(exclude_unset=True)
+    data["updated_at"] = _utcnow()
+    return (
+        update(Address)
+        .where(Address.address_id == address_id, Address.university_id == university_id)
+        .values(**data)
+    )
+
+
+def _delete_statement(university_id: str, address_id: str):
+    return delete(Address).where(Address.address_id == address_id, Address.university_id == university_id)
+
+
+def customer_ids(customers: Iterable[Union[CustomerRead, dict[str, Any]]]) -> list[str]:
+    return [c["university_id"] if isinstance(c, dict) else c.university_id for c in customers]
+
+
+def with_addresses(
+    customers: Sequence[Union[CustomerRead, dict[str, Any]]], addresses: dict[str, list[AddressRead]]
+) -> list[Union[CustomerWithAddresses, dict[str, Any]]]:
+    """Customers (models, or projected dicts that include university_id)
+    with their addresses embedded."""
+    embedded = []
+    for customer in customers:
+        if isinstance(customer, dict):
+            # Projected straight from the row: university_id as stored
+            embedded.append(
+                {**customer, "addresses": addresses.get(_canonical_id(customer["university_id"]), [])}
+            )
+        else:
+            # Already validated: copy the fields over without re-validating
+            embedded.append(
+                CustomerWithAddresses.model_construct(
+                    **dict(customer), addresses=addresses.get(customer.university_id, [])
+                )
+            )
+    return embedded
+
+
+class AsyncAddressRepository:
+    """Async mirror of AddressRepository's reads, used by the async route variants."""
+
+    def __init__(self, db: "AsyncSession"):
+        self.db = db
+
+    _to_read_model = AddressRepository._to_read_model
+
+    async def for_customers(self, university_ids: Iterable[str]) -> dict[str, list[AddressRead]]:
+        found: dict[str, list[AddressRead]] = {
+            _canonical_id(university_id): [] for university_id in university_ids
+        }
+        pending = list(found)
+        for start in range(0, len(pending), lookup_chunk_size):
+            result = await self.db.execute(_select_for_customers(pending[start:start + lookup_chunk_size]))
+            for row in result:
+                found[_canonical_id(row.university_id)].append(self._to_read_model(row))
+        return found
@@ -0,0 +1,91 @@
+"""Checks that include=addresses costs a constant number of queries per request.
+
+Seeds --rows customers with --addresses each on the SQLite stand-in, then
+counts the statements behind GET /customers?include=addresses and
+POST /customers:lookup?include=addresses at several page sizes (cache
+disabled). Fails (exit 1) if the count grows with the page size, i.e. if
+addresses are loaded per customer instead of with one IN query.
+
+    python -m benchmarks.address_queries [--rows 1000] [--sizes 1 10 100 1000]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--addresses", type=int, default=2, help="addresses per customer")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000], help="page sizes (<= 1000)")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SCHEMA_INIT", "skip")
+    # The routes' sessions are overridden; this only keeps the default
+    # engines from needing the MySQL drivers
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+    import httpx
+
+    from address_repository import AddressRepository
+    from benchmarks.common import synthetic_university_id
+    from benchmarks.load_test import setup_in_process
+    from models.address import AddressCreate
+
+    app, counter, dispose = setup_in_process(rows=args.rows, no_cache=True)
+    import main as service
+
+    # The stand-in's read session is the seeded database itself
+    with service.read_session(primary=True) as db:
+        repo = AddressRepository(db)
+        for i in range(args.rows):
+            for n in range(args.addresses):
+                repo.create(
+                    synthetic_university_id(i),
+                    AddressCreate(street=f"{n} Main St", city="New York", state="NY", postal_code="10027", country="USA"),
+                )
+
+    async def count(client, method: str, path: str, body=None) -> tuple[int, int]:
+        counter.reset()
+        response = await client.request(method, path, json=body)
+        assert response.status_code == 200, response.text
+        data = response.json()
+        customers = data["items"] if "items" in data else data["customers"]
+        assert all(len(c["addresses"]) == args.addresses for c in customers)
+        return len(customers), counter.statements
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        results = []
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                for size in args.sizes:
+                    ids = [synthetic_university_id(i) for i in range(min(size, args.rows))]
+                    results.append(
+                        (
+                            size,
+                            await count(client, "GET", f"/customers?include=addresses&limit={size}"),
+                            await count(client, "POST", "/customers:lookup?include=addresses", {"university_ids": ids}),
+                        )
+                    )
+        finally:
+            await dispose()
+        return results
+
+    results = asyncio.run(run())
+    print(f"{'page size':>10}{'list queries':>14}{'lookup queries':>16}{'per-customer loading':>22}")
+    for size, (customers, list_queries), (_, lookup_queries) in results:
+        print(f"{size:>10}{list_queries:>14}{lookup_queries:>16}{1 + customers:>22}")
+
+    list_counts = {list_queries for _, (_, list_queries), _ in results}
+    lookup_counts = {lookup_queries for _, _, (_, lookup_queries) in results}
+    if len(list_counts) > 1 or len(lookup_counts) > 1:
+        print("FAIL  query count depends on the page size")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
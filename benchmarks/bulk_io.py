@@ -0,0 +1,150 @@
+"""Throughput and memory of customers_io import/export on a synthetic file.
+
+Writes --rows synthetic customers to a CSV (or NDJSON) file, imports it into
+a SQLite stand-in with customers_io.import_file, stopping once halfway and
+resuming from the checkpoint, then exports the table back out. It reports
+rows/s and resident memory along the way, next to one CustomerRepository.create
+per row (what loading through POST /customers costs before HTTP). Fails
+(exit 1) if a row is lost or duplicated, or if memory grows with the row count.
+
+    python -m benchmarks.bulk_io [--rows 1000000] [--format csv] [--chunk-size 1000]
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+# Memory growth allowed between 10% and 100% of a run
+MAX_GROWTH_MIB = 64
+
+
+def rss_mib() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def write_file(path: str, fmt: str, rows: int) -> None:
+    from benchmarks.common import synthetic_customer
+
+    with open(path, "w", newline="") as f:
+        if fmt == "csv":
+            writer = csv.DictWriter(f, fieldnames=list(synthetic_customer(0)))
+            writer.writeheader()
+            writer.writerows(synthetic_customer(i) for i in range(rows))
+        else:
+            for i in range(rows):
+                f.write(json.dumps(synthetic_customer(i)) + "\n")
+
+
+class Interrupted(Exception):
+    pass
+
+
+class Recorder:
+    """Progress callback: samples memory, optionally stops the run."""
+
+    def __init__(self, rows: int, stop_at: int = 0):
+        self.rows = rows
+        self.stop_at = stop_at
+        self.samples: list[tuple[int, float]] = []
+
+    def __call__(self, state, final=False):
+        self.samples.append((state["records"], rss_mib()))
+        if self.stop_at and state["records"] >= self.stop_at:
+            self.stop_at = 0
+            raise Interrupted
+
+    def growth(self) -> float:
+        # From the first sample past 10% of the rows to the end
+        start = next((rss for records, rss in self.samples if records >= self.rows // 10), self.samples[0][1])
+        return max(rss for _, rss in self.samples) - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--format", choices=("csv", "ndjson"), default="csv")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--per-row-sample", type=int, default=2000, help="rows created one by one for comparison")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SCHEMA_INIT", "skip")
+    # The stand-in's sessions are passed in; this only keeps the default
+    # engines from needing the MySQL drivers
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+    from benchmarks.common import make_session_factory, make_standin_engine, synthetic_customer
+    from customer_repository import CustomerRepository
+    from customers_io import export_file, import_file
+    from models.customer import CustomerCreate
+
+    workdir = tempfile.mkdtemp(prefix="customers-io-")
+    source = os.path.join(workdir, f"customers.{args.format}")
+    target = os.path.join(workdir, f"export.{args.format}")
+    engine = make_standin_engine(f"sqlite:///{os.path.join(workdir, 'customers.db')}")
+    sessions = make_session_factory(engine)
+    failures = []
+
+    def check(ok: bool, message: str):
+        print(f"{'OK  ' if ok else 'FAIL'}  {message}")
+        if not ok:
+            failures.append(message)
+
+    try:
+        started = time.perf_counter()
+        write_file(source, args.format, args.rows)
+        size = os.path.getsize(source) / 2**20
+        print(f"wrote {args.rows} rows ({size:.0f} MiB) in {time.perf_counter() - started:.1f}s")
+
+        recorder = Recorder(args.rows, stop_at=args.rows // 2)
+        started = time.perf_counter()
+        try:
+            import_file(source, sessions, chunk_size=args.chunk_size, report=recorder)
+        except Interrupted:
+            print(f"import stopped after {recorder.samples[-1][0]} rows; resuming from the checkpoint")
+        state = import_file(source, sessions, chunk_size=args.chunk_size, report=recorder)
+        elapsed = time.perf_counter() - started
+        print(
+            f"import: {args.rows / elapsed:,.0f} rows/s ({elapsed:.1f}s), "
+            f"memory {recorder.samples[0][1]:.0f} -> {recorder.samples[-1][1]:.0f} MiB"
+        )
+        check(state["created"] == args.rows and state["records"] == args.rows, f"imported {state['created']} rows")
+        check(recorder.growth() < MAX_GROWTH_MIB, f"import memory growth after 10%: {recorder.growth():.0f} MiB")
+
+        recorder = Recorder(args.rows)
+        started = time.perf_counter()
+        state = export_file(target, sessions, chunk_size=args.chunk_size, report=recorder)
+        elapsed = time.perf_counter() - started
+        with open(target, "rb") as f:
+            lines = sum(1 for _ in f) - (args.format == "csv")
+        print(f"export: {args.rows / elapsed:,.0f} rows/s ({elapsed:.1f}s)")
+        check(state["records"] == args.rows and lines == args.rows, f"exported {lines} rows")
+        check(recorder.growth() < MAX_GROWTH_MIB, f"export memory growth after 10%: {recorder.growth():.0f} MiB")
+
+        with sessions() as db:
+            repo = CustomerRepository(db)
+            started = time.perf_counter()
+            for i in range(args.rows, args.rows + args.per_row_sample):
+                repo.create(CustomerCreate.model_validate(synthetic_customer(i)))
+            elapsed = time.perf_counter() - started
+        print(f"one create per row: {args.per_row_sample / elapsed:,.0f} rows/s")
+    finally:
+        engine.dispose()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
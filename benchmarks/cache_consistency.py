@@ -0,0 +1,95 @@
+"""Checks that a read racing a write doesn't leave the old record cached.
+
+Runs main.app in-process with the customer cache on. Each round starts a
+GET /customers/{id} on a cold cache whose SELECT is held for --hold-ms
+after it has read the row, PATCHes the customer's status meanwhile, then
+reads the customer again once both are done. Before fill tokens, the held
+reader put the old record back after the PATCH invalidated it, and the
+second read served it (until the TTL ran out). Fails (exit 1) if any
+round reads the old status. Sync routes only: holding an async read would
+hold the event loop, and the PATCH with it (AsyncCustomerRepository shares
+the fill code).
+
+    python -m benchmarks.cache_consistency [--rounds 20]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--hold-ms", type=float, default=200, help="how long the racing read is held")
+    args = parser.parse_args()
+
+    # Read at import time by main / services.cache
+    os.environ["USE_ASYNC_ROUTES"] = "false"
+    os.environ["CUSTOMER_CACHE_BACKEND"] = "memory"
+    os.environ.setdefault("SCHEMA_INIT", "skip")
+    # The routes' sessions are overridden; this only keeps the default
+    # engines from needing the MySQL drivers
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+    import httpx
+    from sqlalchemy import event
+
+    from benchmarks.common import synthetic_university_id
+    from benchmarks.load_test import setup_in_process
+
+    app, counter, dispose = setup_in_process(rows=10, no_cache=False)
+    import main as service
+
+    hold = threading.Event()
+
+    def hold_select(conn, cursor, statement, parameters, context, executemany):
+        # Only the racing read: the row is read, not yet returned
+        if hold.is_set() and statement.lstrip().upper().startswith("SELECT"):
+            hold.clear()
+            time.sleep(args.hold_ms / 1000)
+
+    # In SQLite's default journal mode the PATCH would wait for the held
+    # read to finish; in WAL mode it commits meanwhile, as on MySQL
+    with counter.engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+    event.listen(counter.engine, "after_cursor_execute", hold_select)
+
+    path = f"/customers/{synthetic_university_id(0)}"
+    statuses = ["inactive", "active"]
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        stale = 0
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                for n in range(args.rounds):
+                    status = statuses[n % 2]
+                    service.customer_cache.clear()
+                    hold.set()
+                    read = asyncio.ensure_future(client.get(path))
+                    # Let the read reach its SELECT before writing
+                    await asyncio.sleep(args.hold_ms / 4000)
+                    patched = await client.patch(path, json={"status": status})
+                    assert patched.status_code == 200, patched.text
+                    assert (await read).status_code == 200
+                    after = (await client.get(path)).json()["status"]
+                    if after != status:
+                        stale += 1
+        finally:
+            await dispose()
+        return stale
+
+    stale = asyncio.run(run())
+    print(f"{stale} of {args.rounds} reads after a racing write served the old record")
+    if stale:
+        print("FAIL  a read racing a write put the old record back in the cache")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Shared helpers for the benchmark scripts: a local SQLite stand-in for the
+customers database and a counter for the SQL statements it executes."""
+from __future__ import annotations
+
+import os
+import tempfile
+import time
+
+from sqlalchemy import MetaData, String, create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from db import Base
+import address_repository  # noqa: F401  (registers the addresses table on Base)
+import customer_repository  # noqa: F401  (registers the customers table on Base)
+
+
+# Load generators are a single client: turn off LimitsMiddleware so the
+# numbers measure the service, not the rate limiter
+NO_REQUEST_LIMITS = {
+    "RATE_LIMIT_READ_RPS": "0",
+    "RATE_LIMIT_WRITE_RPS": "0",
+    "MAX_IN_FLIGHT_READS": "0",
+    "MAX_IN_FLIGHT_WRITES": "0",
+}
+
+
+def make_standin_engine(url: str | None = None, case_insensitive_keys: bool = False):
+    """Fresh database with the service schema; a temp SQLite file by default.
+
+    `case_insensitive_keys` gives the SQLite key columns NOCASE collation, so
+    "abc123" = "ABC123" as under MySQL's default collation."""
+    if url is None:
+        fd, path = tempfile.mkstemp(prefix="customers-bench-", suffix=".db")
+        os.close(fd)
+        url = f"sqlite:///{path}"
+    # Concurrent writers on SQLite wait for the file lock instead of failing
+    connect_args = {"timeout": 30} if url.startswith("sqlite") else {}
+    engine = create_engine(url, connect_args=connect_args)
+    metadata = _case_insensitive_keys(Base.metadata) if case_insensitive_keys else Base.metadata
+    metadata.drop_all(bind=engine)
+    metadata.create_all(bind=engine)
+    return engine
+
+
+def _case_insensitive_keys(metadata: MetaData) -> MetaData:
+    copy = MetaData()
+    for table in metadata.sorted_tables:
+        table = table.to_metadata(copy)
+        for name in ("university_id", "email"):
+            if name in table.c:
+                table.c[name].type = String(table.c[name].type.length, collation="NOCASE")
+    return copy
+
+
+def make_session_factory(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+class StatementCounter:
+    """Counts statements (and COMMITs) sent through an engine."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = 0
+        self.commits = 0
+        self.sql_time = 0.0
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+        event.listen(engine, "commit", self._commit)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info["bench_query_start"] = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements += 1
+        self.sql_time += time.perf_counter() - conn.info.pop("bench_query_start", time.perf_counter())
+
+    def _commit(self, conn):
+        self.commits += 1
+
+    def reset(self):
+        self.statements = 0
+        self.commits = 0
+        self.sql_time = 0.0
+
+    @property
+    def round_trips(self) -> int:
+        return self.statements + self.commits
+
+
+def synthetic_university_id(i: int) -> str:
+    """Unique, valid university ID (4 letters + 4 digits) for any i < 26**4 * 10000."""
+    block, number = divmod(i, 10000)
+    letters = ""
+    for _ in range(4):
+        block, r = divmod(block, 26)
+        letters += chr(ord("A") + r)
+    return f"{letters}{number:04d}"
+
+
+def synthetic_customer(i: int) -> dict:
+    return {
+        "first_name": f"First{i}",
+        "last_name": f"Last{i}",
+        "university_id": synthetic_university_id(i),
+        "email": f"student{i}@bench.edu",
+        "status": "active",
+    }
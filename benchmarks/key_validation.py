@@ -0,0 +1,109 @@
+"""Cost of validating customer keys, and the queries malformed keys no longer cause.
+
+1. Per-call time of utils.validation's precompiled checks against running
+   the same key through a pydantic TypeAdapter (what a model field costs).
+2. Fires --requests GET /customers/{id} and /customers/by-email/{email} with
+   malformed keys at main.app in-process (cache disabled) and counts the
+   statements that reach the database; before path validation each one was
+   a SELECT. Fails (exit 1) if any malformed key is looked up.
+
+    python -m benchmarks.key_validation [--requests 1000] [--async-routes]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import timeit
+from urllib.parse import quote
+
+VALID_IDS = ["UNI1234", "ab001", " Abcd0001 "]
+INVALID_IDS = ["12345", "ABCDE1234", "x" * 200, "' OR 1=1 --"]
+VALID_EMAILS = ["rahul@columbia.edu", " Student42@Bench.edu "]
+INVALID_EMAILS = ["rahul@gmail.com", "not-an-email", "a" * 300 + "@x.edu"]
+
+
+def per_call_ns(fn, values: list[str], number: int) -> float:
+    def run():
+        for value in values:
+            try:
+                fn(value)
+            except ValueError:
+                pass
+
+    return min(timeit.repeat(run, number=number, repeat=5)) / (number * len(values)) * 1e9
+
+
+def validation_cost(number: int) -> None:
+    from pydantic import TypeAdapter
+
+    from models.customer import EduEmail, UniversityIDType
+    from utils.validation import normalize_email, normalize_university_id
+
+    cases = [
+        ("university_id valid", normalize_university_id, UniversityIDType, VALID_IDS),
+        ("university_id invalid", normalize_university_id, UniversityIDType, INVALID_IDS),
+        ("email valid", normalize_email, EduEmail, VALID_EMAILS),
+        ("email invalid", normalize_email, EduEmail, INVALID_EMAILS),
+    ]
+    print(f"{'key':<24}{'utils ns/call':>15}{'pydantic ns/call':>18}")
+    for name, fn, annotation, values in cases:
+        adapter = TypeAdapter(annotation)
+        print(
+            f"{name:<24}{per_call_ns(fn, values, number):>15.0f}"
+            f"{per_call_ns(adapter.validate_python, values, number):>18.0f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000, help="requests with malformed keys")
+    parser.add_argument("--number", type=int, default=20000, help="timeit loops per key set")
+    parser.add_argument("--async-routes", action="store_true", help="exercise the async route variants")
+    args = parser.parse_args()
+
+    # Read at import time by main
+    os.environ["USE_ASYNC_ROUTES"] = "true" if args.async_routes else "false"
+    os.environ.setdefault("SCHEMA_INIT", "skip")
+    # The routes' sessions are overridden; this only keeps the default
+    # engines from needing the MySQL drivers
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+    validation_cost(args.number)
+
+    import httpx
+
+    from benchmarks.load_test import run_load, setup_in_process
+
+    app, counter, dispose = setup_in_process(rows=10, no_cache=True)
+    paths = [f"/customers/{quote(key, safe='')}" for key in INVALID_IDS]
+    paths += [f"/customers/by-email/{quote(key, safe='')}" for key in INVALID_EMAILS]
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                counter.reset()
+                requests = [("get", "GET", paths[i % len(paths)], None) for i in range(args.requests)]
+                return await run_load(client, requests, concurrency=32)
+        finally:
+            await dispose()
+
+    elapsed, _, statuses = asyncio.run(run())
+    rejected = statuses["get"].get(422, 0)
+    routes = "async" if args.async_routes else "sync"
+    print(
+        f"{routes} routes: {args.requests} GETs with malformed keys ({rejected} x 422) in {elapsed:.2f}s "
+        f"-> {counter.statements} statements (previously {args.requests} SELECTs)"
+    )
+    if rejected != args.requests:
+        print(f"FAIL  unexpected statuses: {dict(statuses['get'])}")
+        sys.exit(1)
+    if counter.statements:
+        print("FAIL  malformed keys reached the database")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
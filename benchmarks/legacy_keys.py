@@ -0,0 +1,139 @@
+"""Checks reads of customers stored before keys were canonicalized.
+
+Rows written before canonical keys (and not yet folded with
+`python migrations.py fold-keys`) can hold "leg0001" / "Legacy@Bench.edu".
+MySQL's case-insensitive collation still matches them to the canonical
+"LEG0001" / "legacy@bench.edu"; the SQLite stand-in is given NOCASE key
+columns to do the same. Stores such a customer, then reads it through the
+routes that key their results by university ID or email, including
+multi-key lookups and name search. Fails (exit 1) on any
+error or missing data.
+
+    python -m benchmarks.legacy_keys [--async-routes]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+
+LEGACY_ID = "leg0001"
+LEGACY_EMAIL = "Legacy@Bench.edu"
+ADDRESS = {"street": "1 Main St", "city": "New York", "state": "NY", "postal_code": "10027", "country": "USA"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--async-routes", action="store_true", help="exercise the async route variants")
+    args = parser.parse_args()
+
+    # Read at import time by main
+    os.environ["USE_ASYNC_ROUTES"] = "true" if args.async_routes else "false"
+    os.environ.setdefault("SCHEMA_INIT", "skip")
+    # The routes' sessions are overridden; this only keeps the default
+    # engines from needing the MySQL drivers
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    # Name search on, fed from the change feed without holding back the seed
+    os.environ["CUSTOMER_SEARCH"] = "true"
+    os.environ["CHANGE_FEED_LAG_SECONDS"] = "0"
+
+    import httpx
+    from sqlalchemy import insert
+
+    from benchmarks.load_test import setup_in_process
+    from customer_repository import Customer, _utcnow
+
+    app, _, dispose = setup_in_process(rows=10, no_cache=True, case_insensitive_keys=True)
+    import main as service
+
+    with service.read_session(primary=True) as db:
+        now = _utcnow()
+        db.execute(
+            insert(Customer).values(
+                university_id=LEGACY_ID,
+                email=LEGACY_EMAIL,
+                first_name="Legacy",
+                last_name="Row",
+                status="active",
+                created_at=now,
+                updated_at=now,
+            )
+        )
+        db.commit()
+
+    from services.search import SearchIndexSync
+
+    search_sync = SearchIndexSync(service.customer_search, sessions=lambda: service.read_session(primary=True))
+    while search_sync.sync_once():
+        pass
+
+    canonical_id = LEGACY_ID.upper()
+    failures = []
+
+    def check(name: str, response, ok) -> None:
+        passed = response.status_code == 200 and ok(response.json())
+        print(f"{'ok' if passed else 'FAIL':<6}{name} -> {response.status_code}")
+        if not passed:
+            failures.append(f"{name}: {response.text[:200]}")
+
+    def one_address(customer) -> bool:
+        return customer["university_id"].upper() == canonical_id and len(customer["addresses"]) == 1
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                response = await client.post(f"/customers/{canonical_id}/addresses", json=ADDRESS)
+                assert response.status_code == 201, response.text
+
+                check(
+                    "GET /customers/{id}?include=addresses",
+                    await client.get(f"/customers/{canonical_id}?include=addresses"),
+                    one_address,
+                )
+                check(
+                    "GET /customers/{id}?include=addresses&fields=",
+                    await client.get(f"/customers/{canonical_id}?include=addresses&fields=university_id"),
+                    one_address,
+                )
+                check(
+                    "GET /customers?include=addresses",
+                    await client.get("/customers?include=addresses&limit=100"),
+                    lambda page: sum(one_address(c) for c in page["items"]) == 1,
+                )
+                check(
+                    "POST /customers:lookup",
+                    await client.post(
+                        "/customers:lookup?include=addresses",
+                        json={"university_ids": [LEGACY_ID], "emails": [LEGACY_EMAIL]},
+                    ),
+                    lambda result: (
+                        not result["missing_university_ids"]
+                        and not result["missing_emails"]
+                        and len(result["customers"]) == 1
+                        and one_address(result["customers"][0])
+                    ),
+                )
+                check(
+                    "GET /customers/search",
+                    await client.get("/customers/search?q=legacy"),
+                    lambda result: [hit["customer"]["university_id"] for hit in result["items"]] == [canonical_id],
+                )
+                check(
+                    "GET /customers/{id}/addresses",
+                    await client.get(f"/customers/{canonical_id}/addresses"),
+                    lambda addresses: len(addresses) == 1,
+                )
+        finally:
+            await dispose()
+
+    asyncio.run(run())
+    if failures:
+        for failure in failures:
+            print(f"FAIL  {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""Throughput / latency harness for the customer service.
+
+Replays a request mix against main.app through an in-process ASGI client
+(backed by a SQLite stand-in database), or against a running server with
+--url. Reports req/s, p50/p95/p99 latency per operation and DB statements per
+request, and can save the results as JSON to compare commits:
+
+    python -m benchmarks.load_test --requests 5000 --concurrency 32 --output before.json
+    python -m benchmarks.load_test --replay traffic.ndjson --url http://127.0.0.1:8000
+
+A replay file holds one request per line:
+    {"method": "GET", "path": "/customers/UNI1234"}
+    {"method": "PATCH", "path": "/customers/UNI1234", "json": {"status": "inactive"}}
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import statistics
+import subprocess
+import time
+from collections import defaultdict
+from datetime import datetime, UTC
+
+import httpx
+
+from benchmarks.common import (
+    NO_REQUEST_LIMITS,
+    StatementCounter,
+    make_session_factory,
+    make_standin_engine,
+    synthetic_customer,
+)
+
+# Default synthetic mix: relative weight of each operation
+DEFAULT_MIX = {
+    "read_by_id": 60,
+    "read_by_email": 25,
+    "create": 5,
+    "patch": 7,
+    "delete": 3,
+}
+
+
+class SyntheticMix:
+    """Generates (operation, method, path, json) over a pre-seeded key space."""
+
+    def __init__(self, seeded: int, mix: dict[str, int], seed: int = 0):
+        self.random = random.Random(seed)
+        self.seeded = seeded
+        self.ops = list(mix)
+        self.weights = [mix[op] for op in self.ops]
+        self.next_id = itertools.count(seeded)
+        self.created: list[int] = []
+
+    def next(self) -> tuple[str, str, str, dict | None]:
+        op = self.random.choices(self.ops, self.weights)[0]
+        i = self.random.randrange(self.seeded)
+        customer = synthetic_customer(i)
+        if op == "read_by_id":
+            return op, "GET", f"/customers/{customer['university_id']}", None
+        if op == "read_by_email":
+            return op, "GET", f"/customers/by-email/{customer['email']}", None
+        if op == "patch":
+            status = self.random.choice(["active", "inactive", "pending"])
+            return op, "PATCH", f"/customers/{customer['university_id']}", {"status": status}
+        if op == "delete" and self.created:
+            victim = self.created.pop(self.random.randrange(len(self.created)))
+            return op, "DELETE", f"/customers/{synthetic_customer(victim)['university_id']}", None
+        # create (also used for deletes before anything has been created)
+        n = next(self.next_id)
+        self.created.append(n)
+        return "create", "POST", "/customers", synthetic_customer(n)
+
+
+def load_replay(path: str) -> list[tuple[str, str, str, dict | None]]:
+    requests = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            method = entry["method"].upper()
+            requests.append((entry.get("op", method), method, entry["path"], entry.get("json")))
+    return requests
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies: list[float]) -> dict:
+    return {
+        "count": len(latencies),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+async def run_load(client: httpx.AsyncClient, requests, concurrency: int):
+    queue: asyncio.Queue = asyncio.Queue()
+    for request in requests:
+        queue.put_nowait(request)
+
+    latencies: dict[str, list[float]] = defaultdict(list)
+    statuses: dict[str, dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    async def worker():
+        while True:
+            try:
+                op, method, path, body = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            response = await client.request(method, path, json=body)
+            latencies[op].append(time.perf_counter() - start)
+            statuses[op][response.status_code] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start, latencies, statuses
+
+
+def setup_in_process(rows: int, no_cache: bool, case_insensitive_keys: bool = False):
+    """Point main.app at a seeded SQLite stand-in (see make_standin_engine
+    for `case_insensitive_keys`).
+
+    Returns (app, statement counter, async cleanup callable)."""
+    for name, value in NO_REQUEST_LIMITS.items():
+        os.environ.setdefault(name, value)
+    import db
+    import main
+    from customer_repository import CustomerRepository
+    from models.customer import CustomerCreate
+
+    engine = make_standin_engine(case_insensitive_keys=case_insensitive_keys)
+    session_factory = make_session_factory(engine)
+    with session_factory() as session:
+        CustomerRepository(session).bulk_create(
+            CustomerCreate.model_validate(synthetic_customer(i)) for i in range(rows)
+        )
+    counter = StatementCounter(engine)
+    async_engine = None
+
+    def get_standin_db():
+        session = session_factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    def standin_read_session(primary: bool = False):
+        # No replicas here: reads go to the same stand-in as writes
+        session = session_factory()
+        session.info["read_your_writes"] = primary
+        session.info["replica"] = False
+        return session
+
+    def get_standin_read_db():
+        session = standin_read_session()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    main.app.dependency_overrides[db.get_db] = get_standin_db
+    main.app.dependency_overrides[db.get_read_db] = get_standin_read_db
+    main.read_session = standin_read_session
+
+    if main.use_async_routes:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        async_engine = create_async_engine(
+            engine.url.set(drivername="sqlite+aiosqlite"), connect_args={"timeout": 30}
+        )
+        async_sessions = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+        counter = _CombinedCounter(counter, StatementCounter(async_engine.sync_engine))
+
+        async def get_standin_async_db():
+            async with async_sessions() as session:
+                yield session
+
+        async def get_standin_async_read_db():
+            async with async_sessions() as session:
+                session.info["read_your_writes"] = False
+                session.info["replica"] = False
+                yield session
+
+        main.app.dependency_overrides[db.get_async_db] = get_standin_async_db
+        main.app.dependency_overrides[db.get_async_read_db] = get_standin_async_read_db
+
+    if no_cache:
+        import resources.customers_async
+
+        main.customer_cache = None
+        resources.customers_async.customer_cache = None
+    elif main.customer_cache is not None:
+        main.customer_cache.clear()
+
+    async def dispose():
+        # aiosqlite's worker threads keep the process alive until disposed
+        if async_engine is not None:
+            await async_engine.dispose()
+        engine.dispose()
+
+    return main.app, counter, dispose
+
+
+class _CombinedCounter:
+    def __init__(self, *counters):
+        self.counters = counters
+
+    def reset(self):
+        for counter in self.counters:
+            counter.reset()
+
+    @property
+    def statements(self):
+        return sum(counter.statements for counter in self.counters)
+
+    @property
+    def commits(self):
+        return sum(counter.commits for counter in self.counters)
+
+    @property
+    def sql_time(self):
+        return sum(counter.sql_time for counter in self.counters)
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000, help="synthetic requests to send")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight")
+    parser.add_argument("--rows", type=int, default=1000, help="customers seeded in the stand-in")
+    parser.add_argument("--replay", help="NDJSON file of recorded requests instead of the synthetic mix")
+    parser.add_argument("--url", help="target a running server instead of main.app in-process")
+    parser.add_argument("--no-cache", action="store_true", help="disable the customer cache (in-process only)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.replay:
+        requests = load_replay(args.replay)
+    else:
+        mix = SyntheticMix(args.rows, DEFAULT_MIX, seed=args.seed)
+        requests = [mix.next() for _ in range(args.requests)]
+
+    counter = None
+    dispose = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=30)
+    else:
+        app, counter, dispose = setup_in_process(args.rows, args.no_cache)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+
+    async def go():
+        async with client:
+            if counter is not None:
+                counter.reset()
+            try:
+                return await run_load(client, requests, args.concurrency)
+            finally:
+                if dispose is not None:
+                    await dispose()
+
+    elapsed, latencies, statuses = asyncio.run(go())
+
+    all_latencies = [sample for samples in latencies.values() for sample in samples]
+    total = len(all_latencies)
+    results = {
+        "revision": git_revision(),
+        "timestamp": datetime.now(UTC).isoformat(),
+        "target": args.url or "in-process",
+        "config": {
+            "requests": total,
+            "concurrency": args.concurrency,
+            "rows": args.rows,
+            "replay": args.replay,
+            "cache": not args.no_cache,
+        },
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(total / elapsed, 1) if elapsed else 0.0,
+        "latency": summarize(all_latencies),
+        "operations": {
+            op: {**summarize(samples), "status_codes": dict(statuses[op])}
+            for op, samples in sorted(latencies.items())
+        },
+        "db": None,
+    }
+    if counter is not None:
+        results["db"] = {
+            "statements": counter.statements,
+            "commits": counter.commits,
+            "statements_per_request": round(counter.statements / total, 3) if total else 0.0,
+            "sql_time_per_request_ms": round(counter.sql_time / total * 1000, 3) if total else 0.0,
+        }
+
+    print(f"{total} requests in {elapsed:.2f}s -> {results['requests_per_s']} req/s "
+          f"(concurrency {args.concurrency}, {results['target']})")
+    print(f"{'op':<15}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}  status codes")
+    for op, stats in list(results["operations"].items()) + [("ALL", results["latency"])]:
+        codes = stats.get("status_codes", "")
+        print(f"{op:<15}{stats['count']:>7}{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}"
+              f"{stats['p99_ms']:>9.2f}  {codes}")
+    if results["db"]:
+        print(f"DB statements/request: {results['db']['statements_per_request']}, "
+              f"SQL ms/request: {results['db']['sql_time_per_request_ms']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Checks that the repository's lookup/filter queries are served by indexes.
+
+Builds the statements CustomerRepository issues, runs EXPLAIN on them and
+fails (exit 1) if any does a full table scan, or if a paginated one sorts
+(SQLite's temp B-tree, MySQL's filesort): that would sort every matching
+row for each page. Runs on a migrated SQLite stand-in by default; point
+--database-url at MySQL for the production plans.
+
+    python -m benchmarks.query_plans [--database-url mysql+pymysql://...]
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+from address_repository import _select_for_customers
+from customer_repository import (
+    Customer,
+    CustomerRepository,
+    _after_keys,
+    _change_feed_selects,
+    _page_order,
+    _select_by_id,
+    _select_customers,
+)
+from migrations import upgrade
+from models.customer import CustomerFilter
+
+from benchmarks.common import make_standin_engine
+
+
+def repository_queries(session) -> list[tuple[str, object, bool]]:
+    """(description, statement, paginated) as list_customers and the change
+    feed build them, for a page after a cursor."""
+    repo = CustomerRepository(session)
+    since = datetime(2025, 1, 1)
+    by_status = CustomerFilter(
+        status="active", updated_after=since, updated_before=since + timedelta(days=1)
+    )
+    by_name = CustomerFilter(last_name_prefix="Sin")
+    feed_upserts, feed_deletes = _change_feed_selects((since, "UNI1234"), since + timedelta(days=1), 501)
+
+    def page(filters, after):
+        order = _page_order(filters)
+        return repo._filtered_select(filters, order=order).where(_after_keys(order, after)).limit(101)
+
+    return [
+        ("get by university_id", _select_by_id("UNI1234"), False),
+        ("get by email", _select_customers().where(Customer.email == "rahul@columbia.edu"), False),
+        ("list page after cursor", page(None, ("UNI1234",)), True),
+        ("list by status", page(CustomerFilter(status="active"), (since, "UNI1234")), True),
+        ("list by status + updated_at range", page(by_status, (since, "UNI1234")), True),
+        ("list by updated_at range", page(CustomerFilter(updated_after=since), (since, "UNI1234")), True),
+        ("list by last_name prefix", page(by_name, ("Sinclair", "Ann", "UNI1234")), True),
+        ("change feed: customers after cursor", feed_upserts, True),
+        ("change feed: tombstones after cursor", feed_deletes, True),
+        ("addresses of a page of customers", _select_for_customers(["UNI1234", "UNI0001"]), False),
+    ]
+
+
+def explain(conn, stmt, paginated: bool) -> tuple[bool, str]:
+    """(served by an index without a full scan, nor a sort if `paginated`,
+    plan summary) for one statement."""
+    # render_postcompile: expand IN lists into plain bound parameters
+    compiled = stmt.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    params = (
+        tuple(compiled.params[name] for name in compiled.positiontup)
+        if compiled.positional
+        else compiled.params
+    )
+    if conn.dialect.name == "sqlite":
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).all()
+        details = [row[-1] for row in rows]
+        full_scan = any(d.startswith("SCAN ") and "INDEX" not in d for d in details)
+        sorts = any(d.startswith("USE TEMP B-TREE") for d in details)
+        return not full_scan and not (paginated and sorts), "; ".join(details)
+
+    rows = conn.exec_driver_sql(f"EXPLAIN {compiled}", params).mappings().all()
+    full_scan = any(row["type"] == "ALL" or row["key"] is None for row in rows)
+    sorts = any("filesort" in (row["Extra"] or "") or "temporary" in (row["Extra"] or "") for row in rows)
+    return (
+        not full_scan and not (paginated and sorts),
+        "; ".join(f"type={row['type']} key={row['key']} extra={row['Extra']}" for row in rows),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite stand-in")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url) if args.database_url else make_standin_engine()
+    if engine.dialect.name == "sqlite":
+        # MySQL serves LIKE 'prefix%' from the index under its case-insensitive
+        # collation; SQLite only does so for a case-sensitive LIKE
+        event.listen(engine, "connect", lambda dbapi_conn, _: dbapi_conn.execute("PRAGMA case_sensitive_like = ON"))
+    upgrade(engine)
+
+    failures = 0
+    with engine.connect() as conn:
+        for description, stmt, paginated in repository_queries(Session(bind=conn)):
+            ok, plan = explain(conn, stmt, paginated)
+            failures += not ok
+            print(f"{'OK  ' if ok else 'FAIL'}  {description}: {plan}")
+
+    if failures:
+        print(f"{failures} quer{'y' if failures == 1 else 'ies'} without an index (or sorting each page)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Per-request CPU time of the customer read path.
+
+Compares the original read path (ORM entity -> CustomerRead -> FastAPI
+response_model re-validation + JSON encoding) with the current one (row tuple
+-> CustomerRead -> ModelJSONResponse) on a SQLite stand-in, cache disabled.
+
+    python -m benchmarks.read_serialization [-n 5000]
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from customer_repository import Customer, CustomerRepository
+from framework.responses import ModelJSONResponse
+from models.customer import CustomerCreate, CustomerRead
+
+from benchmarks.common import make_session_factory, make_standin_engine, synthetic_customer
+
+
+def build_app(session_factory) -> FastAPI:
+    def get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+
+    @app.get("/before/{university_id}", response_model=CustomerRead)
+    def read_before(university_id: str, db=Depends(get_db)):
+        c = db.query(Customer).filter(Customer.university_id == university_id).first()
+        return CustomerRepository(db)._to_read_model(c)
+
+    @app.get("/after/{university_id}", response_model=CustomerRead)
+    def read_after(university_id: str, db=Depends(get_db)):
+        return ModelJSONResponse(CustomerRepository(db).get_by_university_id(university_id))
+
+    return app
+
+
+def measure(client, path: str, ids: list[str]) -> tuple[float, float]:
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for university_id in ids:
+        response = client.get(f"{path}/{university_id}")
+        assert response.status_code == 200
+    n = len(ids)
+    return (time.process_time() - cpu_start) / n * 1e6, (time.perf_counter() - wall_start) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", type=int, default=5000, help="requests per variant")
+    parser.add_argument("--rows", type=int, default=1000, help="customers in the stand-in table")
+    args = parser.parse_args()
+
+    engine = make_standin_engine()
+    session_factory = make_session_factory(engine)
+    with session_factory() as db:
+        CustomerRepository(db).bulk_create(
+            CustomerCreate.model_validate(synthetic_customer(i)) for i in range(args.rows)
+        )
+    ids = [synthetic_customer(i % args.rows)["university_id"] for i in range(args.n)]
+
+    with TestClient(build_app(session_factory)) as client:
+        # Warm up both paths before timing
+        measure(client, "/before", ids[:200])
+        measure(client, "/after", ids[:200])
+        results = {path: measure(client, path, ids) for path in ("/before", "/after")}
+
+    print(f"{'path':<10}{'cpu us/req':>12}{'wall us/req':>13}")
+    for path, (cpu, wall) in results.items():
+        print(f"{path.strip('/'):<10}{cpu:>12.1f}{wall:>13.1f}")
+    before, after = results["/before"][0], results["/after"][0]
+    print(f"CPU saved per request: {before - after:.1f} us ({(before - after) / before:.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Checks read-replica routing on local SQLite stand-ins.
+
+Creates a primary and --replicas copies of it (a snapshot, standing in for
+replication that lags forever) plus one unreachable replica, then drives
+main.app in-process (in-process cache on) and fails (exit 1) unless:
+
+* reads are spread round-robin over the healthy replicas, never the primary;
+* the unreachable replica is ejected after its first failure;
+* statements run on the replicas are counted in /metrics;
+* a client that wrote reads its write back (from the primary) while other
+  clients still see the replica's copy, and a token further ahead than a
+  write issues doesn't route to the primary;
+* once the replicas catch up, every client reads the write: the lagging copy
+  was not kept in the customer cache;
+* with every replica ejected, reads fall back to the primary.
+
+    python -m benchmarks.replica_routing [--replicas 2] [--requests 60]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--replicas", type=int, default=2, help="healthy replicas")
+    parser.add_argument("--requests", type=int, default=60)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="customers-replicas-")
+    primary = os.path.join(workdir, "primary.db")
+    replica_files = [os.path.join(workdir, f"replica{i}.db") for i in range(args.replicas)]
+    unreachable = os.path.join(workdir, "missing", "replica.db")
+    # Read at import time by db / main
+    os.environ["DATABASE_URL"] = f"sqlite:///{primary}"
+    os.environ["DATABASE_REPLICA_URLS"] = ",".join(f"sqlite:///{f}" for f in (*replica_files, unreachable))
+    os.environ["SCHEMA_INIT"] = "skip"
+    # Statements are counted on the sync engines
+    os.environ["USE_ASYNC_ROUTES"] = "false"
+    os.environ["CUSTOMER_CACHE_BACKEND"] = "memory"
+    # Its change feed sync reads the primary in the background
+    os.environ["CUSTOMER_SEARCH"] = "false"
+
+    from benchmarks.common import NO_REQUEST_LIMITS, StatementCounter, synthetic_customer, synthetic_university_id
+
+    for name, value in NO_REQUEST_LIMITS.items():
+        os.environ.setdefault(name, value)
+
+    from fastapi.testclient import TestClient
+
+    import db
+    import main as service
+    from customer_repository import CustomerRepository
+    from migrations import upgrade
+    from models.customer import CustomerCreate
+
+    upgrade(db.engine)
+    with db.SessionLocal() as session:
+        CustomerRepository(session).bulk_create(
+            CustomerCreate.model_validate(synthetic_customer(i)) for i in range(10)
+        )
+    db.engine.dispose()
+    for replica_file in replica_files:
+        shutil.copyfile(primary, replica_file)
+
+    primary_counter = StatementCounter(db.engine)
+    replica_counters = [StatementCounter(engine) for engine in db.replicas.engines]
+    failures = []
+
+    def statements_in_metrics(client) -> float:
+        metrics = client.get("/metrics").text.splitlines()
+        return float(next(line for line in metrics if line.startswith("db_statements_total ")).split()[1])
+
+    def check(ok: bool, message: str):
+        print(f"{'OK  ' if ok else 'FAIL'}  {message}")
+        if not ok:
+            failures.append(message)
+
+    try:
+        with TestClient(service.app, raise_server_exceptions=False) as reader:
+            metrics_before = statements_in_metrics(reader)
+            statuses = [
+                reader.get(f"/customers/{synthetic_university_id(i % 10)}").status_code
+                for i in range(args.requests)
+            ]
+            served = [counter.statements for counter in replica_counters[:-1]]
+            check(statuses.count(200) >= args.requests - 1, f"reads answered: {statuses.count(200)}/{args.requests}")
+            check(primary_counter.statements == 0, f"primary statements for reads: {primary_counter.statements}")
+            check(max(served) - min(served) <= 2, f"statements per healthy replica: {served}")
+            check(not db.replicas.status()[-1]["healthy"], "unreachable replica ejected")
+            counted = statements_in_metrics(reader) - metrics_before
+            check(counted >= sum(served), f"replica statements in /metrics: {counted:g} (replicas ran {sum(served)})")
+
+            university_id = synthetic_university_id(0)
+            with TestClient(service.app) as writer:
+                response = writer.patch(f"/customers/{university_id}", json={"status": "inactive"})
+                check(response.status_code == 200 and "read_your_writes" in response.cookies, "write sets the token")
+                primary_counter.reset()
+                status = writer.get(f"/customers/{university_id}").json()["status"]
+                check(status == "inactive" and primary_counter.statements > 0, f"writer reads its write: {status}")
+            status = reader.get(f"/customers/{university_id}").json()["status"]
+            check(status == "active", f"other clients read the (lagging) replica: {status}")
+            primary_counter.reset()
+            for token in ("1e12", "inf"):
+                reader.get(f"/customers/{university_id}", headers={"X-Read-Your-Writes": token})
+            check(
+                primary_counter.statements == 0,
+                f"forged far-future tokens ignored: {primary_counter.statements} primary statements",
+            )
+
+            for replica_engine, replica_file in zip(db.replicas.engines, replica_files):
+                replica_engine.dispose()
+                shutil.copyfile(primary, replica_file)
+            status = reader.get(f"/customers/{university_id}").json()["status"]
+            check(status == "inactive", f"after the replicas catch up, other clients read the write: {status}")
+
+            for index in range(len(db.replicas.engines)):
+                db.replicas.eject(index)
+            primary_counter.reset()
+            status = reader.get(f"/customers/{university_id}").json()["status"]
+            check(
+                status == "inactive" and primary_counter.statements > 0,
+                "all replicas ejected: reads fall back to the primary",
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Build time, memory and query latency of the customer name search index.
+
+Indexes --rows synthetic customers (names drawn with a skew from a few
+thousand first names and tens of thousands of last names, like real ones),
+then times CustomerSearchIndex.search for each kind of query: whole names,
+short prefixes, prefix + name, and a typo. For comparison it runs the same
+terms as the LIKE '%term%' scan a database search without a name index
+does, on a SQLite table of --sql-rows customers.
+
+    python -m benchmarks.search [--rows 1000000] [--queries 200] [--sql-rows 100000]
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import random
+import resource
+import sqlite3
+import statistics
+import time
+
+SYLLABLES = [
+    "al", "an", "ar", "be", "ca", "da", "el", "en", "er", "fa", "ga", "ha", "il", "in", "ja", "ka",
+    "la", "le", "li", "lo", "ma", "me", "mi", "na", "ne", "ni", "no", "or", "pa", "ra", "re", "ri",
+    "ro", "sa", "se", "sh", "si", "so", "ta", "te", "th", "to", "va", "vi", "wa", "ya", "yo", "za",
+]
+
+
+def make_names(rng: random.Random, count: int, syllables: tuple[int, int]) -> list[str]:
+    names = set()
+    while len(names) < count:
+        names.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(*syllables))).capitalize())
+    return sorted(names)
+
+
+def popularity(count: int, flatness: int) -> list[float]:
+    # Zipf-like: a few names are common (the top one ~1-2% of people), most rare
+    return list(itertools.accumulate(1 / (rank + flatness) for rank in range(count)))
+
+
+def customers(rows: int, seed: int = 42):
+    rng = random.Random(seed)
+    first_names = make_names(rng, 3000, (2, 3))
+    last_names = make_names(rng, 50000, (2, 4))
+    rng.shuffle(first_names)
+    rng.shuffle(last_names)
+    first_weights, last_weights = popularity(len(first_names), 10), popularity(len(last_names), 50)
+    for i in range(rows):
+        first, middle = rng.choices(first_names, cum_weights=first_weights, k=2)
+        last = rng.choices(last_names, cum_weights=last_weights)[0]
+        yield f"B{i:07d}", first, middle if rng.random() < 0.3 else None, last
+
+
+def typo(rng: random.Random, name: str) -> str:
+    i = rng.randrange(len(name) - 1)
+    return name[:i] + name[i + 1] + name[i] + name[i + 2:]
+
+
+def percentiles(samples: list[float]) -> tuple[float, float, float]:
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return statistics.median(samples) * 1000, p99 * 1000, samples[-1] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200, help="queries per kind")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--sql-rows", type=int, default=100_000, help="rows for the LIKE comparison; 0 to skip")
+    args = parser.parse_args()
+
+    from services.search import CustomerSearchIndex
+
+    sample = list(itertools.islice(customers(args.rows), 0, args.rows, max(1, args.rows // 20000)))
+    index = CustomerSearchIndex()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    batch = []
+    # Same batch size as SearchIndexSync's change feed pages
+    for row in customers(args.rows):
+        batch.append(row)
+        if len(batch) == 5000:
+            index.put_many(batch)
+            batch = []
+    index.put_many(batch)
+    build = time.perf_counter() - started
+    rss_growth = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024
+    print(
+        f"indexed {len(index)} customers ({index.vocabulary_size} distinct name tokens) "
+        f"in {build:.1f}s, ~{rss_growth:.0f} MiB"
+    )
+
+    rng = random.Random(1)
+    picks = [rng.choice(sample) for _ in range(args.queries)]
+    kinds = {
+        "last name": [last for _, _, _, last in picks],
+        "first + last": [f"{first} {last}" for _, first, _, last in picks],
+        "2-char prefix": [first[:2] for _, first, _, _ in picks],
+        "prefix + prefix": [f"{first[:3]} {last[:3]}" for _, first, _, last in picks],
+        "typo in last name": [typo(rng, last.lower()) for _, _, _, last in picks],
+    }
+    print(f"{'query':<20}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}{'avg hits':>10}")
+    for kind, queries in kinds.items():
+        timings, hits = [], 0
+        for query in queries:
+            started = time.perf_counter()
+            hits += len(index.search(query, args.limit))
+            timings.append(time.perf_counter() - started)
+        p50, p99, worst = percentiles(timings)
+        print(f"{kind:<20}{p50:>9.2f}{p99:>9.2f}{worst:>9.2f}{hits / len(queries):>10.1f}")
+
+    if args.sql_rows:
+        db = sqlite3.connect(":memory:")
+        db.execute("CREATE TABLE customers (university_id TEXT PRIMARY KEY, first_name TEXT, middle_name TEXT, last_name TEXT)")
+        db.executemany("INSERT INTO customers VALUES (?, ?, ?, ?)", customers(args.sql_rows))
+        timings = []
+        for _, first, _, last in picks[:20]:
+            started = time.perf_counter()
+            db.execute(
+                "SELECT university_id FROM customers WHERE first_name LIKE ? AND last_name LIKE ? LIMIT ?",
+                (f"%{first[:3]}%", f"%{last[:3]}%", args.limit),
+            ).fetchall()
+            timings.append(time.perf_counter() - started)
+        p50, p99, _ = percentiles(timings)
+        print(f"LIKE '%x%' scan over {args.sql_rows} rows (prefix + prefix): p50 {p50:.1f} ms, p99 {p99:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
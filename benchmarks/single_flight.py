@@ -0,0 +1,75 @@
+"""Checks that concurrent lookups of one customer are coalesced into few queries.
+
+Fires --requests concurrent GET /customers/{id} for the same id at main.app
+in-process (cache disabled, so every request would otherwise query) and
+fails (exit 1) if more than --max-queries SELECTs reached the database.
+Sync routes get --latency-ms of simulated database latency per statement.
+
+    python -m benchmarks.single_flight [--async-routes] [--requests 1000]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--max-queries", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=20, help="added per statement (sync routes only)")
+    parser.add_argument("--async-routes", action="store_true", help="exercise the async route variants")
+    parser.add_argument("--no-single-flight", action="store_true", help="baseline without coalescing")
+    args = parser.parse_args()
+
+    # Read at import time by main / services.singleflight
+    os.environ["USE_ASYNC_ROUTES"] = "true" if args.async_routes else "false"
+    os.environ["CUSTOMER_SINGLE_FLIGHT"] = "false" if args.no_single_flight else "true"
+    os.environ.setdefault("SCHEMA_INIT", "skip")
+    # The routes' sessions are overridden; this only keeps the default
+    # engines from needing the MySQL drivers
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+    import httpx
+    from sqlalchemy import event
+
+    from benchmarks.common import synthetic_university_id
+    from benchmarks.load_test import run_load, setup_in_process
+
+    app, counter, dispose = setup_in_process(rows=10, no_cache=True)
+    if not args.async_routes and args.latency_ms:
+        # Stands in for the network round trip to MySQL; it's what lets
+        # requests overlap on a SQLite file that answers in microseconds
+        event.listen(counter.engine, "before_cursor_execute", lambda *_: time.sleep(args.latency_ms / 1000))
+    path = f"/customers/{synthetic_university_id(0)}"
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                counter.reset()
+                requests = [("get", "GET", path, None)] * args.requests
+                return await run_load(client, requests, concurrency=args.requests)
+        finally:
+            await dispose()
+
+    elapsed, _, statuses = asyncio.run(run())
+    ok = statuses["get"].get(200, 0)
+    routes = "async" if args.async_routes else "sync"
+    print(
+        f"{routes} routes: {args.requests} concurrent GETs ({ok} x 200) in {elapsed:.2f}s "
+        f"-> {counter.statements} SELECTs"
+    )
+    if ok != args.requests:
+        print(f"FAIL  unexpected statuses: {dict(statuses['get'])}")
+        sys.exit(1)
+    if not args.no_single_flight and counter.statements > args.max_queries:
+        print(f"FAIL  more than {args.max_queries} queries")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
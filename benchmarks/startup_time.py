@@ -0,0 +1,98 @@
+"""Cold-start measurement for main:app.
+
+Reports how long `import main` takes and the time from launching uvicorn to
+the first successful /health response, each as the median of several fresh
+processes. Fails (exit 1) when time-to-first-response exceeds --budget-ms.
+
+    python -m benchmarks.startup_time [--runs 5] [--budget-ms 1500]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = (
+    "import time; start = time.perf_counter(); import main; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_import(env: dict) -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def measure_first_response(env: dict, timeout: float = 30.0) -> float:
+    port = free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.TransportError:
+                pass
+            if proc.poll() is not None:
+                raise RuntimeError("uvicorn exited before serving /health")
+            time.sleep(0.005)
+        raise TimeoutError(f"no /health response within {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, help="fail if time-to-first-response exceeds this")
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite stand-in")
+    parser.add_argument("--schema-init", help="SCHEMA_INIT for the measured process (sync/background/skip)")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.database_url:
+        env["DATABASE_URL"] = args.database_url
+    else:
+        env["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp(prefix='customers-startup-')}/startup.db"
+    if args.schema_init:
+        env["SCHEMA_INIT"] = args.schema_init
+
+    imports = [measure_import(env) for _ in range(args.runs)]
+    firsts = [measure_first_response(env) for _ in range(args.runs)]
+
+    import_ms = statistics.median(imports) * 1000
+    first_ms = statistics.median(firsts) * 1000
+    print(f"import main:               median {import_ms:8.1f} ms  (min {min(imports) * 1000:.1f})")
+    print(f"launch -> first /health:   median {first_ms:8.1f} ms  (min {min(firsts) * 1000:.1f})")
+    print(f"SCHEMA_INIT={env.get('SCHEMA_INIT', 'background')}, {args.runs} runs")
+
+    if args.budget_ms is not None and first_ms > args.budget_ms:
+        print(f"FAIL: time to first response {first_ms:.1f} ms exceeds budget {args.budget_ms:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
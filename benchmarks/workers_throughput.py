@@ -0,0 +1,113 @@
+"""Single- vs multi-worker throughput of the production launcher (server.py).
+
+Seeds a SQLite stand-in, starts `python server.py` with each worker count,
+and drives it over HTTP with the read-heavy part of the load_test mix
+(SQLite can't take concurrent writers from several processes).
+
+    python -m benchmarks.workers_throughput [--workers 1 4] [--requests 5000]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from customer_repository import CustomerRepository
+from models.customer import CustomerCreate
+
+from benchmarks.common import NO_REQUEST_LIMITS, make_session_factory, make_standin_engine, synthetic_customer
+from benchmarks.load_test import SyntheticMix, percentile, run_load
+from benchmarks.startup_time import REPO_ROOT, free_port
+
+READ_MIX = {"read_by_id": 70, "read_by_email": 30}
+
+
+def wait_until_healthy(url: str, proc: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("server.py exited during startup")
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.05)
+    raise TimeoutError("server did not become healthy")
+
+
+def bench(workers: int, database_url: str, requests, concurrency: int) -> dict:
+    port = free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        PORT=str(port),
+        WEB_CONCURRENCY=str(workers),
+        SCHEMA_INIT="skip",
+        **NO_REQUEST_LIMITS,
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "server.py"], cwd=REPO_ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_healthy(url, proc)
+
+        async def go():
+            limits = httpx.Limits(max_connections=concurrency)
+            async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+                await run_load(client, requests[:200], concurrency)  # warm up every worker
+                return await run_load(client, requests, concurrency)
+
+        elapsed, latencies, _ = asyncio.run(go())
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    samples = [s for op in latencies.values() for s in op]
+    return {
+        "workers": workers,
+        "req_per_s": len(samples) / elapsed,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 2])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--rows", type=int, default=1000)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="customers-workers-"), "bench.db")
+    database_url = f"sqlite:///{path}"
+    engine = make_standin_engine(database_url)
+    with make_session_factory(engine)() as db:
+        CustomerRepository(db).bulk_create(
+            CustomerCreate.model_validate(synthetic_customer(i)) for i in range(args.rows)
+        )
+    engine.dispose()
+
+    mix = SyntheticMix(args.rows, READ_MIX)
+    requests = [mix.next() for _ in range(args.requests)]
+
+    print(f"{'workers':>8}{'req/s':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    results = [bench(w, database_url, requests, args.concurrency) for w in dict.fromkeys(args.workers)]
+    for r in results:
+        print(f"{r['workers']:>8}{r['req_per_s']:>10.1f}{r['p50_ms']:>9.2f}{r['p99_ms']:>9.2f}")
+    if len(results) > 1:
+        print(f"speed-up {results[-1]['workers']} vs {results[0]['workers']} worker(s): "
+              f"{results[-1]['req_per_s'] / results[0]['req_per_s']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Statements per request on the customer write paths.
+
+Runs create / patch / delete through CustomerRepository against a SQLite
+stand-in and compares them with the original load-then-modify implementation
+(existence SELECT, ORM add/setattr/delete, commit, refresh SELECT).
+
+    python -m benchmarks.write_path_statements [-n 200]
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+from customer_repository import Customer, CustomerRepository
+from models.customer import CustomerCreate, CustomerUpdate
+
+from benchmarks.common import (
+    StatementCounter,
+    make_session_factory,
+    make_standin_engine,
+    synthetic_customer,
+)
+
+
+# The write paths as they were before constraint-based conflict detection
+def legacy_create(db, customer_in: CustomerCreate):
+    existing = db.query(Customer).filter(Customer.university_id == customer_in.university_id).first()
+    if existing:
+        raise ValueError("exists")
+    db_customer = Customer(**customer_in.model_dump())
+    db.add(db_customer)
+    db.commit()
+    db.refresh(db_customer)
+    return db_customer
+
+
+def legacy_update(db, university_id: str, update_in: CustomerUpdate):
+    db_customer = db.query(Customer).filter(Customer.university_id == university_id).first()
+    for field, value in update_in.model_dump(exclude_unset=True).items():
+        setattr(db_customer, field, value)
+    db.commit()
+    db.refresh(db_customer)
+    return db_customer
+
+
+def legacy_delete(db, university_id: str):
+    db_customer = db.query(Customer).filter(Customer.university_id == university_id).first()
+    db.delete(db_customer)
+    db.commit()
+
+
+def current_create(db, customer_in):
+    return CustomerRepository(db).create(customer_in)
+
+
+def current_update(db, university_id, update_in):
+    return CustomerRepository(db).update(university_id, update_in)
+
+
+def current_delete(db, university_id):
+    CustomerRepository(db).delete(university_id)
+
+
+def run(label, create, update, delete, n, session_factory, counter):
+    customers = [CustomerCreate.model_validate(synthetic_customer(i)) for i in range(n)]
+    patch = CustomerUpdate(status="inactive")
+    rows = []
+    for op, call in (
+        ("create", lambda db, c: create(db, c)),
+        ("update", lambda db, c: update(db, c.university_id, patch)),
+        ("delete", lambda db, c: delete(db, c.university_id)),
+    ):
+        counter.reset()
+        start = time.perf_counter()
+        for customer in customers:
+            with session_factory() as db:
+                call(db, customer)
+        elapsed = time.perf_counter() - start
+        rows.append((label, op, counter.statements / n, counter.commits / n, elapsed / n * 1000))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", type=int, default=200, help="requests per operation")
+    args = parser.parse_args()
+
+    rows = []
+    for label, funcs in (
+        ("before", (legacy_create, legacy_update, legacy_delete)),
+        ("after", (current_create, current_update, current_delete)),
+    ):
+        engine = make_standin_engine()
+        counter = StatementCounter(engine)
+        rows += run(label, *funcs, args.n, make_session_factory(engine), counter)
+        engine.dispose()
+
+    print(f"{'impl':<8}{'op':<8}{'stmts/req':>10}{'commits/req':>13}{'ms/req':>9}")
+    for label, op, stmts, commits, ms in rows:
+        print(f"{label:<8}{op:<8}{stmts:>10.2f}{commits:>13.2f}{ms:>9.3f}")
+    print("(SQLite stand-in uses UPDATE ... RETURNING; on MySQL an update is UPDATE + SELECT + COMMIT)")
+
+
+if __name__ == "__main__":
+    main()
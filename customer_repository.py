@@ -1,12 +1,81 @@
+import base64
+import json
 import logging
-from datetime import date
+import os
+from datetime import UTC, date, datetime, timedelta
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, Optional, Sequence, Union
 
-from sqlalchemy import Column, String, Date, DateTime
+from pydantic import ValidationError
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    Integer,
+    String,
+    Date,
+    DateTime,
+    Index,
+    and_,
+    delete,
+    insert,
+    or_,
+    select,
+    update,
+)
+from sqlalchemy.dialects.mysql import DATETIME as MYSQL_DATETIME, insert as mysql_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.sql import func
 from sqlalchemy.orm import Session
 
 from db import Base
-from models.customer import CustomerCreate, CustomerRead, CustomerUpdate
+from models.customer import (
+    CustomerBatchItemResult,
+    CustomerBatchResult,
+    CustomerChange,
+    CustomerChangePage,
+    CustomerCreate,
+    CustomerFilter,
+    CustomerPage,
+    CustomerRead,
+    CustomerUpdate,
+)
+from services import outbox
+from services.cache import CustomerCache
+from services.singleflight import AsyncSingleFlight, SingleFlight
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    from services.search import CustomerSearchIndex
+
+logger = logging.getLogger(__name__)
+
+# Rows per multi-row INSERT (and per transaction) in bulk_create/bulk_upsert
+batch_chunk_size = int(os.environ.get("CUSTOMER_BATCH_CHUNK_SIZE", 500))
+
+# Keys per `IN (...)` query in get_many_by_university_ids/get_many_by_emails
+lookup_chunk_size = int(os.environ.get("CUSTOMER_LOOKUP_CHUNK_SIZE", 1000))
+
+# Rows fetched per round trip when streaming with a server-side cursor
+stream_batch_size = int(os.environ.get("CUSTOMER_STREAM_BATCH_SIZE", 1000))
+
+# Changes younger than this are held back from the change feed, so a write
+# whose transaction commits after a newer one isn't skipped by consumers
+change_feed_lag_seconds = float(os.environ.get("CHANGE_FEED_LAG_SECONDS", 5))
+
+# Columns written by a bulk upsert when the university_id already exists
+_UPSERT_COLUMNS = (
+    "first_name",
+    "middle_name",
+    "last_name",
+    "email",
+    "phone",
+    "birth_date",
+    "status",
+)
+
+
+# Fields a caller can select with `fields=` (projection)
+CUSTOMER_FIELDS = tuple(CustomerRead.model_fields)
 
 
 class CustomerNotFound(Exception):
@@ -17,8 +86,22 @@ class CustomerAlreadyExists(Exception):
     pass
 
 
+class CustomerVersionMismatch(Exception):
+    """The customer exists but its updated_at is not one the caller expected."""
+
+
 class Customer(Base):
     __tablename__ = "customers"
+    # Existing databases get new indexes through migrations.py, not create_all
+    __table_args__ = (
+        # Reports / sync jobs: status filter + updated_at range. Filtered
+        # pages are ordered by the index, down to university_id (_page_order)
+        Index("ix_customers_status_updated_at_university_id", "status", "updated_at", "university_id"),
+        # Last-name prefix search (first_name narrows ties)
+        Index("ix_customers_last_name_first_name_university_id", "last_name", "first_name", "university_id"),
+        # Change feed order: GET /customers/changes
+        Index("ix_customers_updated_at_university_id", "updated_at", "university_id"),
+    )
 
     # Use university_id as the primary key
     university_id = Column(String(32), primary_key=True, nullable=False)
@@ -33,15 +116,59 @@ class Customer(Base):
     birth_date = Column(Date)
     status = Column(String(20), nullable=False)
 
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    # Microseconds on MySQL too, so the stored value is the one create() returns
+    created_at = Column(
+        DateTime(timezone=True).with_variant(MYSQL_DATETIME(timezone=True, fsp=6), "mysql"),
+        server_default=func.now(6),
+        nullable=False,
+    )
+    # The record's version (ETag), so microsecond precision on MySQL too
+    updated_at = Column(
+        DateTime(timezone=True).with_variant(MYSQL_DATETIME(timezone=True, fsp=6), "mysql"),
+        server_default=func.now(6),
+        onupdate=func.now(6),
+        nullable=False,
+    )
+
+
+class CustomerTombstone(Base):
+    """Deleted customers, so the change feed can report deletes."""
+
+    __tablename__ = "customer_tombstones"
+    __table_args__ = (
+        Index("ix_customer_tombstones_deleted_at_university_id", "deleted_at", "university_id"),
+    )
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    university_id = Column(String(32), nullable=False)
+    # Ordered against customers.updated_at in the feed, so the same precision:
+    # rounded up, a delete could sort after a re-create that followed it
+    deleted_at = Column(
+        DateTime(timezone=True).with_variant(MYSQL_DATETIME(timezone=True, fsp=6), "mysql"), nullable=False
+    )
 
 
 class CustomerRepository:
-    def __init__(self, db: Session):
+    def __init__(
+        self,
+        db: Session,
+        cache: Optional[CustomerCache] = None,
+        flights: Optional[SingleFlight] = None,
+        search: Optional["CustomerSearchIndex"] = None,
+        fill_cache: bool = True,
+    ):
         self.db = db
+        self.cache = cache
+        # False: read through the cache without adding what was loaded
+        self.fill_cache = fill_cache
+        # Coalesces concurrent cache-miss lookups of the same key into one query
+        self.flights = flights
+        # This process's name search index, updated after each commit
+        self.search = search
 
-    def _to_read_model(self, c: Customer) -> CustomerRead:
+    def _to_read_model(self, c) -> CustomerRead:
+        # c is a Customer or a row from _select_customers(). Keyword
+        # construction measured faster than model_validate(from_attributes=True).
         return CustomerRead(
             first_name=c.first_name,
             middle_name=c.middle_name,
@@ -55,84 +182,913 @@ class CustomerRepository:
             updated_at=c.updated_at,
         )
 
+    def _fill_token(self) -> Optional[int]:
+        # Taken before a load, so put() can drop what a concurrent write invalidated
+        return self.cache.fill_token() if self.cache else None
+
+    def _cache_put(self, customer: CustomerRead, token: Optional[int]) -> CustomerRead:
+        if self.cache and self.fill_cache:
+            self.cache.put(customer, token)
+        return customer
+
+    def _after_commit(self, university_id: str, *emails: Optional[str]) -> None:
+        if self.cache:
+            self.cache.invalidate(university_id, *emails)
+        if self.flights:
+            self.flights.forget(_id_flight(university_id), *(_email_flight(e) for e in emails if e))
+        if outbox.outbox_enabled:
+            outbox.notify()
+
     def create(self, customer_in: CustomerCreate) -> CustomerRead:
-        existing = (
-            self.db.query(Customer)
-            .filter(Customer.university_id == customer_in.university_id)
-            .first()
+        # The primary key / unique email constraints detect duplicates, and the
+        # timestamps are set here, so this is one INSERT + COMMIT with no
+        # existence check or refresh.
+        values = _new_row(customer_in)
+        customer = CustomerRead.model_validate(values)
+        try:
+            self.db.execute(insert(Customer).values(**values))
+            if outbox.outbox_enabled:
+                self.db.execute(_outbox_insert("customer.created", customer.university_id, customer))
+            self.db.commit()
+        except IntegrityError as e:
+            self.db.rollback()
+            raise _already_exists(customer_in, e)
+        self._after_commit(customer.university_id, customer.email)
+        if self.search is not None:
+            self.search.put_customer(customer)
+
+        return customer
+
+    def get_by_university_id(self, university_id: str) -> CustomerRead:
+        if self.cache:
+            cached = self.cache.get_by_university_id(university_id)
+            if cached is not None:
+                return cached
+
+        if self.flights is None:
+            return self._load_by_university_id(university_id)
+        return self.flights.do(_id_flight(university_id), lambda: self._load_by_university_id(university_id))
+
+    def _load_by_university_id(self, university_id: str) -> CustomerRead:
+        token = self._fill_token()
+        row = self.db.execute(_select_by_id(university_id)).first()
+        if row is None:
+            raise CustomerNotFound("Customer not found")
+
+        return self._cache_put(self._to_read_model(row), token)
+
+    def get_by_email(self, email: str) -> CustomerRead:
+        if self.cache:
+            cached = self.cache.get_by_email(email)
+            if cached is not None:
+                return cached
+
+        if self.flights is None:
+            return self._load_by_email(email)
+        return self.flights.do(_email_flight(email), lambda: self._load_by_email(email))
+
+    def _load_by_email(self, email: str) -> CustomerRead:
+        token = self._fill_token()
+        row = self.db.execute(_select_customers().where(Customer.email == email)).first()
+        if row is None:
+            logger.info("Customer with email %s not found", email)
+            raise CustomerNotFound("Customer not found")
+
+        return self._cache_put(self._to_read_model(row), token)
+
+    def get_version(self, university_id: str) -> datetime:
+        """updated_at of a customer, from the cache or a one-column SELECT."""
+        if self.cache:
+            cached = self.cache.get_by_university_id(university_id)
+            if cached is not None:
+                return cached.updated_at
+
+        version = self.db.execute(_select_version(Customer.university_id == university_id)).scalar()
+        if version is None:
+            raise CustomerNotFound("Customer not found")
+        return version
+
+    def get_version_by_email(self, email: str) -> datetime:
+        if self.cache:
+            cached = self.cache.get_by_email(email)
+            if cached is not None:
+                return cached.updated_at
+
+        version = self.db.execute(_select_version(Customer.email == email)).scalar()
+        if version is None:
+            raise CustomerNotFound("Customer not found")
+        return version
+
+    def project_by_university_id(
+        self, university_id: str, fields: Sequence[str]
+    ) -> tuple[dict[str, Any], datetime]:
+        """Only `fields` of a customer, and its updated_at. Served from the
+        cache when present, otherwise a SELECT of just those columns."""
+        if self.cache:
+            cached = self.cache.get_by_university_id(university_id)
+            if cached is not None:
+                return _project(cached, fields), cached.updated_at
+
+        stmt = _select_customers(fields, "updated_at").where(Customer.university_id == university_id)
+        row = self.db.execute(stmt).first()
+        if row is None:
+            raise CustomerNotFound("Customer not found")
+        return _project(row, fields), row.updated_at
+
+    def project_by_email(self, email: str, fields: Sequence[str]) -> tuple[dict[str, Any], datetime]:
+        if self.cache:
+            cached = self.cache.get_by_email(email)
+            if cached is not None:
+                return _project(cached, fields), cached.updated_at
+
+        row = self.db.execute(_select_customers(fields, "updated_at").where(Customer.email == email)).first()
+        if row is None:
+            raise CustomerNotFound("Customer not found")
+        return _project(row, fields), row.updated_at
+
+    def get_many_by_university_ids(self, university_ids: Iterable[str]) -> dict[str, CustomerRead]:
+        found: dict[str, CustomerRead] = {}
+        pending = []
+        for university_id in dict.fromkeys(university_ids):
+            cached = self.cache.get_by_university_id(university_id) if self.cache else None
+            if cached is not None:
+                found[university_id] = cached
+            else:
+                pending.append(university_id)
+
+        for start in range(0, len(pending), lookup_chunk_size):
+            chunk = pending[start:start + lookup_chunk_size]
+            token = self._fill_token()
+            for row in self.db.execute(_select_customers().where(Customer.university_id.in_(chunk))):
+                # Keyed by the canonical id: a row stored before keys were
+                # canonicalized still matches it, but holds another spelling
+                customer = self._cache_put(self._to_read_model(row), token)
+                found[customer.university_id] = customer
+        return found
+
+    def get_many_by_emails(self, emails: Iterable[str]) -> dict[str, CustomerRead]:
+        found: dict[str, CustomerRead] = {}
+        pending = []
+        for email in dict.fromkeys(emails):
+            cached = self.cache.get_by_email(email) if self.cache else None
+            if cached is not None:
+                found[email] = cached
+            else:
+                pending.append(email)
+
+        for start in range(0, len(pending), lookup_chunk_size):
+            chunk = pending[start:start + lookup_chunk_size]
+            token = self._fill_token()
+            for row in self.db.execute(_select_customers().where(Customer.email.in_(chunk))):
+                customer = self._cache_put(self._to_read_model(row), token)
+                found[customer.email] = customer
+        return found
+
+    def _filtered_select(
+        self,
+        filters: Optional[CustomerFilter],
+        fields: Optional[Sequence[str]] = None,
+        order: Sequence[Column] = (Customer.university_id,),
+    ):
+        # The order columns are always selected: they make up the cursor
+        stmt = _select_customers(fields, *(column.key for column in order)).order_by(*order)
+        if filters is None:
+            return stmt
+        if filters.status is not None:
+            stmt = stmt.where(Customer.status == filters.status)
+        if filters.last_name_prefix:
+            prefix = filters.last_name_prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            stmt = stmt.where(Customer.last_name.like(f"{prefix}%", escape="\\"))
+        if filters.created_after is not None:
+            stmt = stmt.where(Customer.created_at >= filters.created_after)
+        if filters.created_before is not None:
+            stmt = stmt.where(Customer.created_at < filters.created_before)
+        if filters.updated_after is not None:
+            stmt = stmt.where(Customer.updated_at >= filters.updated_after)
+        if filters.updated_before is not None:
+            stmt = stmt.where(Customer.updated_at < filters.updated_before)
+        return stmt
+
+    def list_customers(
+        self,
+        filters: Optional[CustomerFilter] = None,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        fields: Optional[Sequence[str]] = None,
+    ) -> CustomerPage:
+        """Keyset pagination in the order of the index serving `filters`
+        (_page_order): `cursor` holds the order columns of the previous
+        page's last row (for unfiltered pages, its university_id), so every
+        page is an index range scan that neither sorts the matching rows nor
+        slows down deeper into the table. With `fields`, only those columns
+        are selected and items are plain dicts. Raises ValueError for a
+        malformed cursor."""
+        order = _page_order(filters)
+        stmt = self._filtered_select(filters, fields, order)
+        if cursor is not None:
+            stmt = stmt.where(_after_keys(order, decode_page_cursor(cursor, order)))
+
+        rows = self.db.execute(stmt.limit(limit + 1)).all()
+        to_item = self._to_read_model if fields is None else (lambda row: _project(row, fields))
+        page = CustomerPage(items=[to_item(row) for row in rows[:limit]])
+        if len(rows) > limit:
+            page.next_cursor = encode_page_cursor(rows[limit - 1], order)
+        return page
+
+    def iter_customers(
+        self,
+        filters: Optional[CustomerFilter] = None,
+        fields: Optional[Sequence[str]] = None,
+        after: Optional[str] = None,
+    ) -> Iterator[Union[CustomerRead, dict[str, Any]]]:
+        """Stream every matching customer (in university_id order, starting
+        after `after`) through a server-side cursor, a batch at a time,
+        without loading the result set into memory."""
+        stmt = self._filtered_select(filters, fields)
+        if after is not None:
+            stmt = stmt.where(Customer.university_id > after)
+        result = self.db.execute(
+            stmt.execution_options(stream_results=True, yield_per=stream_batch_size)
         )
-        if existing:
-            raise CustomerAlreadyExists(
-                f"Customer with university id '{customer_in.university_id}' already exists."
+        to_item = self._to_read_model if fields is None else (lambda row: _project(row, fields))
+        try:
+            for row in result:
+                yield to_item(row)
+        finally:
+            result.close()
+
+    def changes_since(self, cursor: Optional[str] = None, limit: int = 100) -> CustomerChangePage:
+        """Upserted and deleted customers in (changed_at, university_id) order,
+        starting after `cursor`. Both sides are index range scans."""
+        after = decode_change_cursor(cursor) if cursor else None
+        horizon = _utcnow() - timedelta(seconds=change_feed_lag_seconds)
+
+        upserts, deletes = _change_feed_selects(after, horizon, limit + 1)
+
+        changes = [
+            CustomerChange(
+                type="upsert",
+                university_id=row.university_id,
+                changed_at=row.updated_at,
+                customer=self._to_read_model(row),
             )
+            for row in self.db.execute(upserts)
+        ]
+        changes += [
+            CustomerChange(type="delete", university_id=row.university_id, changed_at=row.deleted_at)
+            for row in self.db.execute(deletes)
+        ]
+        changes.sort(key=lambda change: (change.changed_at, change.university_id))
 
-        db_customer = Customer(
-            university_id=customer_in.university_id,
-            first_name=customer_in.first_name,
-            middle_name=customer_in.middle_name,
-            last_name=customer_in.last_name,
-            email=customer_in.email,
-            phone=customer_in.phone,
-            birth_date=customer_in.birth_date,
-            status=customer_in.status,
-        )
-        self.db.add(db_customer)
+        page = CustomerChangePage(changes=changes[:limit], has_more=len(changes) > limit, next_cursor=cursor)
+        if page.changes:
+            last = page.changes[-1]
+            page.next_cursor = encode_change_cursor(last.changed_at, last.university_id)
+        return page
+
+    def update(
+        self,
+        university_id: str,
+        update_in: CustomerUpdate,
+        if_versions: Optional[Sequence[datetime]] = None,
+    ) -> CustomerRead:
+        """`if_versions` makes the UPDATE conditional on the current
+        updated_at being one of them (If-Match)."""
+        stmt = _update_statement(university_id, update_in, if_versions)
+        try:
+            if self.db.get_bind().dialect.update_returning:
+                row = self.db.execute(stmt.returning(*Customer.__table__.columns)).first()
+            else:
+                # No UPDATE ... RETURNING on MySQL: read the row back inside the
+                # same transaction instead of after the commit.
+                result = self.db.execute(stmt)
+                row = None
+                if result.rowcount:
+                    row = self.db.execute(_select_by_id(university_id)).first()
+            if row is None:
+                self.db.rollback()
+                self._raise_missing(university_id, if_versions)
+            customer = self._to_read_model(row)
+            if outbox.outbox_enabled:
+                self.db.execute(_outbox_insert("customer.updated", university_id, customer))
+            self.db.commit()
+        except IntegrityError as e:
+            self.db.rollback()
+            raise _update_conflict(update_in, e)
+        self._after_commit(university_id, customer.email)
+        if self.search is not None:
+            self.search.put_customer(customer)
+
+        return customer
+
+    def delete(self, university_id: str, if_versions: Optional[Sequence[datetime]] = None) -> None:
+        result = self.db.execute(_delete_statement(university_id, if_versions))
+        if result.rowcount == 0:
+            self.db.rollback()
+            self._raise_missing(university_id, if_versions)
+
+        self.db.execute(_tombstone_insert(university_id))
+        if outbox.outbox_enabled:
+            self.db.execute(_outbox_insert("customer.deleted", university_id))
         self.db.commit()
-        self.db.refresh(db_customer)
+        self._after_commit(university_id)
+        if self.search is not None:
+            self.search.remove(university_id)
 
-        return self._to_read_model(db_customer)
+    def _raise_missing(self, university_id: str, if_versions: Optional[Sequence[datetime]]):
+        # Only on the failure path: tell a stale If-Match apart from a missing row
+        if if_versions is not None and self.db.execute(
+            _select_version(Customer.university_id == university_id)
+        ).first():
+            raise CustomerVersionMismatch("Customer was modified since it was read")
+        raise CustomerNotFound("Customer not found")
 
-    def get_by_university_id(self, university_id: str) -> CustomerRead:
-        db_customer = (
-            self.db.query(Customer)
-            .filter(Customer.university_id == university_id)
-            .first()
+    def bulk_create(
+        self,
+        items: Iterable[Union[CustomerCreate, dict[str, Any]]],
+        chunk_size: Optional[int] = None,
+        keep_timestamps: bool = False,
+    ) -> CustomerBatchResult:
+        """With `keep_timestamps`, created_at / updated_at given in dict items
+        are stored instead of the current time for the customers created
+        (restores)."""
+        return self._bulk_write(
+            list(items), chunk_size or batch_chunk_size, upsert=False, keep_timestamps=keep_timestamps
         )
-        if db_customer is None:
-            raise CustomerNotFound("Customer not found")
 
-        return self._to_read_model(db_customer)
+    def bulk_upsert(
+        self,
+        items: Iterable[Union[CustomerCreate, dict[str, Any]]],
+        chunk_size: Optional[int] = None,
+        keep_timestamps: bool = False,
+    ) -> CustomerBatchResult:
+        """Like bulk_create, but existing customers are updated, always with
+        updated_at = now whatever `keep_timestamps` says. Items equal to the
+        stored customer are left alone ("unchanged"): no write, no new
+        updated_at, no change event."""
+        return self._bulk_write(
+            list(items), chunk_size or batch_chunk_size, upsert=True, keep_timestamps=keep_timestamps
+        )
 
-    def get_by_email(self, email: str) -> CustomerRead:
-        db_customer = (
-            self.db.query(Customer)
-            .filter(Customer.email == email)
-            .first()
+    def _bulk_write(
+        self, items: list, chunk_size: int, upsert: bool, keep_timestamps: bool = False
+    ) -> CustomerBatchResult:
+        results: list[Optional[CustomerBatchItemResult]] = [None] * len(items)
+        valid: list[tuple[int, CustomerCreate, dict[str, datetime]]] = []
+        seen_ids: set[str] = set()
+        seen_emails: set[str] = set()
+
+        for index, item in enumerate(items):
+            try:
+                customer_in = (
+                    item if isinstance(item, CustomerCreate) else CustomerCreate.model_validate(item)
+                )
+                timestamps = _item_timestamps(item) if keep_timestamps else {}
+            except (ValidationError, ValueError) as e:
+                results[index] = CustomerBatchItemResult(
+                    index=index,
+                    university_id=_raw_university_id(item),
+                    status="invalid",
+                    detail=_validation_detail(e) if isinstance(e, ValidationError) else str(e),
+                )
+                continue
+
+            if customer_in.university_id in seen_ids or customer_in.email in seen_emails:
+                results[index] = CustomerBatchItemResult(
+                    index=index,
+                    university_id=customer_in.university_id,
+                    status="conflict",
+                    detail="Duplicate university_id or email within the batch.",
+                )
+                continue
+            seen_ids.add(customer_in.university_id)
+            seen_emails.add(customer_in.email)
+            valid.append((index, customer_in, timestamps))
+
+        for start in range(0, len(valid), chunk_size):
+            for result in self._write_chunk(valid[start:start + chunk_size], upsert):
+                results[result.index] = result
+
+        summary = CustomerBatchResult(results=results)
+        for result in results:
+            if result.status == "created":
+                summary.created += 1
+            elif result.status == "updated":
+                summary.updated += 1
+            elif result.status == "unchanged":
+                summary.unchanged += 1
+            elif result.status == "conflict":
+                summary.conflicts += 1
+            else:
+                summary.invalid += 1
+        return summary
+
+    def _write_chunk(
+        self, chunk: list[tuple[int, CustomerCreate, dict[str, datetime]]], upsert: bool
+    ) -> list[CustomerBatchItemResult]:
+        # One SELECT finds every existing id/email the chunk collides with
+        # (and, for an upsert, what the existing rows hold)
+        columns = [Customer.university_id, Customer.email, Customer.created_at]
+        if upsert:
+            columns += [Customer.__table__.c[name] for name in _UPSERT_COLUMNS if name != "email"]
+        existing = {
+            row.university_id: row
+            for row in self.db.execute(
+                select(*columns).where(
+                    or_(
+                        Customer.university_id.in_([c.university_id for _, c, _ in chunk]),
+                        Customer.email.in_([c.email for _, c, _ in chunk]),
+                    )
+                )
+            )
+        }
+        existing_emails = {uid: row.email for uid, row in existing.items()}
+        existing_created = {uid: row.created_at for uid, row in existing.items()}
+        email_owners = {row.email: uid for uid, row in existing.items()}
+
+        results = []
+        rows = []
+        for index, c, timestamps in chunk:
+            current = existing.get(c.university_id)
+            owner = email_owners.get(c.email)
+            detail = None
+            if owner is not None and owner != c.university_id:
+                status, detail = "conflict", f"Email '{c.email}' already belongs to another customer."
+            elif current is not None and not upsert:
+                status = "conflict"
+                detail = f"Customer with university id '{c.university_id}' already exists."
+            elif current is None:
+                status = "created"
+                rows.append(_new_row(c, timestamps))
+            elif all(getattr(current, name) == getattr(c, name) for name in _UPSERT_COLUMNS):
+                # Rewriting it would only move updated_at (the ETag)
+                status = "unchanged"
+            else:
+                # A given updated_at could be older than the stored one: the
+                # change feed would skip the update and the ETag go backwards
+                status = "updated"
+                rows.append(_new_row(c))
+            results.append(
+                CustomerBatchItemResult(
+                    index=index, university_id=c.university_id, status=status, detail=detail
+                )
+            )
+
+        if not rows:
+            return results
+
+        try:
+            # executemany of one statement, compiled once and cached: the
+            # drivers still send multi-row INSERTs, but SQLAlchemy no longer
+            # compiles a fresh statement with a parameter per value per chunk
+            self.db.execute(self._bulk_insert_statement(upsert), rows)
+            if outbox.outbox_enabled:
+                self.db.execute(_bulk_outbox_insert(rows, existing_created))
+            self.db.commit()
+        except IntegrityError:
+            # Lost a race with a concurrent writer; redo the chunk row by row
+            self.db.rollback()
+            if len(chunk) == 1:
+                index, c, _ = chunk[0]
+                return [
+                    CustomerBatchItemResult(
+                        index=index,
+                        university_id=c.university_id,
+                        status="conflict",
+                        detail="Customer with this university id or email already exists.",
+                    )
+                ]
+            return [result for item in chunk for result in self._write_chunk([item], upsert)]
+
+        for row in rows:
+            self._after_commit(row["university_id"], row["email"], existing_emails.get(row["university_id"]))
+        if self.search is not None:
+            self.search.put_many(
+                (row["university_id"], row["first_name"], row["middle_name"], row["last_name"]) for row in rows
+            )
+        return results
+
+    def _bulk_insert_statement(self, upsert: bool):
+        table = Customer.__table__
+        if not upsert:
+            return insert(table)
+
+        dialect = self.db.get_bind().dialect.name
+        if dialect == "mysql":
+            stmt = mysql_insert(table)
+            return stmt.on_duplicate_key_update(
+                **{col: stmt.inserted[col] for col in _UPSERT_COLUMNS},
+                updated_at=stmt.inserted.updated_at,
+            )
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+            stmt = sqlite_insert(table)
+            return stmt.on_conflict_do_update(
+                index_elements=[table.c.university_id],
+                set_={**{col: stmt.excluded[col] for col in _UPSERT_COLUMNS}, "updated_at": stmt.excluded.updated_at},
+            )
+        raise NotImplementedError(f"bulk upsert is not supported on {dialect}")
+
+
+def _utcnow() -> datetime:
+    # Naive UTC, matching what the MySQL DATETIME columns hand back
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+def _new_row(customer_in: CustomerCreate, timestamps: Optional[dict[str, datetime]] = None) -> dict[str, Any]:
+    now = _utcnow()
+    row = {**customer_in.model_dump(), "created_at": now, "updated_at": now}
+    if timestamps:
+        # A record restored with only one of them: created_at <= updated_at
+        row["created_at"] = timestamps.get("created_at", timestamps.get("updated_at", now))
+        row["updated_at"] = timestamps.get("updated_at", now)
+    return row
+
+
+def _item_timestamps(item: Any) -> dict[str, datetime]:
+    """created_at / updated_at given with a bulk item, as naive UTC. Raises
+    ValueError for one that isn't an ISO 8601 timestamp."""
+    timestamps = {}
+    for name in ("created_at", "updated_at"):
+        value = item.get(name) if isinstance(item, dict) else None
+        if value is None or value == "":
+            continue
+        if not isinstance(value, datetime):
+            try:
+                value = datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{name}: not an ISO 8601 timestamp: {value!r}") from None
+        if value.tzinfo is not None:
+            value = value.astimezone(UTC).replace(tzinfo=None)
+        timestamps[name] = value
+    return timestamps
+
+
+def _select_customers(fields: Optional[Sequence[str]] = None, *required: str):
+    # Plain row tuples: no ORM identity map or attribute instrumentation on reads
+    if fields is None:
+        return select(*Customer.__table__.columns)
+    columns = Customer.__table__.c
+    return select(*(columns[name] for name in dict.fromkeys((*fields, *required))))
+
+
+def _project(customer, fields: Sequence[str]) -> dict[str, Any]:
+    # customer is a row or a CustomerRead
+    return {name: getattr(customer, name) for name in fields}
+
+
+def parse_fields(fields: Optional[str]) -> Optional[tuple[str, ...]]:
+    """`fields=a,b` -> ("a", "b"); None selects everything. Raises
+    ValueError for names that aren't CustomerRead fields."""
+    if not fields:
+        return None
+    names = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in CUSTOMER_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)} (allowed: {', '.join(CUSTOMER_FIELDS)})")
+    return names or None
+
+
+def _select_by_id(university_id: str):
+    return _select_customers().where(Customer.university_id == university_id)
+
+
+def _select_version(condition):
+    return select(Customer.updated_at).where(condition)
+
+
+def _matches_version(university_id: str, if_versions: Optional[Sequence[datetime]]):
+    condition = Customer.university_id == university_id
+    if if_versions is not None:
+        condition = and_(condition, Customer.updated_at.in_(list(if_versions)))
+    return condition
+
+
+def _update_statement(
+    university_id: str, update_in: CustomerUpdate, if_versions: Optional[Sequence[datetime]] = None
+):
+    data = update_in.model_dump(exclude_unset=True)
+    data.pop("university_id", None)
+    data["updated_at"] = _utcnow()
+    return update(Customer).where(_matches_version(university_id, if_versions)).values(**data)
+
+
+def _delete_statement(university_id: str, if_versions: Optional[Sequence[datetime]] = None):
+    return delete(Customer).where(_matches_version(university_id, if_versions))
+
+
+def _tombstone_insert(university_id: str):
+    return insert(CustomerTombstone).values(university_id=university_id, deleted_at=_utcnow())
+
+
+def _outbox_insert(event_type: str, university_id: str, customer: Optional[CustomerRead] = None):
+    return outbox.outbox_insert([outbox.outbox_row(event_type, university_id, customer, _utcnow())])
+
+
+def _bulk_outbox_insert(rows: list[dict[str, Any]], existing_created: dict[str, datetime]):
+    events = []
+    for row in rows:
+        created_at = existing_created.get(row["university_id"])
+        customer = CustomerRead.model_validate(
+            {**row, "created_at": created_at} if created_at else row
         )
-        if db_customer is None:
-            print("Customer with email %s not found", email)
-            raise CustomerNotFound("Customer not found")
+        event_type = "customer.updated" if created_at else "customer.created"
+        events.append(outbox.outbox_row(event_type, row["university_id"], customer, row["updated_at"]))
+    return outbox.outbox_insert(events)
+
+
+def _id_flight(university_id: str) -> str:
+    return f"id:{university_id}"
+
+
+def _email_flight(email: str) -> str:
+    return f"email:{email}"
+
+
+def encode_change_cursor(changed_at: datetime, university_id: str) -> str:
+    raw = f"{changed_at.isoformat()}|{university_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_change_cursor(cursor: str) -> tuple[datetime, str]:
+    """Raises ValueError for a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        changed_at, university_id = raw.split("|", 1)
+        return datetime.fromisoformat(changed_at), university_id
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid change cursor: {cursor!r}") from e
+
+
+def _change_feed_selects(after: Optional[tuple[datetime, str]], horizon: datetime, limit: int):
+    """(customers, tombstones) statements for one change feed page."""
+    upserts = _select_customers().where(Customer.updated_at <= horizon)
+    deletes = select(CustomerTombstone.university_id, CustomerTombstone.deleted_at).where(
+        CustomerTombstone.deleted_at <= horizon
+    )
+    if after is not None:
+        upserts = upserts.where(_after_cursor(Customer.updated_at, Customer.university_id, after))
+        deletes = deletes.where(_after_cursor(CustomerTombstone.deleted_at, CustomerTombstone.university_id, after))
+    upserts = upserts.order_by(Customer.updated_at, Customer.university_id).limit(limit)
+    deletes = deletes.order_by(CustomerTombstone.deleted_at, CustomerTombstone.university_id).limit(limit)
+    return upserts, deletes
+
+
+def _after_cursor(changed_at_col, university_id_col, after: tuple[datetime, str]):
+    return _after_keys((changed_at_col, university_id_col), after)
+
+
+def _after_keys(columns: Sequence[Column], values: Sequence[Any]):
+    """(columns) > (values), spelled a >= x AND (a > x OR ...) so that the
+    leading column bounds an index range scan in index order (a plain OR of
+    the cases makes planners merge two scans and sort)."""
+    if len(columns) == 1:
+        return columns[0] > values[0]
+    return and_(columns[0] >= values[0], or_(columns[0] > values[0], _after_keys(columns[1:], values[1:])))
+
 
-        return self._to_read_model(db_customer)
+def _page_order(filters: Optional[CustomerFilter]) -> tuple[Column, ...]:
+    """Columns a page of customers is ordered and keyset-paginated by: those
+    of the index serving `filters`, ending in university_id. Ordering a
+    filtered page by university_id instead would sort every matching row
+    for each page."""
+    if filters is not None:
+        if filters.last_name_prefix:
+            return Customer.last_name, Customer.first_name, Customer.university_id
+        if filters.status is not None or filters.updated_after is not None or filters.updated_before is not None:
+            # ix_customers_status_updated_at_university_id, or without a
+            # status ix_customers_updated_at_university_id
+            return Customer.updated_at, Customer.university_id
+    return (Customer.university_id,)
 
-    def update(self, university_id: str, update_in: CustomerUpdate) -> CustomerRead:
-        db_customer = (
-            self.db.query(Customer)
-            .filter(Customer.university_id == university_id)
-            .first()
+
+def encode_page_cursor(row, order: Sequence[Column]) -> str:
+    if len(order) == 1:
+        return getattr(row, order[0].key)
+    values = [getattr(row, column.key) for column in order]
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_page_cursor(cursor: str, order: Sequence[Column]) -> tuple:
+    """Raises ValueError for a cursor that doesn't fit `order` (e.g. one
+    from a list with other filters)."""
+    if len(order) == 1:
+        return (cursor,)
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode())
+        if not isinstance(values, list) or len(values) != len(order) or not all(isinstance(v, str) for v in values):
+            raise ValueError
+        return tuple(
+            datetime.fromisoformat(value) if isinstance(column.type, DateTime) else value
+            for column, value in zip(order, values)
         )
-        if db_customer is None:
-            raise CustomerNotFound("Customer not found")
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid page cursor: {cursor!r}") from e
 
-        data = update_in.model_dump(exclude_unset=True)
-        data.pop("university_id", None)
 
-        for field, value in data.items():
-            setattr(db_customer, field, value)
+def _already_exists(customer_in: CustomerCreate, e: IntegrityError) -> CustomerAlreadyExists:
+    if "email" in str(e.orig):
+        return CustomerAlreadyExists(f"Customer with email '{customer_in.email}' already exists.")
+    return CustomerAlreadyExists(
+        f"Customer with university id '{customer_in.university_id}' already exists."
+    )
+
+
+def _update_conflict(update_in: CustomerUpdate, e: IntegrityError) -> Exception:
+    # The email is the only unique key an update can change; any other
+    # violation is a bug, not a conflict, and stays an IntegrityError
+    if update_in.email is not None and "email" in str(e.orig):
+        return CustomerAlreadyExists(f"Customer with email '{update_in.email}' already exists.")
+    return e
+
+
+def _raw_university_id(item: Any) -> Optional[str]:
+    if isinstance(item, dict) and isinstance(item.get("university_id"), str):
+        return item["university_id"]
+    return None
+
+
+def _validation_detail(e: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors()
+    )
 
-        self.db.commit()
-        self.db.refresh(db_customer)
 
-        return self._to_read_model(db_customer)
+class AsyncCustomerRepository:
+    """Async mirror of CustomerRepository, used by the async route variants."""
 
-    def delete(self, university_id: str) -> None:
-        db_customer = (
-            self.db.query(Customer)
-            .filter(Customer.university_id == university_id)
-            .first()
+    def __init__(
+        self,
+        db: "AsyncSession",
+        cache: Optional[CustomerCache] = None,
+        flights: Optional[AsyncSingleFlight] = None,
+        search: Optional["CustomerSearchIndex"] = None,
+        fill_cache: bool = True,
+    ):
+        self.db = db
+        self.cache = cache
+        self.fill_cache = fill_cache
+        self.flights = flights
+        self.search = search
+
+    _to_read_model = CustomerRepository._to_read_model
+    _fill_token = CustomerRepository._fill_token
+    _cache_put = CustomerRepository._cache_put
+    _after_commit = CustomerRepository._after_commit
+
+    async def create(self, customer_in: CustomerCreate) -> CustomerRead:
+        values = _new_row(customer_in)
+        customer = CustomerRead.model_validate(values)
+        try:
+            await self.db.execute(insert(Customer).values(**values))
+            if outbox.outbox_enabled:
+                await self.db.execute(_outbox_insert("customer.created", customer.university_id, customer))
+            await self.db.commit()
+        except IntegrityError as e:
+            await self.db.rollback()
+            raise _already_exists(customer_in, e)
+        self._after_commit(customer.university_id, customer.email)
+        if self.search is not None:
+            self.search.put_customer(customer)
+
+        return customer
+
+    async def get_by_university_id(self, university_id: str) -> CustomerRead:
+        if self.cache:
+            cached = self.cache.get_by_university_id(university_id)
+            if cached is not None:
+                return cached
+
+        if self.flights is None:
+            return await self._load_by_university_id(university_id)
+        return await self.flights.do(
+            _id_flight(university_id), lambda: self._load_by_university_id(university_id)
         )
-        if db_customer is None:
+
+    async def _load_by_university_id(self, university_id: str) -> CustomerRead:
+        token = self._fill_token()
+        row = (await self.db.execute(_select_by_id(university_id))).first()
+        if row is None:
             raise CustomerNotFound("Customer not found")
 
-        self.db.delete(db_customer)
-        self.db.commit()
+        return self._cache_put(self._to_read_model(row), token)
+
+    async def get_by_email(self, email: str) -> CustomerRead:
+        if self.cache:
+            cached = self.cache.get_by_email(email)
+            if cached is not None:
+                return cached
+
+        if self.flights is None:
+            return await self._load_by_email(email)
+        return await self.flights.do(_email_flight(email), lambda: self._load_by_email(email))
+
+    async def _load_by_email(self, email: str) -> CustomerRead:
+        token = self._fill_token()
+        row = (await self.db.execute(_select_customers().where(Customer.email == email))).first()
+        if row is None:
+            raise CustomerNotFound("Customer not found")
+
+        return self._cache_put(self._to_read_model(row), token)
+
+    async def get_version(self, university_id: str) -> datetime:
+        if self.cache:
+            cached = self.cache.get_by_university_id(university_id)
+            if cached is not None:
+                return cached.updated_at
+
+        version = (await self.db.execute(_select_version(Customer.university_id == university_id))).scalar()
+        if version is None:
+            raise CustomerNotFound("Customer not found")
+        return version
+
+    async def get_version_by_email(self, email: str) -> datetime:
+        if self.cache:
+            cached = self.cache.get_by_email(email)
+            if cached is not None:
+                return cached.updated_at
+
+        version = (await self.db.execute(_select_version(Customer.email == email))).scalar()
+        if version is None:
+            raise CustomerNotFound("Customer not found")
+        return version
+
+    async def project_by_university_id(
+        self, university_id: str, fields: Sequence[str]
+    ) -> tuple[dict[str, Any], datetime]:
+        if self.cache:
+            cached = self.cache.get_by_university_id(university_id)
+            if cached is not None:
+                return _project(cached, fields), cached.updated_at
+
+        stmt = _select_customers(fields, "updated_at").where(Customer.university_id == university_id)
+        row = (await self.db.execute(stmt)).first()
+        if row is None:
+            raise CustomerNotFound("Customer not found")
+        return _project(row, fields), row.updated_at
+
+    async def project_by_email(self, email: str, fields: Sequence[str]) -> tuple[dict[str, Any], datetime]:
+        if self.cache:
+            cached = self.cache.get_by_email(email)
+            if cached is not None:
+                return _project(cached, fields), cached.updated_at
+
+        stmt = _select_customers(fields, "updated_at").where(Customer.email == email)
+        row = (await self.db.execute(stmt)).first()
+        if row is None:
+            raise CustomerNotFound("Customer not found")
+        return _project(row, fields), row.updated_at
+
+    async def update(
+        self,
+        university_id: str,
+        update_in: CustomerUpdate,
+        if_versions: Optional[Sequence[datetime]] = None,
+    ) -> CustomerRead:
+        stmt = _update_statement(university_id, update_in, if_versions)
+        try:
+            if self.db.get_bind().dialect.update_returning:
+                row = (await self.db.execute(stmt.returning(*Customer.__table__.columns))).first()
+            else:
+                result = await self.db.execute(stmt)
+                row = None
+                if result.rowcount:
+                    row = (await self.db.execute(_select_by_id(university_id))).first()
+            if row is None:
+                await self.db.rollback()
+                await self._raise_missing(university_id, if_versions)
+            customer = self._to_read_model(row)
+            if outbox.outbox_enabled:
+                await self.db.execute(_outbox_insert("customer.updated", university_id, customer))
+            await self.db.commit()
+        except IntegrityError as e:
+            await self.db.rollback()
+            raise _update_conflict(update_in, e)
+        self._after_commit(university_id, customer.email)
+        if self.search is not None:
+            self.search.put_customer(customer)
+
+        return customer
+
+    async def delete(self, university_id: str, if_versions: Optional[Sequence[datetime]] = None) -> None:
+        result = await self.db.execute(_delete_statement(university_id, if_versions))
+        if result.rowcount == 0:
+            await self.db.rollback()
+            await self._raise_missing(university_id, if_versions)
+
+        await self.db.execute(_tombstone_insert(university_id))
+        if outbox.outbox_enabled:
+            await self.db.execute(_outbox_insert("customer.deleted", university_id))
+        await self.db.commit()
+        self._after_commit(university_id)
+        if self.search is not None:
+            self.search.remove(university_id)
+
+    async def _raise_missing(self, university_id: str, if_versions: Optional[Sequence[datetime]]):
+        if if_versions is not None and (
+            await self.db.execute(_select_version(Customer.university_id == university_id))
+        ).first():
+            raise CustomerVersionMismatch("Customer was modified since it was read")
+        raise CustomerNotFound("Customer not found")
@@ -0,0 +1,431 @@
+"""Stream customers between CSV / NDJSON files and the customers table.
+
+    python customers_io.py import students.csv [--upsert] [--keep-timestamps]
+    python customers_io.py export backup.ndjson [--status active] [--fields university_id,email]
+
+The format follows the extension (.csv, .ndjson or .jsonl, optionally
+gzipped as .gz) unless --format is given. CSV files have a header row; empty
+cells are treated as absent.
+
+Import reads the file one chunk (--chunk-size rows) at a time. Each chunk is
+validated against CustomerCreate and written as one multi-row INSERT (an
+upsert with --upsert) in its own transaction, by the same
+CustomerRepository.bulk_create / bulk_upsert that serve POST /customers:batch,
+so conflicts and change events behave the same. Rows that fail validation or
+conflict go to <file>.rejects.ndjson with their record number. Customers
+get created_at / updated_at of the import, except that --keep-timestamps
+takes them from the file, when present, for the customers it creates (to
+restore an export); those old updated_at values are behind change feed
+readers that have moved past them. Updated customers always get a new
+updated_at, and --upsert leaves customers equal to their record untouched,
+updated_at included. Outbox events are written as usual.
+
+Export reads through a server-side cursor in university_id order, from a
+replica with --from-replica.
+
+Both hold one chunk in memory whatever the file size, report progress on
+stderr, and record after every chunk how far they got in <file>.checkpoint.
+Running the same command again resumes from there (--restart ignores it);
+the checkpoint is removed once the run completes. A crash between a chunk's
+commit and its checkpoint replays that chunk on resume: a no-op with
+--upsert, reported as conflicts otherwise. Gzipped exports always restart.
+
+Settings (environment): CUSTOMER_IO_CHUNK_SIZE (default 1000),
+CUSTOMER_IO_PROGRESS_SECONDS (default 2), plus the DATABASE_* settings of
+the service.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+import time
+from datetime import date, datetime
+from typing import Any, Callable, Iterator, NamedTuple, Optional, Sequence
+
+from pydantic_core import to_json
+from sqlalchemy.orm import Session
+
+from customer_repository import CUSTOMER_FIELDS, CustomerRepository, parse_fields
+from db import SessionLocal, read_session
+from models.customer import CustomerFilter
+
+io_chunk_size = int(os.environ.get("CUSTOMER_IO_CHUNK_SIZE", 1000))
+progress_seconds = float(os.environ.get("CUSTOMER_IO_PROGRESS_SECONDS", 2))
+
+FORMATS = ("csv", "ndjson")
+
+
+class CheckpointMismatch(Exception):
+    pass
+
+
+class InvalidRecord(NamedTuple):
+    """A record that could not be parsed at all (e.g. malformed JSON)."""
+
+    detail: str
+
+
+def file_format(path: str, fmt: Optional[str] = None) -> str:
+    if fmt:
+        return fmt
+    name = path[:-3] if path.endswith(".gz") else path
+    extension = os.path.splitext(name)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".ndjson", ".jsonl"):
+        return "ndjson"
+    raise ValueError(f"Can't tell the format of {path} from its extension; pass --format")
+
+
+def _open(path: str, mode: str):
+    # Binary: offsets in checkpoints are byte offsets
+    return gzip.open(path, mode) if path.endswith(".gz") else open(path, mode)
+
+
+def load_checkpoint(path: str) -> Optional[dict[str, Any]]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(path: str, state: dict[str, Any]) -> None:
+    # Replaced atomically, so a crash leaves the previous checkpoint intact
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _resume_state(checkpoint: str, restart: bool, run: dict[str, Any]) -> Optional[dict[str, Any]]:
+    """The saved state to resume from, if any. `run` identifies the run
+    (file, format, options); a checkpoint saved by a different one is an
+    error rather than a silent restart."""
+    state = None if restart else load_checkpoint(checkpoint)
+    if state is not None and state["run"] != run:
+        raise CheckpointMismatch(
+            f"{checkpoint} was saved by a different run (or the file has changed); "
+            "use --restart to start over"
+        )
+    return state
+
+
+class Progress:
+    """Throttled one-line progress reports on stderr."""
+
+    def __init__(
+        self,
+        action: str,
+        total_bytes: Optional[int] = None,
+        resumed_at: int = 0,
+        every: float = progress_seconds,
+    ):
+        self.action = action
+        self.total_bytes = total_bytes
+        # Records done by earlier runs don't count towards this run's rate
+        self.done_at_start = resumed_at
+        self.every = every
+        self.started = time.perf_counter()
+        self.last = self.started
+
+    def __call__(self, state: dict[str, Any], final: bool = False) -> None:
+        now = time.perf_counter()
+        if not final and now - self.last < self.every:
+            return
+        self.last = now
+        rate = (state["records"] - self.done_at_start) / max(now - self.started, 1e-9)
+        done = f" ({100 * state['offset'] / self.total_bytes:.1f}%)" if self.total_bytes else ""
+        counts = "".join(
+            f", {name} {state[name]}"
+            for name in ("created", "updated", "unchanged", "conflicts", "invalid")
+            if name in state
+        )
+        print(f"{self.action}: {state['records']} records{done}{counts}, {rate:,.0f} records/s", file=sys.stderr)
+
+
+class _LineReader:
+    """Decoded lines of a binary file, counting the bytes handed out so the
+    offset always ends at the last complete record read."""
+
+    def __init__(self, f, offset: int = 0):
+        self.f = f
+        self.offset = offset
+
+    def __iter__(self) -> Iterator[str]:
+        for line in self.f:
+            self.offset += len(line)
+            yield line.decode("utf-8")
+
+
+def read_records(f, fmt: str, offset: int = 0) -> Iterator[tuple[Any, int]]:
+    """(record, offset just past it) for each record in `f`, starting at
+    byte `offset` (0, or an offset this function returned)."""
+    lines = _LineReader(f)
+    if fmt == "csv":
+        # csv pulls further lines only for quoted values spanning lines
+        reader = csv.reader(lines)
+        header = [name.strip() for name in next(reader, [])]
+        if header:
+            header[0] = header[0].lstrip("\ufeff")
+        if offset:
+            f.seek(offset)
+            lines.offset = offset
+        for row in reader:
+            if row:
+                yield {name: value for name, value in zip(header, row) if value != ""}, lines.offset
+        return
+
+    if offset:
+        f.seek(offset)
+        lines.offset = offset
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line), lines.offset
+        except ValueError as e:
+            yield InvalidRecord(f"Invalid JSON: {e}"), lines.offset
+
+
+def import_file(
+    path: str,
+    sessions: Callable[[], Session] = SessionLocal,
+    fmt: Optional[str] = None,
+    upsert: bool = False,
+    keep_timestamps: bool = False,
+    chunk_size: int = io_chunk_size,
+    checkpoint: Optional[str] = None,
+    rejects: Optional[str] = None,
+    restart: bool = False,
+    report: Optional[Callable[..., None]] = None,
+) -> dict[str, Any]:
+    """Load `path` into the customers table; returns the final counts."""
+    fmt = file_format(path, fmt)
+    checkpoint = checkpoint or f"{path}.checkpoint"
+    rejects = rejects or f"{path}.rejects.ndjson"
+    stat = os.stat(path)
+    run = {
+        "path": os.path.abspath(path),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "format": fmt,
+        "upsert": upsert,
+        "keep_timestamps": keep_timestamps,
+    }
+    state = _resume_state(checkpoint, restart, run) or {
+        "run": run, "offset": 0, "records": 0, "created": 0, "updated": 0, "unchanged": 0, "conflicts": 0, "invalid": 0,
+    }
+    # Checkpoints written before "unchanged" was counted
+    state.setdefault("unchanged", 0)
+    if state["offset"] == 0:
+        _remove(rejects)
+    if report is None:
+        report = Progress("import", None if path.endswith(".gz") else stat.st_size, state["records"])
+
+    def write_chunk(records: list, end: int) -> None:
+        first = state["records"] + 1
+        results = []
+        parsed = [(n, record) for n, record in enumerate(records, first) if not isinstance(record, InvalidRecord)]
+        if parsed:
+            with sessions() as db:
+                # No cache: this process never reads customers back
+                repo = CustomerRepository(db)
+                # One transaction per chunk
+                items = [record for _, record in parsed]
+                write = repo.bulk_upsert if upsert else repo.bulk_create
+                batch = write(items, len(items), keep_timestamps=keep_timestamps)
+            for (n, _), result in zip(parsed, batch.results):
+                results.append((n, result.status, result.university_id, result.detail))
+        results += [
+            (n, "invalid", None, record.detail)
+            for n, record in enumerate(records, first)
+            if isinstance(record, InvalidRecord)
+        ]
+
+        rejected = [r for r in results if r[1] in ("conflict", "invalid")]
+        if rejected:
+            with open(rejects, "a") as out:
+                for n, status, university_id, detail in sorted(rejected):
+                    out.write(json.dumps({"record": n, "status": status, "university_id": university_id, "detail": detail}) + "\n")
+        for _, status, _, _ in results:
+            state["conflicts" if status == "conflict" else status] += 1
+        state["records"] += len(records)
+        state["offset"] = end
+        save_checkpoint(checkpoint, state)
+        report(state)
+
+    with _open(path, "rb") as f:
+        chunk: list = []
+        end = state["offset"]
+        for record, end in read_records(f, fmt, state["offset"]):
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                write_chunk(chunk, end)
+                chunk = []
+        if chunk:
+            write_chunk(chunk, end)
+
+    report(state, final=True)
+    _remove(checkpoint)
+    return state
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def export_file(
+    path: str,
+    sessions: Callable[[], Session] = read_session,
+    fmt: Optional[str] = None,
+    filters: Optional[CustomerFilter] = None,
+    fields: Optional[Sequence[str]] = None,
+    chunk_size: int = io_chunk_size,
+    checkpoint: Optional[str] = None,
+    restart: bool = False,
+    report: Optional[Callable[..., None]] = None,
+) -> dict[str, Any]:
+    """Write the (matching) customers to `path`; returns the final counts."""
+    fmt = file_format(path, fmt)
+    fields = tuple(fields) if fields else None
+    columns = fields or CUSTOMER_FIELDS
+    checkpoint = checkpoint or f"{path}.checkpoint"
+    run = {
+        "path": os.path.abspath(path),
+        "format": fmt,
+        "filters": filters.model_dump(mode="json") if filters else None,
+        "fields": fields,
+    }
+    # A gzip stream can't be cut back to a checkpointed offset
+    resumable = not path.endswith(".gz")
+    state = _resume_state(checkpoint, restart, json.loads(json.dumps(run))) if resumable else None
+    state = state or {"run": run, "after": None, "offset": 0, "records": 0}
+    report = report or Progress("export", resumed_at=state["records"])
+
+    if state["offset"]:
+        # Drop anything written after the last checkpoint
+        f = open(path, "r+b")
+        f.seek(state["offset"])
+        f.truncate()
+    else:
+        f = _open(path, "wb")
+    with f, sessions() as db:
+        text = io.StringIO()
+        writer = csv.writer(text, lineterminator="\n")
+        if fmt == "csv" and not state["offset"]:
+            writer.writerow(columns)
+
+        def flush() -> None:
+            f.write(text.getvalue().encode())
+            text.seek(0)
+            text.truncate()
+            if resumable:
+                f.flush()
+                state["offset"] = f.tell()
+                save_checkpoint(checkpoint, state)
+            report(state)
+
+        pending = 0
+        # university_id is always read: it is the resume position
+        selected = fields if not fields or "university_id" in fields else (*fields, "university_id")
+        for customer in CustomerRepository(db).iter_customers(filters, selected, after=state["after"]):
+            values = customer if isinstance(customer, dict) else customer.model_dump()
+            if fmt == "csv":
+                writer.writerow([_csv_value(values[name]) for name in columns])
+            else:
+                text.write(to_json(customer if selected == fields else {name: values[name] for name in columns}).decode())
+                text.write("\n")
+            state["after"] = values["university_id"]
+            state["records"] += 1
+            pending += 1
+            if pending >= chunk_size:
+                flush()
+                pending = 0
+        flush()
+
+    report(state, final=True)
+    _remove(checkpoint)
+    return state
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    load = commands.add_parser("import", help="load a CSV/NDJSON file into the customers table")
+    load.add_argument("path")
+    load.add_argument("--upsert", action="store_true", help="update customers that already exist")
+    load.add_argument(
+        "--keep-timestamps",
+        action="store_true",
+        help="created customers keep created_at/updated_at from the file (restoring an export)",
+    )
+    load.add_argument("--rejects", help="where to write rejected records (default <path>.rejects.ndjson)")
+
+    dump = commands.add_parser("export", help="write customers to a CSV/NDJSON file")
+    dump.add_argument("path")
+    dump.add_argument("--fields", help=f"comma-separated columns (any of {', '.join(CUSTOMER_FIELDS)})")
+    dump.add_argument("--status")
+    dump.add_argument("--last-name-prefix")
+    dump.add_argument("--updated-after", type=datetime.fromisoformat)
+    dump.add_argument("--from-replica", action="store_true", help="read from a replica when configured")
+
+    for command in (load, dump):
+        command.add_argument("--format", choices=FORMATS, help="default: from the file extension")
+        command.add_argument("--chunk-size", type=int, default=io_chunk_size)
+        command.add_argument("--checkpoint", help="progress file (default <path>.checkpoint)")
+        command.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+
+    args = parser.parse_args(argv)
+    try:
+        if args.command == "import":
+            state = import_file(
+                args.path,
+                fmt=args.format,
+                upsert=args.upsert,
+                keep_timestamps=args.keep_timestamps,
+                chunk_size=args.chunk_size,
+                checkpoint=args.checkpoint,
+                rejects=args.rejects,
+                restart=args.restart,
+            )
+            if state["conflicts"] or state["invalid"]:
+                print(f"Rejected records: {args.rejects or args.path + '.rejects.ndjson'}", file=sys.stderr)
+        else:
+            filters = CustomerFilter(
+                status=args.status, last_name_prefix=args.last_name_prefix, updated_after=args.updated_after
+            )
+            export_file(
+                args.path,
+                sessions=lambda: read_session(primary=not args.from_replica),
+                fmt=args.format,
+                filters=filters,
+                fields=parse_fields(args.fields),
+                chunk_size=args.chunk_size,
+                checkpoint=args.checkpoint,
+                restart=args.restart,
+            )
+    except (OSError, ValueError, CheckpointMismatch) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -63,9 +63,18 @@
 #     finally:
 #         db.close()
 
+import itertools
+import logging
 import os
-from sqlalchemy import create_engine, URL
+import threading
+import time
+from typing import Callable, Optional
+
+from sqlalchemy import create_engine, event, make_url, URL
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlalchemy.orm import sessionmaker, declarative_base
+from starlette.requests import Request
 from dotenv import load_dotenv
 
 # Load .env file
@@ -78,8 +87,32 @@ db_name = os.environ.get("MYSQL_DB", "addresses")
 db_host = os.environ.get("MYSQL_HOST", "localhost")
 db_port = int(os.environ.get("MYSQL_PORT", 3306))
 connection_name = os.environ.get("INSTANCE_CONNECTION_NAME")
+# Driver used by the async engine (aiomysql or asyncmy)
+db_async_driver = os.environ.get("MYSQL_ASYNC_DRIVER", "mysql+aiomysql")
+# Full SQLAlchemy URL that overrides the MYSQL_* connection settings,
+# e.g. sqlite:///local.db for a local stand-in
+database_url = os.environ.get("DATABASE_URL")
+
+# Connection pool settings (SQLAlchemy defaults are pool_size=5, no pre-ping, no recycle)
+db_pool_size = int(os.environ.get("MYSQL_POOL_SIZE", 10))
+db_max_overflow = int(os.environ.get("MYSQL_MAX_OVERFLOW", 10))
+db_pool_timeout = float(os.environ.get("MYSQL_POOL_TIMEOUT", 30))
+# Recycle before Cloud SQL / MySQL wait_timeout drops idle connections
+db_pool_recycle = int(os.environ.get("MYSQL_POOL_RECYCLE", 1800))
+db_pool_pre_ping = os.environ.get("MYSQL_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# Number of connections to open in on_startup before serving traffic (0 = off)
+db_pool_warmup = int(os.environ.get("MYSQL_POOL_WARMUP", 0))
+
+# Read replicas: comma-separated SQLAlchemy URLs (empty = every query goes to
+# the primary). Reads that tolerate replication lag go to them round-robin.
+db_replica_urls = [u.strip() for u in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+# A replica whose connection or query fails is skipped for this long
+db_replica_eject_seconds = float(os.environ.get("DB_REPLICA_EJECT_SECONDS", 30))
+# After a write, that client's reads go to the primary for this long; keep it
+# above the replicas' usual replication lag
+read_your_writes_seconds = float(os.environ.get("READ_YOUR_WRITES_SECONDS", 5))
 
-print(connection_name)
+logger = logging.getLogger(__name__)
 
 # BUILD THE URL OBJECT SAFELY
 # This method automatically handles special characters like '@' in passwords
@@ -104,10 +137,91 @@ connection_url = URL.create(
     port=db_port,
     database=db_name
 )
-print(connection_url)
+if database_url:
+    connection_url = make_url(database_url)
+
+class PoolStats:
+    """Counters for sizing the pool: checkouts, time spent waiting for a free
+    connection, and how often the wait ran into MYSQL_POOL_TIMEOUT."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.connects = 0
+            self.timeouts = 0
+            self.wait_time_total = 0.0
+            self.wait_time_max = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_time_total += seconds
+            if seconds > self.wait_time_max:
+                self.wait_time_max = seconds
+
+    def record_connect(self):
+        with self._lock:
+            self.connects += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "connects": self.connects,
+                "timeouts": self.timeouts,
+                "wait_time_total": round(self.wait_time_total, 6),
+                "wait_time_max": round(self.wait_time_max, 6),
+                "wait_time_avg": round(self.wait_time_total / self.checkouts, 6) if self.checkouts else 0.0,
+            }
+
+
+pool_stats = PoolStats()
+
+
+class _TimedPoolMixin:
+    # _do_get is where QueuePool blocks when every connection is checked out
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            pool_stats.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_stats.record_wait(time.perf_counter() - start)
+        return conn
+
+    def _create_connection(self):
+        pool_stats.record_connect()
+        return super()._create_connection()
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_options() -> dict:
+    return {
+        "pool_size": db_pool_size,
+        "max_overflow": db_max_overflow,
+        "pool_timeout": db_pool_timeout,
+        "pool_recycle": db_pool_recycle,
+        "pool_pre_ping": db_pool_pre_ping,
+    }
+
 
 # CREATE ENGINE
-engine = create_engine(connection_url)
+engine = create_engine(connection_url, poolclass=TimedQueuePool, **pool_options())
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -120,7 +234,212 @@ def get_db():
         db.close()
 
 
+# ASYNC ENGINE
+# Same database as `engine`, but driven by an asyncio driver so that async
+# routes don't hold a threadpool worker for the whole MySQL round trip.
+# Created lazily: sync-only deployments never need the async driver installed.
+async_connection_url = connection_url.set(
+    drivername="sqlite+aiosqlite" if connection_url.get_backend_name() == "sqlite" else db_async_driver
+)
+_async_engine = None
+_AsyncSessionLocal = None
+
+
+def get_async_engine():
+    global _async_engine, _AsyncSessionLocal
+    if _async_engine is None:
+        # Imported here to keep sqlalchemy.ext.asyncio off the sync startup path
+        from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+        _async_engine = create_async_engine(
+            async_connection_url, poolclass=TimedAsyncQueuePool, **pool_options()
+        )
+        _AsyncSessionLocal = async_sessionmaker(
+            _async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+        )
+    return _async_engine
+
+
+async def get_async_db():
+    get_async_engine()
+    async with _AsyncSessionLocal() as db:
+        yield db
+
+
+def pool_status() -> dict:
+    pool = engine.pool
+    status = {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": db_max_overflow,
+    }
+    status.update(pool_stats.snapshot())
+    if replicas is not None:
+        status["replicas"] = replicas.status()
+    return status
+
+
+def warm_up_pool(connections: int = db_pool_warmup) -> int:
+    """Open `connections` pooled connections up front so the first requests
+    after a cold start don't each pay for a TCP + auth handshake."""
+    connections = min(connections, db_pool_size)
+    opened = []
+    try:
+        for _ in range(connections):
+            opened.append(engine.connect())
+    finally:
+        # Returned to the pool (not closed) since we stay within pool_size
+        for conn in opened:
+            conn.close()
+    return len(opened)
+
+
+async def dispose_async_engine():
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    if replicas is not None:
+        await replicas.dispose_async()
+
+
+# READ REPLICAS
+class ReplicaSet:
+    """Engines for the read replicas, handed out round-robin.
+
+    A replica is ejected for `eject_seconds` when a connection or statement
+    on it fails with an OperationalError (unreachable, disconnected,
+    missing schema...), then tried again. The request that hit the failure
+    still fails; later ones go to the other replicas, or to the primary if
+    none is left."""
+
+    def __init__(self, urls: list[str], eject_seconds: float = db_replica_eject_seconds):
+        self.urls = [make_url(url) for url in urls]
+        self.eject_seconds = eject_seconds
+        # Replicas don't feed pool_stats: those size the primary's pool
+        self.engines = [create_engine(url, **pool_options()) for url in self.urls]
+        self._async_engines: list = [None] * len(self.urls)
+        self._async_sessions: list = [None] * len(self.urls)
+        self._ejected_until = [0.0] * len(self.urls)
+        self._next = itertools.count()
+        self._engine_hooks: list[Callable] = []
+        for index, replica in enumerate(self.engines):
+            self._watch(index, replica)
+
+    def _watch(self, index: int, replica_engine) -> None:
+        def on_error(context):
+            if context.is_disconnect or isinstance(context.sqlalchemy_exception, OperationalError):
+                self.eject(index)
+
+        event.listen(replica_engine, "handle_error", on_error)
+
+    def instrument(self, hook: Callable) -> None:
+        """Apply `hook` (e.g. middleware.metrics.instrument_engine) to every
+        replica engine, sync and async, including async ones created later."""
+        self._engine_hooks.append(hook)
+        for replica_engine in self.engines:
+            hook(replica_engine)
+        for async_engine in self._async_engines:
+            if async_engine is not None:
+                hook(async_engine.sync_engine)
+
+    def eject(self, index: int) -> None:
+        self._ejected_until[index] = time.monotonic() + self.eject_seconds
+        logger.warning(
+            "Read replica %s ejected for %.0fs",
+            self.urls[index].render_as_string(hide_password=True),
+            self.eject_seconds,
+        )
+
+    def pick(self) -> Optional[int]:
+        """Index of the next healthy replica, or None if all are ejected."""
+        now = time.monotonic()
+        for _ in range(len(self.engines)):
+            index = next(self._next) % len(self.engines)
+            if self._ejected_until[index] <= now:
+                return index
+        return None
+
+    def async_session(self, index: int):
+        if self._async_engines[index] is None:
+            from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+            url = self.urls[index]
+            async_engine = create_async_engine(
+                url.set(drivername="sqlite+aiosqlite" if url.get_backend_name() == "sqlite" else db_async_driver),
+                **pool_options(),
+            )
+            self._watch(index, async_engine.sync_engine)
+            for hook in self._engine_hooks:
+                hook(async_engine.sync_engine)
+            self._async_engines[index] = async_engine
+            self._async_sessions[index] = async_sessionmaker(
+                async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+            )
+        return self._async_sessions[index]()
+
+    def status(self) -> list[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "url": url.render_as_string(hide_password=True),
+                "healthy": ejected_until <= now,
+                "checked_out": replica.pool.checkedout(),
+            }
+            for url, replica, ejected_until in zip(self.urls, self.engines, self._ejected_until)
+        ]
+
+    async def dispose_async(self) -> None:
+        for async_engine in self._async_engines:
+            if async_engine is not None:
+                await async_engine.dispose()
+
+
+replicas = ReplicaSet(db_replica_urls) if db_replica_urls else None
+
+
+def read_session(primary: bool = False):
+    """Session for reads that tolerate replication lag: a healthy replica if
+    any are configured, else the primary. `primary` forces the primary
+    (read-your-writes); both choices are recorded in `session.info`."""
+    index = replicas.pick() if replicas is not None and not primary else None
+    db = SessionLocal() if index is None else SessionLocal(bind=replicas.engines[index])
+    db.info["read_your_writes"] = primary
+    db.info["replica"] = index is not None
+    return db
+
+
+def _reads_own_writes(request: Request) -> bool:
+    # Set by middleware.read_your_writes for clients that wrote recently
+    return getattr(request.state, "read_your_writes", False)
+
+
+def get_read_db(request: Request):
+    db = read_session(primary=_reads_own_writes(request))
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db(request: Request):
+    index = None
+    if replicas is not None and not _reads_own_writes(request):
+        index = replicas.pick()
+    if index is None:
+        get_async_engine()
+        session = _AsyncSessionLocal()
+    else:
+        session = replicas.async_session(index)
+    session.info["read_your_writes"] = _reads_own_writes(request)
+    session.info["replica"] = index is not None
+    async with session as db:
+        yield db
+
+
 if __name__== "__main__":
+    print(connection_name)
+    print(connection_url)
     try:
         print(f"--- ATTEMPTING CONNECTION TO: {db_host} ---")
         with engine.connect() as connection:
@@ -0,0 +1,88 @@
+"""ETags and Last-Modified derived from a record's updated_at.
+
+updated_at is set by the application on every write with microsecond
+precision, so it identifies a version of a customer record exactly and the
+ETag can be strong. A `variant` (e.g. a field projection) is appended so
+each representation of the same version gets its own tag.
+"""
+from __future__ import annotations
+
+from datetime import UTC, datetime, timedelta
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from starlette.responses import Response
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _naive_utc(dt: datetime) -> datetime:
+    return dt.astimezone(UTC).replace(tzinfo=None) if dt.tzinfo else dt
+
+
+def etag_for(updated_at: datetime, variant: str = "") -> str:
+    version = f"{(_naive_utc(updated_at) - _EPOCH) // _MICROSECOND:x}"
+    return f'"{version}-{variant}"' if variant else f'"{version}"'
+
+
+def version_from_etag(etag: str) -> Optional[datetime]:
+    """updated_at encoded in a strong ETag; None if it isn't one of ours."""
+    etag = etag.strip()
+    if len(etag) < 3 or etag[0] != '"' or etag[-1] != '"':
+        return None
+    try:
+        return _EPOCH + int(etag[1:-1].split("-", 1)[0], 16) * _MICROSECOND
+    except (ValueError, OverflowError):
+        return None
+
+
+def last_modified(updated_at: datetime) -> str:
+    return format_datetime(_naive_utc(updated_at).replace(tzinfo=UTC, microsecond=0), usegmt=True)
+
+
+def version_headers(updated_at: datetime, variant: str = "") -> dict[str, str]:
+    return {"ETag": etag_for(updated_at, variant), "Last-Modified": last_modified(updated_at)}
+
+
+def not_modified(updated_at: datetime, variant: str = "") -> Response:
+    return Response(status_code=304, headers=version_headers(updated_at, variant))
+
+
+def _split(header: str) -> list[str]:
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+
+def none_match(
+    if_none_match: Optional[str],
+    if_modified_since: Optional[str],
+    updated_at: datetime,
+    variant: str = "",
+) -> bool:
+    """True if a GET should be answered with 304 Not Modified.
+
+    If-None-Match uses the weak comparison, and If-Modified-Since is only
+    consulted without it (RFC 9110 13.2.2).
+    """
+    if if_none_match is not None:
+        current = etag_for(updated_at, variant)
+        return any(tag == "*" or tag.removeprefix("W/") == current for tag in _split(if_none_match))
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return _naive_utc(updated_at).replace(microsecond=0) <= _naive_utc(since)
+    return False
+
+
+def if_match_versions(if_match: Optional[str]) -> Optional[list[datetime]]:
+    """Versions an If-Match header allows: None for no condition (absent or
+    "*"), otherwise the updated_at values of its strong ETags (possibly none,
+    which can never match)."""
+    if if_match is None:
+        return None
+    tags = _split(if_match)
+    if "*" in tags:
+        return None
+    return [version for version in map(version_from_etag, tags) if version is not None]
@@ -0,0 +1,29 @@
+"""Path-parameter dependencies for customer keys.
+
+Malformed keys are rejected with 422 before the route touches the cache or
+the database; valid ones are passed on in canonical form (see
+utils.validation).
+"""
+from __future__ import annotations
+
+from fastapi import HTTPException, Path
+
+from utils.validation import InvalidKey, normalize_email, normalize_university_id
+
+
+def university_id_key(
+    university_id: str = Path(..., description="University ID, e.g. UNI1234 (case-insensitive)."),
+) -> str:
+    try:
+        return normalize_university_id(university_id)
+    except InvalidKey as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+
+def email_key(
+    email: str = Path(..., description=".edu email address (case-insensitive)."),
+) -> str:
+    try:
+        return normalize_email(email)
+    except InvalidKey as e:
+        raise HTTPException(status_code=422, detail=str(e))
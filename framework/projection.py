@@ -0,0 +1,53 @@
+"""`fields=` and `include=` query parameters: which CustomerRead fields a
+read returns, and which related data it embeds."""
+from __future__ import annotations
+
+import zlib
+from typing import Optional
+
+from fastapi import HTTPException, Query
+
+from address_repository import CUSTOMER_INCLUDES
+from customer_repository import CUSTOMER_FIELDS, parse_fields
+
+
+def customer_fields(
+    fields: Optional[str] = Query(
+        None,
+        description=f"Comma-separated fields to return (any of {', '.join(CUSTOMER_FIELDS)}); default all.",
+        examples=["university_id,email"],
+    ),
+) -> Optional[tuple[str, ...]]:
+    try:
+        return parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def fields_variant(fields: Optional[tuple[str, ...]]) -> str:
+    """ETag variant for a projection ("" for the full record)."""
+    return f"{zlib.crc32(','.join(fields).encode()):08x}" if fields else ""
+
+
+def customer_include(
+    include: Optional[str] = Query(
+        None,
+        description=f"Comma-separated related data to embed (any of {', '.join(CUSTOMER_INCLUDES)}).",
+        examples=["addresses"],
+    ),
+) -> tuple[str, ...]:
+    names = tuple(dict.fromkeys(name.strip() for name in (include or "").split(",") if name.strip()))
+    unknown = [name for name in names if name not in CUSTOMER_INCLUDES]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown include: {', '.join(unknown)} (allowed: {', '.join(CUSTOMER_INCLUDES)})",
+        )
+    return names
+
+
+def include_fields(fields: Optional[tuple[str, ...]], include: tuple[str, ...]) -> Optional[tuple[str, ...]]:
+    """Projected fields plus university_id, which embedding related data keys on."""
+    if fields and include and "university_id" not in fields:
+        return (*fields, "university_id")
+    return fields
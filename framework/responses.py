@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from typing import Any
+
+from pydantic_core import to_json
+from starlette.responses import Response
+
+
+class ModelJSONResponse(Response):
+    """JSON response for pydantic models (or lists/dicts of them) that are
+    already valid.
+
+    Encodes straight to bytes with pydantic-core's compiled serializer. Since
+    the route returns a Response, FastAPI also skips re-validating the value
+    against response_model, which stays on the route for the OpenAPI schema.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return to_json(content)
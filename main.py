@@ -2,126 +2,515 @@ from __future__ import annotations
 
 import os
 import socket
+import threading
 from datetime import datetime, UTC
 
-from fastapi import FastAPI, HTTPException, Depends
+from typing import Literal, Optional
+
+import anyio.to_thread
+from pydantic_core import to_json
+from fastapi import APIRouter, FastAPI, HTTPException, Depends, Header, Query
 from sqlalchemy.orm import Session
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
 
+from address_repository import AddressRepository, customer_ids, with_addresses
 from customer_repository import (
     CustomerRepository,
     CustomerNotFound,
     CustomerAlreadyExists,
+    CustomerVersionMismatch,
+)
+from db import (
+    get_db,
+    get_read_db,
+    read_session,
+    db_replica_urls,
+    replicas,
+    engine,
+    dispose_async_engine,
+    db_pool_warmup,
+    pool_status,
+    warm_up_pool,
+)
+from models.customer import (
+    CustomerRead,
+    CustomerCreate,
+    CustomerUpdate,
+    CustomerBatchCreate,
+    CustomerBatchResult,
+    CustomerLookupRequest,
+    CustomerLookupResult,
+    CustomerFilter,
+    CustomerPage,
+    CustomerChangePage,
+    CustomerSearchHit,
+    CustomerSearchResult,
 )
-from db import get_db, Base, engine
-from models.customer import CustomerRead, CustomerCreate, CustomerUpdate
-from models.health import Health
+from framework.etags import if_match_versions, none_match, not_modified, version_headers
+from framework.keys import email_key, university_id_key
+from framework.projection import customer_fields, customer_include, fields_variant, include_fields
+from framework.responses import ModelJSONResponse
+from middleware.compression import CompressionMiddleware
+from middleware.limits import LimitsMiddleware
+from middleware.metrics import MetricsMiddleware, instrument_engine, render_prometheus
+from middleware.read_your_writes import ReadYourWritesMiddleware
+from services.cache import customer_cache
+from services.singleflight import customer_flights
+from services.outbox import OutboxDispatcher, build_publisher
+from services.search import SearchIndexSync, customer_search
+from services.readiness import readiness_probe
+from resources.addresses import router as addresses_router
+from migrations import upgrade as upgrade_schema
+from utils.validation import try_normalize_email, try_normalize_university_id
+from models.health import Health, Readiness
 from sqlalchemy.exc import OperationalError
 
 port = int(os.environ.get("FASTAPIPORT", 8000))
+# Serve the customer CRUD routes from resources/customers_async.py (async
+# engine + AsyncCustomerRepository) instead of the sync handlers below.
+use_async_routes = os.environ.get("USE_ASYNC_ROUTES", "false").lower() in ("1", "true", "yes")
+# Upper bound on items accepted by POST /customers:batch
+batch_max_items = int(os.environ.get("CUSTOMER_BATCH_MAX_ITEMS", 10000))
+# Upper bound on ids + emails accepted by POST /customers:lookup
+lookup_max_keys = int(os.environ.get("CUSTOMER_LOOKUP_MAX_KEYS", 5000))
+# Schema check at startup: "sync" blocks startup on it, "background" runs it
+# in a thread so the first request isn't held up, "skip" leaves it to
+# `python migrations.py` at deploy time.
+schema_init = os.environ.get("SCHEMA_INIT", "background").lower()
+# Threads available to sync routes per worker (anyio's default is 40)
+threadpool_size = int(os.environ.get("THREADPOOL_SIZE", 0))
 
 app = FastAPI(
     title="Customer API",
     description="Atomic Service for managing customer data (MySQL-backed, repository pattern)",
     version="0.0.2",
 )
+# Last added runs first: metrics, then limits (so shed requests are cheap
+# but still counted), then compression
+if db_replica_urls:
+    # Only replica reads can miss a client's own write
+    app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(LimitsMiddleware)
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine)
+if replicas is not None:
+    replicas.instrument(instrument_engine)
 
 # ------------------------------
 # Define Customer Management endpoints
 # ------------------------------
 
+# Resolved once (in on_startup) instead of on every /health poll
+host_ip_address: Optional[str] = None
+
+def resolve_host_ip() -> str:
+    global host_ip_address
+    if host_ip_address is None:
+        try:
+            host_ip_address = socket.gethostbyname(socket.gethostname())
+        except OSError:
+            host_ip_address = "unknown"
+    return host_ip_address
+
 def make_health() -> Health:
     return Health(
         status=200,
         status_message="OK",
         timestamp=datetime.now(UTC).isoformat() + "Z",
-        ip_address=socket.gethostbyname(socket.gethostname())
+        ip_address=host_ip_address or resolve_host_ip(),
     )
 
 # @app.on_event("startup")
 # def on_startup():
 #     Base.metadata.create_all(bind=engine)
-@app.on_event("startup")
-def on_startup():
+def ensure_schema() -> bool:
     try:
-        Base.metadata.create_all(bind=engine)
-        print("NEW VERSION ACTIVE")
+        upgrade_schema(engine)
         print("DB connected & tables ensured at startup.")
     except OperationalError as e:
         print(f"DB initialization FAILED at startup: {e}")
+        return False
+    return True
+
+@app.on_event("startup")
+def on_startup():
+    resolve_host_ip()
+    print("NEW VERSION ACTIVE")
+    if schema_init == "sync":
+        if not ensure_schema():
+            return
+    elif schema_init == "background":
+        threading.Thread(target=ensure_schema, name="ensure-schema", daemon=True).start()
+
+    if db_pool_warmup:
+        try:
+            print(f"DB pool warmed up with {warm_up_pool(db_pool_warmup)} connections.")
+        except OperationalError as e:
+            print(f"DB pool warm-up FAILED at startup: {e}")
+
+@app.on_event("startup")
+async def configure_threadpool():
+    # Must run on the event loop: the limiter belongs to the running loop
+    if threadpool_size:
+        anyio.to_thread.current_default_thread_limiter().total_tokens = threadpool_size
+
+# Publishes customer change events from the outbox table (OUTBOX_PUBLISHER)
+outbox_dispatcher: Optional[OutboxDispatcher] = None
+
+@app.on_event("startup")
+def start_outbox_dispatcher():
+    global outbox_dispatcher
+    publisher = build_publisher()
+    if publisher is not None:
+        outbox_dispatcher = OutboxDispatcher(publisher)
+        outbox_dispatcher.start()
+
+@app.on_event("shutdown")
+def stop_outbox_dispatcher():
+    if outbox_dispatcher is not None:
+        outbox_dispatcher.stop()
 
+# Keeps this process's name search index in step with the change feed
+search_sync: Optional[SearchIndexSync] = None
+
+@app.on_event("startup")
+def start_search_sync():
+    global search_sync
+    if customer_search is not None:
+        search_sync = SearchIndexSync(customer_search)
+        search_sync.start()
+
+@app.on_event("shutdown")
+def stop_search_sync():
+    if search_sync is not None:
+        search_sync.stop()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await dispose_async_engine()
+
+# Liveness: no I/O, so it runs on the event loop rather than the threadpool
 @app.get("/health", response_model=Health)
-def get_health():
+async def get_health():
     return make_health()
 
-@app.post("/customers", response_model=CustomerRead, status_code=201)
+@app.get("/ready", response_model=Readiness)
+def get_ready():
+    readiness = readiness_probe.get()
+    return ModelJSONResponse(readiness, status_code=readiness.status)
+
+@app.get("/health/pool")
+def get_pool_health():
+    return pool_status()
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+def read_repository(db: Session) -> CustomerRepository:
+    # A client reading its own writes gets the primary, past the cache and
+    # any lookup in flight. Replica reads may use the cache but neither fill
+    # it nor share their result: a lagging row would outlive the lag there.
+    if db.info["read_your_writes"]:
+        return CustomerRepository(db)
+    if db.info["replica"]:
+        return CustomerRepository(db, cache=customer_cache, fill_cache=False)
+    return CustomerRepository(db, cache=customer_cache, flights=customer_flights)
+
+# Sync customer CRUD routes; see use_async_routes above.
+customers_router = APIRouter()
+
+@customers_router.post("/customers", response_model=CustomerRead, status_code=201)
 def create_customer(
         customer: CustomerCreate,
         db: Session = Depends(get_db),
 ):
-    repo = CustomerRepository(db)
+    repo = CustomerRepository(db, cache=customer_cache, flights=customer_flights, search=customer_search)
     try:
-        return repo.create(customer)
+        created = repo.create(customer)
     except CustomerAlreadyExists as e:
         raise HTTPException(status_code=409, detail=str(e))
+    return ModelJSONResponse(created, status_code=201, headers=version_headers(created.updated_at))
 
 
-@app.get("/customers/by-email/{email}", response_model=CustomerRead)
+@customers_router.get("/customers/by-email/{email}", response_model=CustomerRead, responses={304: {"description": "Not Modified"}})
 def get_customer_by_email(
-    email: str,
-    db: Session = Depends(get_db),
+    email: str = Depends(email_key),
+    fields: Optional[tuple[str, ...]] = Depends(customer_fields),
+    include: tuple[str, ...] = Depends(customer_include),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+    db: Session = Depends(get_read_db),
 ):
-    repo = CustomerRepository(db)
+    repo = read_repository(db)
+    variant = fields_variant(fields)
+    fields = include_fields(fields, include)
     try:
-        return repo.get_by_email(email)
+        # Revalidation only needs updated_at, not the row. Embedded
+        # addresses don't move updated_at, so reads with include= aren't
+        # conditional (and carry no ETag)
+        if (if_none_match is not None or if_modified_since is not None) and not include:
+            version = repo.get_version_by_email(email)
+            if none_match(if_none_match, if_modified_since, version, variant):
+                return not_modified(version, variant)
+        if fields:
+            customer, version = repo.project_by_email(email, fields)
+        else:
+            customer = repo.get_by_email(email)
+            version = customer.updated_at
     except CustomerNotFound as e:
         raise HTTPException(status_code=404, detail=str(e))
+    if include:
+        addresses = AddressRepository(db).for_customers(customer_ids([customer]))
+        return ModelJSONResponse(with_addresses([customer], addresses)[0])
+    return ModelJSONResponse(customer, headers=version_headers(version, variant))
 
-@app.get("/customers/{university_id}", response_model=CustomerRead)
+@customers_router.get("/customers/{university_id}", response_model=CustomerRead, responses={304: {"description": "Not Modified"}})
 def get_customer_by_id(
-    university_id: str,
-    db: Session = Depends(get_db),
+    university_id: str = Depends(university_id_key),
+    fields: Optional[tuple[str, ...]] = Depends(customer_fields),
+    include: tuple[str, ...] = Depends(customer_include),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+    db: Session = Depends(get_read_db),
 ):
-    repo = CustomerRepository(db)
+    repo = read_repository(db)
+    variant = fields_variant(fields)
+    fields = include_fields(fields, include)
     try:
-        return repo.get_by_university_id(university_id)
+        # Revalidation only needs updated_at, not the row. Embedded
+        # addresses don't move updated_at, so reads with include= aren't
+        # conditional (and carry no ETag)
+        if (if_none_match is not None or if_modified_since is not None) and not include:
+            version = repo.get_version(university_id)
+            if none_match(if_none_match, if_modified_since, version, variant):
+                return not_modified(version, variant)
+        if fields:
+            customer, version = repo.project_by_university_id(university_id, fields)
+        else:
+            customer = repo.get_by_university_id(university_id)
+            version = customer.updated_at
     except CustomerNotFound as e:
         raise HTTPException(status_code=404, detail=str(e))
+    if include:
+        addresses = AddressRepository(db).for_customers([university_id])
+        return ModelJSONResponse(with_addresses([customer], addresses)[0])
+    return ModelJSONResponse(customer, headers=version_headers(version, variant))
 
-@app.patch("/customers/{university_id}", response_model=CustomerRead)
+@customers_router.patch("/customers/{university_id}", response_model=CustomerRead)
 def update_customer(
-    university_id: str,
     update: CustomerUpdate,
+    university_id: str = Depends(university_id_key),
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
 ):
-    repo = CustomerRepository(db)
+    repo = CustomerRepository(db, cache=customer_cache, flights=customer_flights, search=customer_search)
     try:
-        return repo.update(university_id, update)
+        customer = repo.update(university_id, update, if_versions=if_match_versions(if_match))
     except CustomerNotFound as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except CustomerVersionMismatch as e:
+        raise HTTPException(status_code=412, detail=str(e))
+    except CustomerAlreadyExists as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return ModelJSONResponse(customer, headers=version_headers(customer.updated_at))
 
-@app.delete("/customers/{university_id}", status_code=204)
+@customers_router.delete("/customers/{university_id}", status_code=204)
 def delete_customer(
-    university_id: str,
+    university_id: str = Depends(university_id_key),
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
 ):
-    repo = CustomerRepository(db)
+    repo = CustomerRepository(db, cache=customer_cache, flights=customer_flights, search=customer_search)
     try:
-        repo.delete(university_id)
+        repo.delete(university_id, if_versions=if_match_versions(if_match))
     except CustomerNotFound as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except CustomerVersionMismatch as e:
+        raise HTTPException(status_code=412, detail=str(e))
 
     return JSONResponse(status_code=204, content=None)
 
+def export_ndjson(
+    filters: CustomerFilter,
+    fields: Optional[tuple[str, ...]],
+    include: tuple[str, ...] = (),
+    read_your_writes: bool = False,
+    lines_per_chunk: int = 500,
+):
+    # Owns its sessions: the response body is produced after the handler (and
+    # its get_db dependency) has returned. Addresses are read on a second
+    # session, one IN query per chunk, while the first streams customers.
+    db = read_session(primary=read_your_writes)
+    addresses_db = read_session(primary=read_your_writes) if include else None
+    try:
+        chunk = []
+        for customer in CustomerRepository(db).iter_customers(filters, fields):
+            chunk.append(customer)
+            if len(chunk) >= lines_per_chunk:
+                yield _ndjson_chunk(chunk, addresses_db)
+                chunk = []
+        if chunk:
+            yield _ndjson_chunk(chunk, addresses_db)
+    finally:
+        db.close()
+        if addresses_db is not None:
+            addresses_db.close()
+
+def _ndjson_chunk(customers: list, addresses_db: Optional[Session]) -> bytes:
+    if addresses_db is not None:
+        addresses = AddressRepository(addresses_db).for_customers(customer_ids(customers))
+        customers = with_addresses(customers, addresses)
+    return b"\n".join(to_json(customer) for customer in customers) + b"\n"
+
+@app.get("/customers", response_model=CustomerPage)
+def list_customers(
+    filters: CustomerFilter = Depends(),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page."),
+    limit: int = Query(100, ge=1, le=1000),
+    format: Literal["json", "ndjson"] = Query(
+        "json", description="ndjson streams every matching customer, ignoring cursor/limit."
+    ),
+    fields: Optional[tuple[str, ...]] = Depends(customer_fields),
+    include: tuple[str, ...] = Depends(customer_include),
+    db: Session = Depends(get_read_db),
+):
+    fields = include_fields(fields, include)
+    if format == "ndjson":
+        return StreamingResponse(
+            export_ndjson(filters, fields, include, db.info["read_your_writes"]),
+            media_type="application/x-ndjson",
+        )
+
+    repo = CustomerRepository(db)
+    try:
+        page = repo.list_customers(filters, cursor=cursor, limit=limit, fields=fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if include:
+        # One IN query for the whole page, not one per customer
+        addresses = AddressRepository(db).for_customers(customer_ids(page.items))
+        page.items = with_addresses(page.items, addresses)
+    return ModelJSONResponse(page)
+
+@app.get("/customers/changes", response_model=CustomerChangePage)
+def get_customer_changes(
+    since: Optional[str] = Query(None, description="next_cursor from the previous call; omit to start from the beginning."),
+    limit: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_db),
+):
+    repo = CustomerRepository(db)
+    try:
+        return ModelJSONResponse(repo.changes_since(since, limit=limit))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/customers/search", response_model=CustomerSearchResult)
+def search_customers(
+    q: str = Query(..., min_length=1, max_length=200, description="Names or name prefixes, e.g. 'ali sm'; typos are tolerated."),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_read_db),
+):
+    if customer_search is None:
+        raise HTTPException(status_code=404, detail="Customer search is disabled.")
+    if not customer_search.ready:
+        raise HTTPException(status_code=503, detail="Search index is loading.", headers={"Retry-After": "5"})
+
+    hits = customer_search.search(q, limit)
+    found = read_repository(db).get_many_by_university_ids(university_id for university_id, _ in hits)
+    # A hit deleted since the index last synced is dropped
+    result = CustomerSearchResult(query=q)
+    result.items = [
+        CustomerSearchHit(score=round(score, 4), customer=found[university_id])
+        for university_id, score in hits
+        if university_id in found
+    ]
+    return ModelJSONResponse(result)
+
+@app.post("/customers:batch", response_model=CustomerBatchResult)
+def batch_create_customers(
+    batch: CustomerBatchCreate,
+    db: Session = Depends(get_db),
+):
+    if len(batch.items) > batch_max_items:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(batch.items)} items (max {batch_max_items}).",
+        )
+
+    repo = CustomerRepository(db, cache=customer_cache, flights=customer_flights, search=customer_search)
+    if batch.upsert:
+        return repo.bulk_upsert(batch.items, chunk_size=batch.chunk_size)
+    return repo.bulk_create(batch.items, chunk_size=batch.chunk_size)
+
+@app.post("/customers:lookup", response_model=CustomerLookupResult)
+def lookup_customers(
+    lookup: CustomerLookupRequest,
+    include: tuple[str, ...] = Depends(customer_include),
+    db: Session = Depends(get_read_db),
+):
+    requested = len(lookup.university_ids) + len(lookup.emails)
+    if requested > lookup_max_keys:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many keys: {requested} (max {lookup_max_keys}).",
+        )
+
+    repo = read_repository(db)
+    # requested key -> canonical key; malformed keys (None) are reported
+    # missing without being looked up
+    ids = {key: try_normalize_university_id(key) for key in lookup.university_ids}
+    emails = {key: try_normalize_email(key) for key in lookup.emails}
+    by_id = repo.get_many_by_university_ids(key for key in ids.values() if key)
+    by_email = repo.get_many_by_emails(key for key in emails.values() if key)
+
+    result = CustomerLookupResult()
+    seen = set()
+
+    def collect(keys, found, missing):
+        for key, canonical in keys.items():
+            customer = found.get(canonical) if canonical else None
+            if customer is None:
+                missing.append(key)
+            elif customer.university_id not in seen:
+                seen.add(customer.university_id)
+                result.customers.append(customer)
+
+    collect(ids, by_id, result.missing_university_ids)
+    collect(emails, by_email, result.missing_emails)
+    if include:
+        addresses = AddressRepository(db).for_customers(customer_ids(result.customers))
+        result.customers = with_addresses(result.customers, addresses)
+    return ModelJSONResponse(result)
+
+if use_async_routes:
+    from db import get_async_engine
+    from resources.customers_async import router as async_customers_router
+
+    instrument_engine(get_async_engine().sync_engine)
+    app.include_router(async_customers_router)
+else:
+    app.include_router(customers_router)
+app.include_router(addresses_router)
+
 @app.get("/")
 def root():
     return {
         "message": "Customer Atomic Service (keyed by university_id) use /docs for API documentation.",
         "endpoints": [
             "/health",
+            "/ready",
+            "/health/pool",
+            "/metrics",
             "/customers",
+            "/customers:batch",
+            "/customers:lookup",
+            "/customers/changes",
+            "/customers/search",
             "/customers/{university_id}",
             "/customers/by-email/{email}",
+            "/customers/{university_id}/addresses",
         ],
     }
 
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import os
+
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipResponder, IdentityResponder
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Encodings offered, in order of preference; empty turns compression off
+compression_encodings = [
+    e.strip() for e in os.environ.get("COMPRESSION_ENCODINGS", "br,gzip").split(",") if e.strip()
+]
+# Bodies smaller than this go out uncompressed: single records aren't worth the CPU
+compression_min_size = int(os.environ.get("COMPRESSION_MIN_SIZE", 1024))
+compression_gzip_level = int(os.environ.get("COMPRESSION_GZIP_LEVEL", 6))
+compression_brotli_quality = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", 4))
+
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app, minimum_size: int, quality: int = compression_brotli_quality):
+        super().__init__(app, minimum_size)
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        # Flush every chunk so streamed (NDJSON) responses still arrive incrementally
+        body = self.compressor.process(body)
+        return body + (self.compressor.flush() if more_body else self.compressor.finish())
+
+
+def accepted_encodings(accept_encoding: str) -> set[str]:
+    """Codings an Accept-Encoding header allows (q=0 excludes)."""
+    accepted = set()
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.partition(";")
+        q = params.strip().removeprefix("q=")
+        try:
+            if params and float(q) == 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(coding.strip())
+    return accepted
+
+
+class CompressionMiddleware:
+    """Compresses responses of at least `minimum_size` bytes with brotli or
+    gzip, whichever the client accepts first in `encodings`."""
+
+    def __init__(
+        self,
+        app,
+        encodings: list[str] = compression_encodings,
+        minimum_size: int = compression_min_size,
+        gzip_level: int = compression_gzip_level,
+        brotli_quality: int = compression_brotli_quality,
+    ):
+        self.app = app
+        self.encodings = [e for e in encodings if e == "gzip" or (e == "br" and brotli is not None)]
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.encodings:
+            await self.app(scope, receive, send)
+            return
+
+        accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        encoding = next((e for e in self.encodings if e in accepted), None)
+        if encoding == "br":
+            responder = BrotliResponder(self.app, self.minimum_size, quality=self.brotli_quality)
+        elif encoding == "gzip":
+            responder = GZipResponder(self.app, self.minimum_size, compresslevel=self.gzip_level)
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size)
+        await responder(scope, receive, send)
@@ -0,0 +1,215 @@
+"""Per-client rate limits and load shedding.
+
+Every request is either a read or a write, and each kind has its own budget:
+
+* a token bucket per client (a known API key, else client IP), off unless
+  RATE_LIMIT_{READ,WRITE}_RPS is set: over the rate the request gets 429
+  with Retry-After;
+* a cap on requests in flight across all clients, with a bounded queue in
+  front of it: a request that can't start within the queue deadline (or
+  finds the queue full) gets 503 with Retry-After instead of piling up on
+  the threadpool and DB pool.
+
+Bucket state is a few floats per client, kept in an LRU bounded by
+RATE_LIMIT_MAX_CLIENTS; an evicted client simply starts with a full bucket.
+
+The client IP is the ASGI peer address. Behind a proxy (Cloud Run's front
+end, a load balancer) that is the proxy for every request, unless
+server.py is told to trust its X-Forwarded-For with FORWARDED_ALLOW_IPS;
+uvicorn then puts the client's address there. That one setting decides
+the client IP for rate limits and logs alike.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+
+from middleware.metrics import requests_rejected
+
+logger = logging.getLogger(__name__)
+
+# Token buckets: sustained requests/second and burst size per client (0 = no limit)
+rate_limit_read_rps = float(os.environ.get("RATE_LIMIT_READ_RPS", 0))
+rate_limit_read_burst = float(os.environ.get("RATE_LIMIT_READ_BURST", 200))
+rate_limit_write_rps = float(os.environ.get("RATE_LIMIT_WRITE_RPS", 0))
+rate_limit_write_burst = float(os.environ.get("RATE_LIMIT_WRITE_BURST", 40))
+rate_limit_max_clients = int(os.environ.get("RATE_LIMIT_MAX_CLIENTS", 10000))
+# API keys that get their own bucket; any other X-API-Key is keyed by IP, so
+# made-up keys neither escape the limit nor evict real clients from the LRU
+rate_limit_api_keys = frozenset(
+    k.strip() for k in os.environ.get("RATE_LIMIT_API_KEYS", "").split(",") if k.strip()
+)
+
+# Requests in flight per instance (0 = no cap) and the queue in front of them
+max_in_flight_reads = int(os.environ.get("MAX_IN_FLIGHT_READS", 32))
+max_in_flight_writes = int(os.environ.get("MAX_IN_FLIGHT_WRITES", 16))
+max_queued_requests = int(os.environ.get("MAX_QUEUED_REQUESTS", 64))
+queue_deadline_ms = float(os.environ.get("QUEUE_DEADLINE_MS", 250))
+
+READ_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+# POST routes that only read
+READ_POST_PATHS = frozenset({"/customers:lookup"})
+EXEMPT_PATHS = ("/health", "/ready", "/metrics")
+
+
+def request_kind(method: str, path: str) -> str:
+    return "read" if method in READ_METHODS or path in READ_POST_PATHS else "write"
+
+
+class TokenBuckets:
+    """One token bucket per client key, refilled lazily on each take()."""
+
+    def __init__(self, rate: float, burst: float, max_clients: int = rate_limit_max_clients):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        # key -> [tokens, last refill]
+        self._buckets: OrderedDict[str, list[float]] = OrderedDict()
+
+    def take(self, key: str, now: Optional[float] = None) -> float:
+        """0 if the request may proceed, else seconds until a token is available."""
+        now = time.monotonic() if now is None else now
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.burst, now]
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        return (1 - bucket[0]) / self.rate
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class ConcurrencyGate:
+    """At most `limit` holders; up to `max_queued` waiters, each for at most
+    `deadline` seconds. Used from one event loop, so no locking."""
+
+    def __init__(self, limit: int, max_queued: int, deadline: float):
+        self.limit = limit
+        self.max_queued = max_queued
+        self.deadline = deadline
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> bool:
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            return True
+        if len(self._waiters) >= self.max_queued:
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # shield: on timeout the waiter stays pending and is dropped below
+            await asyncio.wait_for(asyncio.shield(waiter), self.deadline)
+        except asyncio.TimeoutError:
+            pass
+        except BaseException:
+            # Cancelled while queued: pass on a slot we were already handed
+            if waiter.done():
+                self.release()
+            else:
+                self._waiters.remove(waiter)
+            raise
+        if waiter.done():
+            # release() handed its slot straight to this waiter
+            return True
+        self._waiters.remove(waiter)
+        return False
+
+    def release(self) -> None:
+        if self._waiters:
+            self._waiters.popleft().set_result(None)
+        else:
+            self.in_flight -= 1
+
+
+def _client_key(scope, headers: dict[bytes, bytes]) -> str:
+    api_key = headers.get(b"x-api-key", b"").decode("latin-1")
+    if api_key in rate_limit_api_keys:
+        return "key:" + api_key
+    # Already the forwarded client address when the proxy is trusted
+    client = scope.get("client")
+    return "ip:" + (client[0] if client else "unknown")
+
+
+async def _reject(send, status: int, detail: str, retry_after: float) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+class LimitsMiddleware:
+    """Token-bucket rate limits per client and in-flight caps, separately for
+    reads and writes. Health/readiness/metrics endpoints are never limited."""
+
+    def __init__(self, app, exempt_paths: tuple[str, ...] = EXEMPT_PATHS):
+        self.app = app
+        self.exempt_paths = exempt_paths
+        self.buckets = {
+            "read": TokenBuckets(rate_limit_read_rps, rate_limit_read_burst) if rate_limit_read_rps else None,
+            "write": TokenBuckets(rate_limit_write_rps, rate_limit_write_burst) if rate_limit_write_rps else None,
+        }
+        self.gates = {
+            "read": ConcurrencyGate(max_in_flight_reads, max_queued_requests, queue_deadline_ms / 1000)
+            if max_in_flight_reads
+            else None,
+            "write": ConcurrencyGate(max_in_flight_writes, max_queued_requests, queue_deadline_ms / 1000)
+            if max_in_flight_writes
+            else None,
+        }
+        if (rate_limit_read_rps or rate_limit_write_rps) and not os.environ.get("FORWARDED_ALLOW_IPS"):
+            logger.warning(
+                "Per-client rate limits are on but FORWARDED_ALLOW_IPS is not set: behind a proxy, "
+                "every client shares the proxy's bucket"
+            )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exempt_paths):
+            await self.app(scope, receive, send)
+            return
+
+        kind = request_kind(scope["method"], scope["path"])
+        buckets = self.buckets[kind]
+        if buckets is not None:
+            wait = buckets.take(_client_key(scope, dict(scope["headers"])))
+            if wait:
+                requests_rejected.inc(1, "rate_limited", kind)
+                await _reject(send, 429, "Too many requests", wait)
+                return
+
+        gate = self.gates[kind]
+        if gate is None:
+            await self.app(scope, receive, send)
+            return
+        if not await gate.acquire():
+            requests_rejected.inc(1, "overloaded", kind)
+            await _reject(send, 503, "Service overloaded, retry later", gate.deadline)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release()
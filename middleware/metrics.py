@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import threading
+import time
+from contextvars import ContextVar
+from types import SimpleNamespace
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _label_str(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    _type = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *label_values: str):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self._type}"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(self.labels, label_values)} {value:g}")
+        return lines
+
+
+class Gauge(Counter):
+    _type = "gauge"
+
+    def dec(self, amount: float = 1, *label_values: str):
+        self.inc(-amount, *label_values)
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: tuple, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self.labels = labels
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: dict[tuple[str, ...], list[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                series = self._values[label_values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, series in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, series):
+                    le = _label_str(self.labels, label_values, f'le="{bound:g}"')
+                    lines.append(f"{self.name}_bucket{le} {count:g}")
+                inf = _label_str(self.labels, label_values, 'le="+Inf"')
+                labels = _label_str(self.labels, label_values)
+                lines.append(f"{self.name}_bucket{inf} {series[-2]:g}")
+                lines.append(f"{self.name}_sum{labels} {series[-1]:g}")
+                lines.append(f"{self.name}_count{labels} {series[-2]:g}")
+        return lines
+
+
+request_duration = Histogram(
+    "http_server_request_duration_seconds",
+    "HTTP request latency by route.",
+    LATENCY_BUCKETS,
+    ("method", "route", "status"),
+)
+requests_in_flight = Gauge(
+    "http_server_requests_in_flight",
+    "HTTP requests currently being served.",
+    ("method",),
+)
+request_db_statements = Histogram(
+    "http_server_request_db_statements",
+    "SQL statements executed per HTTP request (spikes point at N+1 queries).",
+    STATEMENT_BUCKETS,
+    ("method", "route"),
+)
+request_db_duration = Histogram(
+    "http_server_request_db_duration_seconds",
+    "Time spent in SQL per HTTP request.",
+    LATENCY_BUCKETS,
+    ("method", "route"),
+)
+db_statements_total = Counter(
+    "db_statements_total",
+    "SQL statements executed, in or outside of a request.",
+)
+requests_rejected = Counter(
+    "http_server_requests_rejected_total",
+    "Requests turned away by LimitsMiddleware (429 rate_limited, 503 overloaded).",
+    ("reason", "kind"),
+)
+outbox_events_published = Counter(
+    "outbox_events_published_total",
+    "Customer change events published from the outbox.",
+)
+outbox_publish_failures = Counter(
+    "outbox_publish_failures_total",
+    "Outbox messages whose publish failed (retried later).",
+)
+
+REGISTRY = (
+    request_duration,
+    requests_in_flight,
+    request_db_statements,
+    request_db_duration,
+    db_statements_total,
+    requests_rejected,
+    outbox_events_published,
+    outbox_publish_failures,
+)
+
+
+def render_prometheus() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# OpenTelemetry instruments: no-ops until a MeterProvider (with an exporter)
+# is installed, e.g. by the OpenTelemetry SDK / auto-instrumentation. Created
+# on the first request to keep the import off the startup path.
+_otel = None
+
+
+def _otel_instruments() -> Optional[SimpleNamespace]:
+    global _otel
+    if _otel is None:
+        try:
+            from opentelemetry import metrics as otel_metrics
+        except ImportError:  # OpenTelemetry export is optional
+            _otel = False
+            return None
+        meter = otel_metrics.get_meter("customer-atomic-service")
+        _otel = SimpleNamespace(
+            duration=meter.create_histogram(
+                "http.server.request.duration", unit="s", description="HTTP request latency by route."
+            ),
+            in_flight=meter.create_up_down_counter(
+                "http.server.active_requests", description="HTTP requests currently being served."
+            ),
+            db_statements=meter.create_histogram(
+                "http.server.request.db_statements", description="SQL statements per HTTP request."
+            ),
+            db_duration=meter.create_histogram(
+                "http.server.request.db_duration", unit="s", description="Time spent in SQL per HTTP request."
+            ),
+        )
+    return _otel or None
+
+
+class _SqlStats:
+    __slots__ = ("statements", "duration")
+
+    def __init__(self):
+        self.statements = 0
+        self.duration = 0.0
+
+
+# Set per request by MetricsMiddleware. Sync routes run in a copy of the
+# request context, so they update the same _SqlStats object.
+_request_sql: ContextVar[Optional[_SqlStats]] = ContextVar("request_sql", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_start"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info.pop("query_start", time.perf_counter())
+    db_statements_total.inc()
+    stats = _request_sql.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.duration += elapsed
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Attribute the statements run on `engine` to the current request."""
+    if not event.contains(engine, "after_cursor_execute", _after_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class MetricsMiddleware:
+    """Records latency, in-flight requests and SQL statements/time per route."""
+
+    def __init__(self, app, skip_paths: tuple[str, ...] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        stats = _SqlStats()
+        token = _request_sql.set(stats)
+        requests_in_flight.inc(1, method)
+        otel = _otel_instruments()
+        if otel is not None:
+            otel.in_flight.add(1, {"http.request.method": method})
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_sql.reset(token)
+            requests_in_flight.dec(1, method)
+            # FastAPI stores the matched route in the scope; use its template
+            # so /customers/{university_id} is one series, not one per id.
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            request_duration.observe(elapsed, method, route_path, status)
+            request_db_statements.observe(stats.statements, method, route_path)
+            request_db_duration.observe(stats.duration, method, route_path)
+            if otel is not None:
+                attributes = {
+                    "http.request.method": method,
+                    "http.route": route_path,
+                    "http.response.status_code": int(status),
+                }
+                otel.in_flight.add(-1, {"http.request.method": method})
+                otel.duration.record(elapsed, attributes)
+                otel.db_statements.record(stats.statements, attributes)
+                otel.db_duration.record(stats.duration, attributes)
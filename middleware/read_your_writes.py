@@ -0,0 +1,69 @@
+"""Read-your-writes stickiness for replica reads.
+
+A successful write response carries a short-lived token, both as a cookie
+and as an X-Read-Your-Writes header (for clients that don't keep cookies):
+the time until which that client's reads must see the primary. Requests that
+send a token still in the future, but no further than one window ahead (as
+issued), get `request.state.read_your_writes`, and db.get_read_db serves
+them from the primary instead of a replica.
+
+The token is not signed: a client can only use it to send its own reads to
+the primary. Tokens more than one window ahead are ignored, as no write
+issues them.
+"""
+from __future__ import annotations
+
+import time
+from http.cookies import SimpleCookie
+
+from db import read_your_writes_seconds
+from middleware.limits import request_kind
+
+COOKIE_NAME = "read_your_writes"
+HEADER_NAME = b"x-read-your-writes"
+
+
+def _token_expiry(headers: dict[bytes, bytes]) -> float:
+    token = headers.get(HEADER_NAME, b"").decode("latin-1")
+    if not token and b"cookie" in headers:
+        morsel = SimpleCookie(headers[b"cookie"].decode("latin-1")).get(COOKIE_NAME)
+        token = morsel.value if morsel is not None else ""
+    try:
+        return float(token)
+    except ValueError:
+        return 0.0
+
+
+class ReadYourWritesMiddleware:
+    def __init__(self, app, window: float = read_your_writes_seconds):
+        self.app = app
+        self.window = window
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        now = time.time()
+        # Not beyond a window from now: "1e12" or "inf" would pin the client
+        # to the primary (past the cache) for good
+        if now < _token_expiry(dict(scope["headers"])) <= now + self.window:
+            scope.setdefault("state", {})["read_your_writes"] = True
+        if request_kind(scope["method"], scope["path"]) == "read":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_token(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = f"{time.time() + self.window:.3f}"
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (HEADER_NAME, until.encode()),
+                    (
+                        b"set-cookie",
+                        f"{COOKIE_NAME}={until}; Max-Age={max(1, round(self.window))}; Path=/; HttpOnly; SameSite=Lax".encode(),
+                    ),
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_token)
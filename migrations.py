@@ -0,0 +1,271 @@
+"""Versioned schema migrations for the customers database.
+
+`Base.metadata.create_all` only creates missing tables; it never alters an
+existing one, so indexes and columns added after a table exists are applied
+here. Applied versions are recorded in `schema_migrations`. Every migration
+must be safe to run against a database created from the current models
+(migration 1 creates those), which is why they check before creating.
+
+    python migrations.py            # apply pending migrations
+    python migrations.py status     # list applied / pending migrations
+    python migrations.py fold-keys  # canonicalize keys of older rows (opt-in data fix)
+"""
+from __future__ import annotations
+
+import sys
+from contextlib import contextmanager
+from datetime import datetime, UTC
+from typing import Callable
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+
+from db import Base, engine
+from models.customer import CustomerRead
+
+import address_repository  # registers the addresses table on Base
+import customer_repository  # registers the customers tables on Base
+from services import outbox
+
+_meta = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _meta,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def _create_missing_indexes(conn: Connection, table_name: str, *index_names: str) -> None:
+    table = Base.metadata.tables[table_name]
+    existing = {ix["name"] for ix in inspect(conn).get_indexes(table_name)}
+    for index in table.indexes:
+        if index.name in index_names and index.name not in existing:
+            index.create(conn)
+
+
+def _initial_schema(conn: Connection) -> None:
+    Base.metadata.create_all(bind=conn)
+
+
+def _customer_lookup_indexes(conn: Connection) -> None:
+    # Both were replaced by migration 8 and are gone from the models, so on
+    # a database created from the current models this creates nothing
+    _create_missing_indexes(
+        conn,
+        "customers",
+        "ix_customers_status_updated_at",
+        "ix_customers_last_name_first_name",
+    )
+
+
+def _change_feed(conn: Connection) -> None:
+    Base.metadata.create_all(bind=conn, tables=[customer_repository.CustomerTombstone.__table__])
+    _create_missing_indexes(conn, "customers", "ix_customers_updated_at_university_id")
+
+
+def _outbox(conn: Connection) -> None:
+    Base.metadata.create_all(bind=conn, tables=[outbox.OutboxEvent.__table__])
+
+
+def _updated_at_microseconds(conn: Connection) -> None:
+    # updated_at is the record version behind ETags / If-Match; DATETIME
+    # without fsp would make two updates within a second look identical
+    if conn.dialect.name != "mysql":
+        return
+    column = next(c for c in inspect(conn).get_columns("customers") if c["name"] == "updated_at")
+    if getattr(column["type"], "fsp", None) != 6:
+        conn.execute(
+            text("ALTER TABLE customers MODIFY updated_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6)")
+        )
+
+
+def _canonical_keys(conn: Connection) -> None:
+    # Was a full-table key fold in one startup transaction; that is now the
+    # opt-in, batched fold_keys(). Kept so the versions stay put.
+    pass
+
+
+def _addresses(conn: Connection) -> None:
+    Base.metadata.create_all(bind=conn, tables=[address_repository.Address.__table__])
+
+
+def _page_order_indexes(conn: Connection) -> None:
+    # Filtered list pages are ordered by these indexes down to university_id;
+    # they replace the two-column indexes of migration 2
+    _create_missing_indexes(
+        conn,
+        "customers",
+        "ix_customers_status_updated_at_university_id",
+        "ix_customers_last_name_first_name_university_id",
+    )
+    existing = {ix["name"] for ix in inspect(conn).get_indexes("customers")}
+    for name in ("ix_customers_status_updated_at", "ix_customers_last_name_first_name"):
+        if name in existing:
+            on_table = " ON customers" if conn.dialect.name == "mysql" else ""
+            conn.execute(text(f"DROP INDEX {name}{on_table}"))
+
+
+def _created_at_microseconds(conn: Connection) -> None:
+    # create() returns created_at with microseconds; DATETIME without fsp
+    # would store it rounded to the second, so reads would disagree
+    if conn.dialect.name != "mysql":
+        return
+    column = next(c for c in inspect(conn).get_columns("customers") if c["name"] == "created_at")
+    if getattr(column["type"], "fsp", None) != 6:
+        conn.execute(
+            text("ALTER TABLE customers MODIFY created_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6)")
+        )
+
+
+def _address_timestamps_microseconds(conn: Connection) -> None:
+    # Like migration 9: the repository returns the timestamps it writes
+    if conn.dialect.name != "mysql":
+        return
+    columns = {c["name"]: c for c in inspect(conn).get_columns("addresses")}
+    for name in ("created_at", "updated_at"):
+        if getattr(columns[name]["type"], "fsp", None) != 6:
+            conn.execute(text(f"ALTER TABLE addresses MODIFY {name} DATETIME(6) NOT NULL"))
+
+
+def _tombstone_microseconds(conn: Connection) -> None:
+    # The change feed merges deletes with upserts by time: both columns
+    # need the same precision for a delete and a re-create to stay in order
+    if conn.dialect.name != "mysql":
+        return
+    column = next(c for c in inspect(conn).get_columns("customer_tombstones") if c["name"] == "deleted_at")
+    if getattr(column["type"], "fsp", None) != 6:
+        conn.execute(text("ALTER TABLE customer_tombstones MODIFY deleted_at DATETIME(6) NOT NULL"))
+
+
+# (version, name, migration); append only, never renumber
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "initial schema", _initial_schema),
+    (2, "customers status/updated_at and last_name/first_name indexes", _customer_lookup_indexes),
+    (3, "change feed: customers updated_at index and customer_tombstones", _change_feed),
+    (4, "customer_outbox", _outbox),
+    (5, "customers.updated_at with microsecond precision", _updated_at_microseconds),
+    (6, "none (key folding moved to `migrations.py fold-keys`)", _canonical_keys),
+    (7, "addresses", _addresses),
+    (8, "customers status/updated_at and last_name/first_name indexes ending in university_id", _page_order_indexes),
+    (9, "customers.created_at with microsecond precision", _created_at_microseconds),
+    (10, "addresses.created_at / updated_at with microsecond precision", _address_timestamps_microseconds),
+    (11, "customer_tombstones.deleted_at with microsecond precision", _tombstone_microseconds),
+]
+
+
+@contextmanager
+def _migration_lock(conn: Connection, timeout: int = 60):
+    # Several workers/instances may start at once; only one migrates
+    if conn.dialect.name == "mysql":
+        conn.execute(text("SELECT GET_LOCK('customers_schema_migrations', :t)"), {"t": timeout})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT RELEASE_LOCK('customers_schema_migrations')"))
+    else:
+        yield
+
+
+def applied_versions(conn: Connection) -> set[int]:
+    _meta.create_all(bind=conn)
+    return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def upgrade(bind: Engine = engine) -> list[int]:
+    """Apply pending migrations in order; returns the versions applied."""
+    applied_now = []
+    with bind.connect() as lock_conn, _migration_lock(lock_conn):
+        with bind.begin() as conn:
+            done = applied_versions(conn)
+        for version, name, migrate in MIGRATIONS:
+            if version in done:
+                continue
+            with bind.begin() as conn:
+                migrate(conn)
+                conn.execute(
+                    schema_migrations.insert().values(
+                        version=version, name=name, applied_at=datetime.now(UTC).replace(tzinfo=None)
+                    )
+                )
+            applied_now.append(version)
+    return applied_now
+
+
+def fold_keys(bind: Engine = engine, batch_size: int = 1000) -> tuple[int, list[str]]:
+    """Upper-case university IDs and lower-case emails of rows written before
+    keys were canonicalized (utils.validation), `batch_size` rows per
+    transaction. Folded rows get a new updated_at (and a customer.updated
+    event when the outbox is on), so ETags and the change feed move too.
+
+    Returns the number of rows folded and the university IDs left alone
+    because the folded key is already taken (possible only under a
+    case-sensitive collation)."""
+    customers = customer_repository.Customer.__table__
+    addresses = address_repository.Address.__table__
+    # MySQL's default collation compares case-insensitively
+    binary = "BINARY " if bind.dialect.name == "mysql" else ""
+    not_canonical = text(
+        f"({binary}customers.university_id <> UPPER(customers.university_id)"
+        f" OR {binary}customers.email <> LOWER(customers.email))"
+    )
+    folded, conflicts, after = 0, [], ""
+    while True:
+        with bind.begin() as conn:
+            rows = conn.execute(
+                select(customers)
+                .where(customers.c.university_id > after, not_canonical)
+                .order_by(customers.c.university_id)
+                .limit(batch_size)
+            ).all()
+            for row in rows:
+                values = {
+                    "university_id": row.university_id.upper(),
+                    "email": row.email.lower(),
+                    "updated_at": customer_repository._utcnow(),
+                }
+                try:
+                    with conn.begin_nested():
+                        conn.execute(
+                            update(customers).where(customers.c.university_id == row.university_id).values(**values)
+                        )
+                        if values["university_id"] != row.university_id:
+                            conn.execute(
+                                update(addresses)
+                                .where(addresses.c.university_id == row.university_id)
+                                .values(university_id=values["university_id"])
+                            )
+                        if outbox.outbox_enabled:
+                            customer = CustomerRead.model_validate({**row._mapping, **values})
+                            conn.execute(
+                                customer_repository._outbox_insert("customer.updated", customer.university_id, customer)
+                            )
+                except IntegrityError:
+                    conflicts.append(row.university_id)
+                    continue
+                folded += 1
+        if len(rows) < batch_size:
+            return folded, conflicts
+        after = rows[-1].university_id
+
+
+def status(bind: Engine = engine) -> list[tuple[int, str, bool]]:
+    with bind.begin() as conn:
+        done = applied_versions(conn)
+    return [(version, name, version in done) for version, name, _ in MIGRATIONS]
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["status"]:
+        for version, name, done in status():
+            print(f"{version:>4}  {'applied' if done else 'pending':<8} {name}")
+    elif sys.argv[1:] == ["fold-keys"]:
+        folded, conflicts = fold_keys()
+        print(f"Folded keys of {folded} customers.")
+        if conflicts:
+            print(f"Left alone (folded key already taken): {', '.join(conflicts)}")
+    else:
+        applied = upgrade()
+        print(f"Applied migrations: {applied}" if applied else "Schema up to date.")
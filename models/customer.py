@@ -1,14 +1,19 @@
 from __future__ import annotations
 
 from datetime import date, datetime
-from typing import Optional
+from typing import Any, Dict, List, Literal, Optional, Union
 
-from pydantic import BaseModel, Field, StringConstraints
+from pydantic import BaseModel, Field, StringConstraints, field_validator
 from typing_extensions import Annotated
 
-# Email must end with .edu
-EduEmail = Annotated[str, StringConstraints(pattern=r"^[\w\.-]+@[\w\.-]+\.edu$", strip_whitespace=True)]
-UniversityIDType = Annotated[str, StringConstraints(pattern=r"^[A-Za-z]{2,4}\d{3,4}$")]
+from models.address import AddressRead
+from utils.validation import EDU_EMAIL_PATTERN, UNIVERSITY_ID_PATTERN
+
+# Validated and case-folded in pydantic-core; same rules as utils.validation
+# Email must end with .edu; stored lower-case
+EduEmail = Annotated[str, StringConstraints(pattern=EDU_EMAIL_PATTERN, strip_whitespace=True, to_lower=True)]
+# Stored upper-case
+UniversityIDType = Annotated[str, StringConstraints(pattern=UNIVERSITY_ID_PATTERN, strip_whitespace=True, to_upper=True)]
 
 class CustomerBase(BaseModel):
     first_name: str = Field(
@@ -131,6 +136,14 @@ class CustomerUpdate(BaseModel):
         json_schema_extra={"example": "inactive"},
     )
 
+    # Omit a field to leave it as is; these columns can't be cleared (null)
+    @field_validator("first_name", "last_name", "email", "status")
+    @classmethod
+    def _not_null(cls, value):
+        if value is None:
+            raise ValueError("may be omitted but not null")
+        return value
+
     model_config = {
         "json_schema_extra": {
             "example": {
@@ -174,4 +187,166 @@ class CustomerRead(CustomerBase):
                 }
             ]
         }
-    }
\ No newline at end of file
+    }
+
+
+class CustomerWithAddresses(CustomerRead):
+    """A customer read with `include=addresses`."""
+
+    addresses: List[AddressRead] = Field(
+        default_factory=list,
+        description="The customer's addresses, oldest first.",
+    )
+
+
+class CustomerBatchCreate(BaseModel):
+    """Bulk create/upsert payload. Items are validated one by one so a bad row
+    is reported as invalid instead of rejecting the whole batch."""
+
+    items: List[dict[str, Any]] = Field(
+        ...,
+        description="Customer payloads (same shape as CustomerCreate).",
+    )
+    upsert: bool = Field(
+        False,
+        description="Update existing customers (by university_id) instead of reporting a conflict.",
+    )
+    chunk_size: Optional[int] = Field(
+        None,
+        ge=1,
+        le=5000,
+        description="Rows per multi-row INSERT / transaction (server default if omitted).",
+    )
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "items": [
+                    {
+                        "first_name": "Rahul",
+                        "last_name": "Singh",
+                        "university_id": "UNI1234",
+                        "email": "rahul@columbia.edu",
+                    }
+                ],
+                "upsert": False,
+            }
+        }
+    }
+
+
+class CustomerBatchItemResult(BaseModel):
+    index: int = Field(..., description="Position of the item in the request.")
+    university_id: Optional[str] = Field(None, description="University ID of the item, if present.")
+    status: Literal["created", "updated", "unchanged", "conflict", "invalid"] = Field(
+        ..., description="Outcome for this item (unchanged: an upsert equal to the stored customer)."
+    )
+    detail: Optional[str] = Field(None, description="Reason for a conflict or validation failure.")
+
+
+class CustomerBatchResult(BaseModel):
+    created: int = Field(0, description="Number of customers inserted.")
+    updated: int = Field(0, description="Number of existing customers updated (upsert only).")
+    unchanged: int = Field(0, description="Number of upserted items equal to the stored customer, left as they were.")
+    conflicts: int = Field(0, description="Number of items rejected as duplicates.")
+    invalid: int = Field(0, description="Number of items that failed validation.")
+    results: List[CustomerBatchItemResult] = Field(
+        default_factory=list,
+        description="Per-item results, in request order.",
+    )
+
+
+class CustomerLookupRequest(BaseModel):
+    """Multi-get payload: any mix of university IDs and emails."""
+
+    university_ids: List[str] = Field(
+        default_factory=list,
+        description="University IDs to fetch.",
+    )
+    emails: List[str] = Field(
+        default_factory=list,
+        description="Emails to fetch.",
+    )
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "university_ids": ["UNI1234", "UNI0001"],
+                "emails": ["rahul@columbia.edu"],
+            }
+        }
+    }
+
+
+class CustomerLookupResult(BaseModel):
+    customers: List[Union[CustomerRead, CustomerWithAddresses]] = Field(
+        default_factory=list,
+        description="Customers found, in request order (university_ids first, then emails), each listed once.",
+    )
+    missing_university_ids: List[str] = Field(
+        default_factory=list,
+        description="Requested university IDs with no matching customer.",
+    )
+    missing_emails: List[str] = Field(
+        default_factory=list,
+        description="Requested emails with no matching customer.",
+    )
+
+
+class CustomerFilter(BaseModel):
+    """Filters for listing/exporting customers; all are optional and ANDed."""
+
+    status: Optional[str] = Field(None, description="Exact customer status.")
+    last_name_prefix: Optional[str] = Field(None, description="Last name starts with this value.")
+    created_after: Optional[datetime] = Field(None, description="created_at >= this timestamp.")
+    created_before: Optional[datetime] = Field(None, description="created_at < this timestamp.")
+    updated_after: Optional[datetime] = Field(None, description="updated_at >= this timestamp.")
+    updated_before: Optional[datetime] = Field(None, description="updated_at < this timestamp.")
+
+
+class CustomerPage(BaseModel):
+    items: List[Union[CustomerRead, CustomerWithAddresses, Dict[str, Any]]] = Field(
+        default_factory=list,
+        description=(
+            "Customers on this page; only the requested fields with `fields=`. Ordered by university_id, "
+            "or with `last_name_prefix` by last_name, first_name, university_id, or else with `status` / "
+            "`updated_*` by updated_at, university_id."
+        ),
+    )
+    next_cursor: Optional[str] = Field(
+        None,
+        description="Pass as `cursor` (with the same filters) to fetch the next page; null on the last page.",
+    )
+
+
+class CustomerChange(BaseModel):
+    type: Literal["upsert", "delete"] = Field(
+        ..., description="upsert: created or updated; delete: tombstone for a deleted customer."
+    )
+    university_id: str = Field(..., description="University ID of the changed customer.")
+    changed_at: datetime = Field(..., description="updated_at of the record, or the deletion time.")
+    customer: Optional[CustomerRead] = Field(None, description="Current record (upserts only).")
+
+
+class CustomerChangePage(BaseModel):
+    changes: List[CustomerChange] = Field(
+        default_factory=list,
+        description="Changes in (changed_at, university_id) order.",
+    )
+    next_cursor: Optional[str] = Field(
+        None,
+        description="Pass as `since` to resume after the last change; null if there were none yet.",
+    )
+    has_more: bool = Field(False, description="True if more changes are available right away.")
+
+
+class CustomerSearchHit(BaseModel):
+    score: float = Field(
+        ..., description="Sum over the query terms of 1 for a whole-name match, less for prefix and fuzzy matches."
+    )
+    customer: CustomerRead
+
+
+class CustomerSearchResult(BaseModel):
+    query: str
+    items: List[CustomerSearchHit] = Field(default_factory=list, description="Best matches first.")
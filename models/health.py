@@ -17,4 +17,25 @@ class Health(BaseModel):
                 "ip_address": "192.168.1.10"
             }
         }
-    }
\ No newline at end of file
+    }
+
+class Readiness(BaseModel):
+    status: int = Field(description="200 when ready to serve traffic, 503 otherwise")
+    status_message: str = Field(description="Human-readable readiness summary")
+    checked_at: str = Field(description="When the dependencies were last checked, ISO 8601 (UTC)")
+    database: str = Field(description="'ok' or the database error")
+    pool_checked_out: int = Field(description="DB connections currently in use")
+    pool_capacity: int = Field(description="pool_size + max_overflow")
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "status": 200,
+                "status_message": "READY",
+                "checked_at": "2025-09-02T12:34:56Z",
+                "database": "ok",
+                "pool_checked_out": 3,
+                "pool_capacity": 20,
+            }
+        }
+    }
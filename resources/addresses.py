@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from starlette.responses import Response
+
+from address_repository import AddressNotFound, AddressRepository
+from customer_repository import CustomerNotFound
+from db import get_db, get_read_db
+from framework.keys import university_id_key
+from framework.responses import ModelJSONResponse
+from models.address import AddressCreate, AddressRead, AddressUpdate
+
+# A customer's addresses. To read them together with customers, use
+# include=addresses on the customer routes instead of one call per customer.
+router = APIRouter()
+
+
+@router.get("/customers/{university_id}/addresses", response_model=List[AddressRead])
+def list_addresses(
+    university_id: str = Depends(university_id_key),
+    db: Session = Depends(get_read_db),
+):
+    try:
+        return ModelJSONResponse(AddressRepository(db).list_for_customer(university_id))
+    except CustomerNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.post("/customers/{university_id}/addresses", response_model=AddressRead, status_code=201)
+def create_address(
+    address: AddressCreate,
+    university_id: str = Depends(university_id_key),
+    db: Session = Depends(get_db),
+):
+    try:
+        created = AddressRepository(db).create(university_id, address)
+    except CustomerNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return ModelJSONResponse(created, status_code=201)
+
+
+@router.patch("/customers/{university_id}/addresses/{address_id}", response_model=AddressRead)
+def update_address(
+    address_id: str,
+    update: AddressUpdate,
+    university_id: str = Depends(university_id_key),
+    db: Session = Depends(get_db),
+):
+    try:
+        return ModelJSONResponse(AddressRepository(db).update(university_id, address_id, update))
+    except AddressNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.delete("/customers/{university_id}/addresses/{address_id}", status_code=204)
+def delete_address(
+    address_id: str,
+    university_id: str = Depends(university_id_key),
+    db: Session = Depends(get_db),
+):
+    try:
+        AddressRepository(db).delete(university_id, address_id)
+    except AddressNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return Response(status_code=204)
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Depends, Header
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.responses import Response
+
+from address_repository import AsyncAddressRepository, customer_ids, with_addresses
+from customer_repository import (
+    AsyncCustomerRepository,
+    CustomerNotFound,
+    CustomerAlreadyExists,
+    CustomerVersionMismatch,
+)
+from db import get_async_db, get_async_read_db
+from models.customer import CustomerRead, CustomerCreate, CustomerUpdate
+from framework.etags import if_match_versions, none_match, not_modified, version_headers
+from framework.keys import email_key, university_id_key
+from framework.projection import customer_fields, customer_include, fields_variant, include_fields
+from framework.responses import ModelJSONResponse
+from services.cache import customer_cache
+from services.search import customer_search
+from services.singleflight import async_customer_flights
+
+# Async variants of the customer CRUD routes in main.py. They run on the event
+# loop instead of the threadpool, so one instance can keep many lookups in
+# flight at once. Enabled with USE_ASYNC_ROUTES=true.
+router = APIRouter()
+
+
+def read_repository(db: AsyncSession) -> AsyncCustomerRepository:
+    # See main.read_repository
+    if db.info["read_your_writes"]:
+        return AsyncCustomerRepository(db)
+    if db.info["replica"]:
+        return AsyncCustomerRepository(db, cache=customer_cache, fill_cache=False)
+    return AsyncCustomerRepository(db, cache=customer_cache, flights=async_customer_flights)
+
+
+@router.post("/customers", response_model=CustomerRead, status_code=201)
+async def create_customer(
+        customer: CustomerCreate,
+        db: AsyncSession = Depends(get_async_db),
+):
+    repo = AsyncCustomerRepository(
+        db, cache=customer_cache, flights=async_customer_flights, search=customer_search
+    )
+    try:
+        created = await repo.create(customer)
+    except CustomerAlreadyExists as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return ModelJSONResponse(created, status_code=201, headers=version_headers(created.updated_at))
+
+
+@router.get("/customers/by-email/{email}", response_model=CustomerRead, responses={304: {"description": "Not Modified"}})
+async def get_customer_by_email(
+    email: str = Depends(email_key),
+    fields: Optional[tuple[str, ...]] = Depends(customer_fields),
+    include: tuple[str, ...] = Depends(customer_include),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    repo = read_repository(db)
+    variant = fields_variant(fields)
+    fields = include_fields(fields, include)
+    try:
+        # Revalidation only needs updated_at, not the row. Embedded
+        # addresses don't move updated_at, so reads with include= aren't
+        # conditional (and carry no ETag)
+        if (if_none_match is not None or if_modified_since is not None) and not include:
+            version = await repo.get_version_by_email(email)
+            if none_match(if_none_match, if_modified_since, version, variant):
+                return not_modified(version, variant)
+        if fields:
+            customer, version = await repo.project_by_email(email, fields)
+        else:
+            customer = await repo.get_by_email(email)
+            version = customer.updated_at
+    except CustomerNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if include:
+        addresses = await AsyncAddressRepository(db).for_customers(customer_ids([customer]))
+        return ModelJSONResponse(with_addresses([customer], addresses)[0])
+    return ModelJSONResponse(customer, headers=version_headers(version, variant))
+
+
+@router.get("/customers/{university_id}", response_model=CustomerRead, responses={304: {"description": "Not Modified"}})
+async def get_customer_by_id(
+    university_id: str = Depends(university_id_key),
+    fields: Optional[tuple[str, ...]] = Depends(customer_fields),
+    include: tuple[str, ...] = Depends(customer_include),
+    if_none_match: Optional[str] = Header(None),
+    if_modified_since: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    repo = read_repository(db)
+    variant = fields_variant(fields)
+    fields = include_fields(fields, include)
+    try:
+        # Revalidation only needs updated_at, not the row. Embedded
+        # addresses don't move updated_at, so reads with include= aren't
+        # conditional (and carry no ETag)
+        if (if_none_match is not None or if_modified_since is not None) and not include:
+            version = await repo.get_version(university_id)
+            if none_match(if_none_match, if_modified_since, version, variant):
+                return not_modified(version, variant)
+        if fields:
+            customer, version = await repo.project_by_university_id(university_id, fields)
+        else:
+            customer = await repo.get_by_university_id(university_id)
+            version = customer.updated_at
+    except CustomerNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if include:
+        addresses = await AsyncAddressRepository(db).for_customers([university_id])
+        return ModelJSONResponse(with_addresses([customer], addresses)[0])
+    return ModelJSONResponse(customer, headers=version_headers(version, variant))
+
+
+@router.patch("/customers/{university_id}", response_model=CustomerRead)
+async def update_customer(
+    update: CustomerUpdate,
+    university_id: str = Depends(university_id_key),
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+):
+    repo = AsyncCustomerRepository(
+        db, cache=customer_cache, flights=async_customer_flights, search=customer_search
+    )
+    try:
+        customer = await repo.update(university_id, update, if_versions=if_match_versions(if_match))
+    except CustomerNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except CustomerVersionMismatch as e:
+        raise HTTPException(status_code=412, detail=str(e))
+    except CustomerAlreadyExists as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return ModelJSONResponse(customer, headers=version_headers(customer.updated_at))
+
+
+@router.delete("/customers/{university_id}", status_code=204)
+async def delete_customer(
+    university_id: str = Depends(university_id_key),
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+):
+    repo = AsyncCustomerRepository(
+        db, cache=customer_cache, flights=async_customer_flights, search=customer_search
+    )
+    try:
+        await repo.delete(university_id, if_versions=if_match_versions(if_match))
+    except CustomerNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except CustomerVersionMismatch as e:
+        raise HTTPException(status_code=412, detail=str(e))
+
+    return Response(status_code=204)
@@ -0,0 +1,112 @@
+"""Production entry point: runs main:app with multiple uvicorn workers.
+
+    python server.py
+
+Settings (environment):
+    PORT                        listen port (Cloud Run sets it), default 8080
+    WEB_CONCURRENCY             worker processes, default = CPUs available
+    THREADPOOL_SIZE             threads per worker for sync routes (read by main.py)
+    KEEPALIVE_TIMEOUT           idle keep-alive seconds, default 65 (above the LB's)
+    BACKLOG                     listen backlog, default 2048
+    ACCESS_LOG                  "true" to enable per-request access logs
+    MYSQL_MAX_CONNECTIONS       MySQL max_connections; when set, each worker's pools
+                                are sized to their share (see pool_budget) unless
+                                MYSQL_POOL_SIZE / MYSQL_MAX_OVERFLOW are set
+    MAX_INSTANCES               instances sharing the database; default 1, except on
+                                Cloud Run (K_SERVICE set), which scales out unless capped
+    MYSQL_RESERVED_CONNECTIONS  connections kept free for admin/migrations, default 10
+    MULTI_WORKER_CACHE_TTL      CUSTOMER_CACHE_TTL used with the in-process (memory) cache
+                                when more than one process serves (several workers, or
+                                instances per MAX_INSTANCES), default 1 second (see main())
+    FORWARDED_ALLOW_IPS         comma-separated proxy IPs/networks whose X-Forwarded-For
+                                and X-Forwarded-Proto are trusted (client IP as seen by
+                                rate limits and logs); default none: the peer address
+"""
+from __future__ import annotations
+
+import importlib.util
+import os
+from typing import Optional
+
+import uvicorn
+
+
+def cpu_count() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def worker_count() -> int:
+    return int(os.environ.get("WEB_CONCURRENCY", 0)) or cpu_count()
+
+
+def pool_budget(workers: int) -> Optional[tuple[int, int]]:
+    """(pool_size, max_overflow) per engine so that every pool of every worker
+    of every instance at full overflow stays within MySQL's max_connections.
+    With USE_ASYNC_ROUTES each worker has two pools of that size (the sync
+    engine still serves the sync routes and background jobs)."""
+    max_connections = int(os.environ.get("MYSQL_MAX_CONNECTIONS", 0))
+    if not max_connections:
+        return None
+    instances = int(os.environ.get("MAX_INSTANCES", 1))
+    reserved = int(os.environ.get("MYSQL_RESERVED_CONNECTIONS", 10))
+    engines = 2 if os.environ.get("USE_ASYNC_ROUTES", "false").lower() in ("1", "true", "yes") else 1
+    per_engine = max(2, (max_connections - reserved) // (instances * workers * engines))
+    pool_size = (per_engine + 1) // 2
+    return pool_size, per_engine - pool_size
+
+
+def several_instances() -> bool:
+    """Whether other instances may serve the same customers. Cloud Run (it
+    sets K_SERVICE) starts more as load grows unless MAX_INSTANCES says 1."""
+    if "MAX_INSTANCES" in os.environ:
+        return int(os.environ["MAX_INSTANCES"]) > 1
+    return "K_SERVICE" in os.environ
+
+
+def main():
+    workers = worker_count()
+
+    budget = pool_budget(workers)
+    if budget is not None:
+        # Inherited by the worker processes, where db.py reads them
+        os.environ.setdefault("MYSQL_POOL_SIZE", str(budget[0]))
+        os.environ.setdefault("MYSQL_MAX_OVERFLOW", str(budget[1]))
+
+    if (workers > 1 or several_instances()) and os.environ.get("CUSTOMER_CACHE_BACKEND", "memory") == "memory":
+        # Each process caches on its own and a write only invalidates the
+        # cache of the one that handled it: other workers and instances may
+        # serve the old record (and 304s for it) until it expires, so keep
+        # that window short
+        os.environ.setdefault("CUSTOMER_CACHE_TTL", os.environ.get("MULTI_WORKER_CACHE_TTL", "1"))
+
+    forwarded_allow_ips = os.environ.get("FORWARDED_ALLOW_IPS", "").strip()
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    print(
+        f"Starting {workers} worker(s), loop={loop}, http={http}, "
+        f"pool_size={os.environ.get('MYSQL_POOL_SIZE', 'default')}, "
+        f"max_overflow={os.environ.get('MYSQL_MAX_OVERFLOW', 'default')}, "
+        f"cache_ttl={os.environ.get('CUSTOMER_CACHE_TTL', 'default')}"
+    )
+
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=int(os.environ.get("PORT", 8080)),
+        workers=workers,
+        loop=loop,
+        http=http,
+        backlog=int(os.environ.get("BACKLOG", 2048)),
+        timeout_keep_alive=int(os.environ.get("KEEPALIVE_TIMEOUT", 65)),
+        access_log=os.environ.get("ACCESS_LOG", "false").lower() in ("1", "true", "yes"),
+        # Off unless the proxies are named: any client could set the headers
+        proxy_headers=bool(forwarded_allow_ips),
+        forwarded_allow_ips=forwarded_allow_ips or None,
+    )
+
+
+if __name__ == "__main__":
+    main()
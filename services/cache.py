@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Optional
+
+from models.customer import CustomerRead
+
+# Cache configuration
+cache_backend = os.environ.get("CUSTOMER_CACHE_BACKEND", "memory")  # memory | shared | none
+cache_maxsize = int(os.environ.get("CUSTOMER_CACHE_MAXSIZE", 10000))
+cache_ttl = float(os.environ.get("CUSTOMER_CACHE_TTL", 60))
+# Recently invalidated customers remembered to turn away stale fills
+invalidation_history = int(os.environ.get("CUSTOMER_CACHE_INVALIDATION_HISTORY", 10000))
+
+
+class CacheBackend(ABC):
+    """Key/value store the customer cache is built on."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, *keys: str) -> None:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+
+class LRUTTLCache(CacheBackend):
+    """In-process cache with least-recently-used eviction and per-entry TTL."""
+
+    def __init__(self, maxsize: int = cache_maxsize, ttl: float = cache_ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SharedCacheBackend(CacheBackend):
+    """Base for caches shared between instances (Redis, Memcached, ...).
+
+    Subclasses only move bytes around; values are JSON-encoded here so that
+    every instance reads back the same CustomerRead.
+    """
+
+    def __init__(self, ttl: float = cache_ttl):
+        self.ttl = ttl
+
+    @abstractmethod
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def set_bytes(self, key: str, value: bytes, ttl: float) -> None:
+        ...
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self.get_bytes(key)
+        if raw is None:
+            return None
+        value = json.loads(raw)
+        if isinstance(value, dict):
+            return CustomerRead.model_validate(value)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        if isinstance(value, CustomerRead):
+            raw = value.model_dump_json().encode()
+        else:
+            raw = json.dumps(value).encode()
+        self.set_bytes(key, raw, self.ttl if ttl is None else ttl)
+
+
+class InMemorySharedCache(SharedCacheBackend):
+    """Local stand-in for a shared cache; stores serialized values like a remote one would."""
+
+    def __init__(self, ttl: float = cache_ttl):
+        super().__init__(ttl)
+        self._data: dict[str, tuple[float, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._data[key]
+                return None
+            return entry[1]
+
+    def set_bytes(self, key: str, value: bytes, ttl: float) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class CustomerCache:
+    """Read-through cache of CustomerRead objects.
+
+    Records are stored once under their university_id; the email key only
+    points at the university_id, so both lookups always see the same record.
+
+    A reader that loaded a customer before a concurrent write committed
+    would put the old record back after the writer's invalidate(), where it
+    stays until it expires. Readers therefore take a fill_token() before
+    loading, and put() drops the record if the customer was invalidated in
+    this process since. Invalidations are numbered; the last
+    `invalidation_history` customers keep theirs, older ones only raise a
+    floor that every earlier token is compared against (so a fill is at
+    worst skipped, never let through wrongly).
+    """
+
+    def __init__(self, backend: CacheBackend, history: int = invalidation_history):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.history = history
+        self._generation = 0
+        self._floor = 0
+        # university_id -> generation of its last invalidation
+        self._invalidated: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _id_key(university_id: str) -> str:
+        return f"customer:id:{university_id}"
+
+    @staticmethod
+    def _email_key(email: str) -> str:
+        return f"customer:email:{email}"
+
+    def get_by_university_id(self, university_id: str) -> Optional[CustomerRead]:
+        customer = self.backend.get(self._id_key(university_id))
+        if customer is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return customer
+
+    def get_by_email(self, email: str) -> Optional[CustomerRead]:
+        university_id = self.backend.get(self._email_key(email))
+        customer = self.backend.get(self._id_key(university_id)) if university_id else None
+        # A stale pointer (email moved to another record) counts as a miss
+        if customer is None or customer.email != email:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return customer
+
+    def fill_token(self) -> int:
+        """Take before loading a record to put(); see the class docstring."""
+        return self._generation
+
+    def put(self, customer: CustomerRead, token: Optional[int] = None) -> None:
+        with self._lock:
+            if token is not None and self._invalidated.get(customer.university_id, self._floor) > token:
+                return
+            self.backend.set(self._id_key(customer.university_id), customer)
+            self.backend.set(self._email_key(customer.email), customer.university_id)
+
+    def invalidate(self, university_id: str, *emails: Optional[str]) -> None:
+        keys = [self._id_key(university_id)]
+        keys.extend(self._email_key(email) for email in emails if email)
+        with self._lock:
+            self._generation += 1
+            self._invalidated[university_id] = self._generation
+            self._invalidated.move_to_end(university_id)
+            if len(self._invalidated) > self.history:
+                self._floor = self._invalidated.popitem(last=False)[1]
+            self.backend.delete(*keys)
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+
+def build_customer_cache() -> Optional[CustomerCache]:
+    if cache_backend == "none":
+        return None
+    if cache_backend == "shared":
+        return CustomerCache(InMemorySharedCache(ttl=cache_ttl))
+    return CustomerCache(LRUTTLCache(maxsize=cache_maxsize, ttl=cache_ttl))
+
+
+customer_cache = build_customer_cache()
@@ -0,0 +1,310 @@
+"""Transactional outbox for customer change events.
+
+CustomerRepository writes one `customer_outbox` row per change in the same
+transaction as the change itself, so an event exists if and only if the
+write committed. OutboxDispatcher drains the table in the background and
+hands batches of events to an EventPublisher (Pub/Sub, or a local stand-in);
+publishing never runs on the request path.
+
+Delivery is at least once: a batch whose publish fails stays in the table
+and is retried, possibly after later batches. Events carry a monotonically
+increasing `id` that consumers can use to dedupe and order.
+"""
+from __future__ import annotations
+
+import base64
+import gzip
+import json
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Optional
+
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String, Text, delete, insert, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from db import Base, engine
+from middleware.metrics import outbox_events_published, outbox_publish_failures
+from models.customer import CustomerRead
+
+logger = logging.getLogger(__name__)
+
+# Outbox configuration
+pubsub_topic = os.environ.get("PUBSUB_TOPIC")  # projects/<project>/topics/<topic>
+# pubsub | file | memory | none; with "none" no outbox rows are written
+outbox_publisher = os.environ.get("OUTBOX_PUBLISHER", "pubsub" if pubsub_topic else "none").lower()
+outbox_file = os.environ.get("OUTBOX_FILE", "customer-events.ndjson")
+# Events per published message
+outbox_batch_size = int(os.environ.get("OUTBOX_BATCH_SIZE", 100))
+# Messages being published at once
+outbox_max_in_flight = int(os.environ.get("OUTBOX_MAX_IN_FLIGHT", 4))
+# Idle poll interval; writes in this process wake the dispatcher right away
+outbox_poll_seconds = float(os.environ.get("OUTBOX_POLL_SECONDS", 1.0))
+# Messages at least this large are gzip-compressed
+outbox_compress_min_bytes = int(os.environ.get("OUTBOX_COMPRESS_MIN_BYTES", 1024))
+
+outbox_enabled = outbox_publisher != "none"
+
+
+class OutboxEvent(Base):
+    __tablename__ = "customer_outbox"
+    # Keep ids increasing after the table is drained (SQLite reuses rowids otherwise)
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    event_type = Column(String(32), nullable=False)
+    university_id = Column(String(32), nullable=False)
+    # CustomerRead as JSON; NULL for deletes
+    payload = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+
+def outbox_row(event_type: str, university_id: str, customer: Optional[CustomerRead], at) -> dict[str, Any]:
+    return {
+        "event_type": event_type,
+        "university_id": university_id,
+        "payload": customer.model_dump_json() if customer is not None else None,
+        "created_at": at,
+    }
+
+
+def outbox_insert(rows: list[dict[str, Any]]):
+    return insert(OutboxEvent).values(rows)
+
+
+# Set after a transaction that wrote outbox rows commits, so the dispatcher
+# in this process doesn't wait for its next poll.
+_pending = threading.Event()
+
+
+def notify() -> None:
+    _pending.set()
+
+
+def encode_batch(events: list[dict[str, Any]]) -> tuple[bytes, dict[str, str]]:
+    """One message body (a JSON array of events) and its attributes."""
+    data = json.dumps(events, separators=(",", ":")).encode()
+    attributes = {"event_count": str(len(events)), "content_type": "application/json"}
+    if len(data) >= outbox_compress_min_bytes:
+        data = gzip.compress(data, compresslevel=6)
+        attributes["content_encoding"] = "gzip"
+    return data, attributes
+
+
+def decode_batch(data: bytes, attributes: dict[str, str]) -> list[dict[str, Any]]:
+    """Inverse of encode_batch, for consumers."""
+    if attributes.get("content_encoding") == "gzip":
+        data = gzip.decompress(data)
+    return json.loads(data)
+
+
+class EventPublisher(ABC):
+    """Destination for batches of outbox events."""
+
+    @abstractmethod
+    def publish(self, data: bytes, attributes: dict[str, str]) -> None:
+        """Blocks until the message is accepted; raises if it was not."""
+
+    def close(self) -> None:
+        pass
+
+
+class PubSubPublisher(EventPublisher):
+    def __init__(self, topic: str, timeout: float = 30):
+        # Imported here: the Pub/Sub client is heavy and only needed when publishing
+        from google.cloud import pubsub_v1
+
+        self.topic = topic
+        self.timeout = timeout
+        self.client = pubsub_v1.PublisherClient()
+
+    def publish(self, data: bytes, attributes: dict[str, str]) -> None:
+        self.client.publish(self.topic, data, **attributes).result(timeout=self.timeout)
+
+    def close(self) -> None:
+        self.client.stop()
+
+
+class InMemoryPublisher(EventPublisher):
+    """Local stand-in that keeps published messages in a list."""
+
+    def __init__(self):
+        self.messages: list[tuple[bytes, dict[str, str]]] = []
+        self._lock = threading.Lock()
+
+    def publish(self, data: bytes, attributes: dict[str, str]) -> None:
+        with self._lock:
+            self.messages.append((data, attributes))
+
+    def events(self) -> list[dict[str, Any]]:
+        with self._lock:
+            return [event for data, attributes in self.messages for event in decode_batch(data, attributes)]
+
+
+class FilePublisher(EventPublisher):
+    """Local stand-in that appends each message to an NDJSON file, as
+    {"attributes": {...}, "data": "<base64>"} like a Pub/Sub push body."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def publish(self, data: bytes, attributes: dict[str, str]) -> None:
+        line = json.dumps({"attributes": attributes, "data": base64.b64encode(data).decode()})
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def build_publisher() -> Optional[EventPublisher]:
+    if outbox_publisher == "none":
+        return None
+    if outbox_publisher == "pubsub":
+        if not pubsub_topic:
+            raise RuntimeError("OUTBOX_PUBLISHER=pubsub needs PUBSUB_TOPIC")
+        return PubSubPublisher(pubsub_topic)
+    if outbox_publisher == "file":
+        return FilePublisher(outbox_file)
+    if outbox_publisher == "memory":
+        return InMemoryPublisher()
+    raise RuntimeError(f"Unknown OUTBOX_PUBLISHER {outbox_publisher!r}")
+
+
+def _event(row) -> dict[str, Any]:
+    return {
+        "id": row.id,
+        "type": row.event_type,
+        "university_id": row.university_id,
+        "occurred_at": row.created_at.isoformat(),
+        "data": json.loads(row.payload) if row.payload is not None else None,
+    }
+
+
+class OutboxDispatcher:
+    """Drains customer_outbox into an EventPublisher from a background thread.
+
+    Each round reads up to batch_size * max_in_flight events, publishes them
+    as max_in_flight concurrent messages and deletes the rows of the
+    messages that were accepted. With several workers/instances only the
+    holder of a MySQL named lock dispatches.
+    """
+
+    lock_name = "customer_outbox_dispatcher"
+
+    def __init__(
+        self,
+        publisher: EventPublisher,
+        bind: Engine = engine,
+        batch_size: int = outbox_batch_size,
+        max_in_flight: int = outbox_max_in_flight,
+        poll_seconds: float = outbox_poll_seconds,
+    ):
+        self.publisher = publisher
+        self.bind = bind
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.poll_seconds = poll_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="outbox-publish")
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def drain_once(self) -> int:
+        """Publish one round of pending events; returns how many were published."""
+        with Session(self.bind) as db:
+            rows = db.execute(
+                select(OutboxEvent).order_by(OutboxEvent.id).limit(self.batch_size * self.max_in_flight)
+            ).scalars().all()
+            if not rows:
+                return 0
+
+            batches = [rows[i:i + self.batch_size] for i in range(0, len(rows), self.batch_size)]
+            futures = {
+                self._executor.submit(self.publisher.publish, *encode_batch([_event(r) for r in batch])): batch
+                for batch in batches
+            }
+            wait(futures)
+
+            published = []
+            for future, batch in futures.items():
+                if future.exception() is None:
+                    published.extend(r.id for r in batch)
+                else:
+                    outbox_publish_failures.inc()
+                    logger.warning("Publishing %d outbox events failed: %s", len(batch), future.exception())
+            if published:
+                db.execute(delete(OutboxEvent).where(OutboxEvent.id.in_(published)))
+                db.commit()
+                outbox_events_published.inc(len(published))
+            if len(published) < len(rows):
+                raise RuntimeError(f"{len(rows) - len(published)} outbox events not published")
+            return len(published)
+
+    def _is_leader(self, conn: Connection) -> bool:
+        # Takes the lock if it is free; also keeps the idle lock connection alive
+        if conn.dialect.name != "mysql":
+            return True
+        held = conn.execute(
+            text("SELECT IS_USED_LOCK(:name) = CONNECTION_ID() OR GET_LOCK(:name, 0) = 1"),
+            {"name": self.lock_name},
+        ).scalar()
+        conn.commit()
+        return bool(held)
+
+    def _take_lock(self) -> Optional[Connection]:
+        """A connection holding the lock, or None if another process holds it:
+        only the leader keeps a pool connection checked out between rounds."""
+        conn = self.bind.connect()
+        try:
+            if self._is_leader(conn):
+                return conn
+        except BaseException:
+            conn.close()
+            raise
+        conn.close()
+        return None
+
+    def _run(self) -> None:
+        backoff = self.poll_seconds
+        lock_conn = None
+        while not self._stop.is_set():
+            try:
+                if lock_conn is not None and not self._is_leader(lock_conn):
+                    # Lost the lock, e.g. the server ended the session
+                    lock_conn.close()
+                    lock_conn = None
+                if lock_conn is None:
+                    lock_conn = self._take_lock()
+                if lock_conn is None:
+                    self._stop.wait(self.poll_seconds * 10)
+                    continue
+                _pending.clear()
+                published = self.drain_once()
+                backoff = self.poll_seconds
+                if published == self.batch_size * self.max_in_flight:
+                    continue  # more waiting; don't sleep
+                _pending.wait(self.poll_seconds)
+            except (SQLAlchemyError, RuntimeError) as e:
+                logger.warning("Outbox dispatch failed, retrying in %.1fs: %s", backoff, e)
+                if lock_conn is not None and lock_conn.invalidated:
+                    lock_conn.close()
+                    lock_conn = None
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 60)
+        if lock_conn is not None:
+            lock_conn.close()
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="outbox-dispatcher", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10) -> None:
+        self._stop.set()
+        _pending.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._executor.shutdown(wait=True)
+        self.publisher.close()
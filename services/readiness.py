@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from datetime import datetime, UTC
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from db import engine, db_pool_size, db_max_overflow
+from models.health import Readiness
+
+# How long a readiness result is reused before the database is checked again
+readiness_cache_seconds = float(os.environ.get("READINESS_CACHE_SECONDS", 5))
+
+
+class ReadinessProbe:
+    """Deep readiness check (DB round trip + pool headroom), cached so that
+    frequent probes cost at most one SELECT 1 per interval, and never queue
+    for a pool connection when the pool is already exhausted."""
+
+    def __init__(self, ttl: float = readiness_cache_seconds):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._result: Readiness | None = None
+        self._checked_at = 0.0
+
+    def get(self) -> Readiness:
+        if self._result is not None and time.monotonic() - self._checked_at < self.ttl:
+            return self._result
+        # One caller re-checks; concurrent probes wait and reuse its result
+        with self._lock:
+            if self._result is None or time.monotonic() - self._checked_at >= self.ttl:
+                self._result = self._check()
+                self._checked_at = time.monotonic()
+            return self._result
+
+    def _check(self) -> Readiness:
+        capacity = db_pool_size + db_max_overflow
+        checked_out = engine.pool.checkedout()
+        database = "ok"
+        if checked_out >= capacity:
+            database = "connection pool exhausted"
+        else:
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+            except SQLAlchemyError as e:
+                database = f"{type(e).__name__}: {e.__cause__ or e}"
+
+        ready = database == "ok"
+        return Readiness(
+            status=200 if ready else 503,
+            status_message="READY" if ready else "NOT READY",
+            checked_at=datetime.now(UTC).isoformat(),
+            database=database,
+            pool_checked_out=checked_out,
+            pool_capacity=capacity,
+        )
+
+
+readiness_probe = ReadinessProbe()
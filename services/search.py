@@ -0,0 +1,293 @@
+"""In-process name search over customers (GET /customers/search).
+
+CustomerSearchIndex maps the tokens of first/middle/last names to university
+IDs. A query term matches a token exactly, as a prefix (bisect over the
+sorted vocabulary) or, from 4 characters on, within one typo (a wrong,
+missing, extra or swapped letter) through an index of the vocabulary's
+one-letter deletions. The vocabulary stays far smaller than the customer
+count since names repeat. Every term has to match; customers are ranked by
+the sum of their best match per term.
+
+Each worker process keeps its own index (about 0.5 GB per million
+customers) and polls the change feed, so search is off unless CUSTOMER_SEARCH
+is set. SearchIndexSync builds the index from the change feed and keeps
+following the feed for writes made elsewhere; writes made through a
+CustomerRepository in this process update it right away.
+"""
+from __future__ import annotations
+
+import bisect
+import heapq
+import logging
+import os
+import re
+import threading
+import unicodedata
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from customer_repository import CustomerRepository
+from db import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Off by default: memory for the index is needed in every worker process
+customer_search_enabled = os.environ.get("CUSTOMER_SEARCH", "false").lower() in ("1", "true", "yes")
+# How often each process polls the change feed for writes made elsewhere
+search_sync_seconds = float(os.environ.get("CUSTOMER_SEARCH_SYNC_SECONDS", 2))
+# Changes read per change feed call (also while building the index)
+search_sync_batch_size = int(os.environ.get("CUSTOMER_SEARCH_SYNC_BATCH_SIZE", 5000))
+
+# Scores per term: exact > prefix (longer share of the token ranks higher) >
+# one typo (in a longer name ranks higher)
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.5
+FUZZY_SCORE = 0.8
+# Shorter terms are matched exactly or by prefix only
+FUZZY_MIN_LENGTH = 4
+
+_non_word = re.compile(r"[^\w]+")
+
+
+def tokenize(text: Optional[str]) -> list[str]:
+    """Lower-case, accent-free words of `text`."""
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return [token for token in _non_word.split(text) if token]
+
+
+def variants(token: str) -> set[str]:
+    """`token` and every one-letter deletion of it: two words within one
+    typo of each other share at least one variant."""
+    return {token, *(token[:i] + token[i + 1:] for i in range(len(token)))}
+
+
+def one_typo_apart(a: str, b: str) -> bool:
+    """One substitution, insertion, deletion or adjacent swap."""
+    if len(a) > len(b):
+        a, b = b, a
+    if len(b) - len(a) > 1:
+        return False
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) < len(b):
+        return a[i:] == b[i + 1:]
+    swapped = a[i:i + 2] == b[i + 1:i + 2] + b[i:i + 1]
+    return a[i + 1:] == b[i + 1:] or (swapped and a[i + 2:] == b[i + 2:])
+
+
+class CustomerSearchIndex:
+    def __init__(self):
+        # False until the first full pass over the change feed
+        self.ready = False
+        self._docs: dict[str, tuple[str, ...]] = {}
+        self._postings: dict[str, set[str]] = {}
+        self._vocab: list[str] = []
+        # one-letter deletion (or the token itself) -> tokens
+        self._variants: dict[str, set[str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    @property
+    def vocabulary_size(self) -> int:
+        return len(self._vocab)
+
+    def put(self, university_id: str, *names: Optional[str]) -> None:
+        self.put_many([(university_id, *names)])
+
+    def put_many(self, customers: Iterable[tuple[Optional[str], ...]]) -> None:
+        """(university_id, first_name, middle_name, last_name) tuples."""
+        new_tokens = []
+        with self._lock:
+            for university_id, *names in customers:
+                tokens = tuple(dict.fromkeys(token for name in names for token in tokenize(name)))
+                if self._docs.get(university_id) == tokens:
+                    continue
+                self._remove(university_id)
+                self._docs[university_id] = tokens
+                for token in tokens:
+                    postings = self._postings.get(token)
+                    if postings is None:
+                        postings = self._postings[token] = set()
+                        new_tokens.append(token)
+                    postings.add(university_id)
+            if len(new_tokens) > 1000:
+                # Building: one sort beats thousands of list insertions
+                self._vocab = sorted(self._postings)
+            else:
+                for token in new_tokens:
+                    bisect.insort(self._vocab, token)
+            for token in new_tokens:
+                if len(token) >= FUZZY_MIN_LENGTH - 1:
+                    for variant in variants(token):
+                        self._variants.setdefault(variant, set()).add(token)
+
+    def put_customer(self, customer) -> None:
+        self.put(customer.university_id, customer.first_name, customer.middle_name, customer.last_name)
+
+    def remove(self, university_id: str) -> None:
+        with self._lock:
+            self._remove(university_id)
+
+    def _remove(self, university_id: str) -> None:
+        for token in self._docs.pop(university_id, ()):
+            postings = self._postings[token]
+            postings.discard(university_id)
+            if postings:
+                continue
+            del self._postings[token]
+            del self._vocab[bisect.bisect_left(self._vocab, token)]
+            if len(token) >= FUZZY_MIN_LENGTH - 1:
+                for variant in variants(token):
+                    tokens = self._variants[variant]
+                    tokens.discard(token)
+                    if not tokens:
+                        del self._variants[variant]
+
+    def search(self, query: str, limit: int = 20) -> list[tuple[str, float]]:
+        """(university_id, score) of the best `limit` matches, best first."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            matches = [self._matching_tokens(term) for term in terms]
+            if len(matches) == 1:
+                return self._best_postings(matches[0], limit)
+            scores = self._intersect(matches)
+        return heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+
+    def _best_postings(self, matches: dict[str, float], limit: int) -> list[tuple[str, float]]:
+        # One term: take customers one score level at a time, best first,
+        # and stop at the level that fills `limit`, instead of scoring every
+        # customer under a short prefix
+        levels: dict[float, list[str]] = {}
+        for token, score in matches.items():
+            levels.setdefault(score, []).append(token)
+        hits: list[tuple[str, float]] = []
+        seen: set[str] = set()
+        for score in sorted(levels, reverse=True):
+            # A customer under several tokens keeps the best one's score
+            level = set().union(*(self._postings[token] for token in levels[score])) - seen
+            hits += [(university_id, score) for university_id in heapq.nsmallest(limit - len(hits), level)]
+            if len(hits) >= limit:
+                break
+            seen |= level
+        return hits
+
+    def _intersect(self, matches: list[dict[str, float]]) -> dict[str, float]:
+        # Customers matching every term (set operations, most selective term
+        # first), then scored by their best token per term
+        sizes = [sum(len(self._postings[token]) for token in term_matches) for term_matches in matches]
+        candidates: Optional[set[str]] = None
+        for size, term_matches in sorted(zip(sizes, matches), key=lambda item: item[0]):
+            if candidates is None:
+                candidates = set().union(*(self._postings[token] for token in term_matches))
+            elif len(candidates) < size:
+                candidates = {
+                    university_id
+                    for university_id in candidates
+                    if any(token in term_matches for token in self._docs[university_id])
+                }
+            else:
+                candidates &= set().union(*(self._postings[token] for token in term_matches))
+            if not candidates:
+                return {}
+        return {
+            university_id: sum(
+                max(term_matches.get(token, 0.0) for token in self._docs[university_id])
+                for term_matches in matches
+            )
+            for university_id in candidates
+        }
+
+    def _matching_tokens(self, term: str) -> dict[str, float]:
+        """Vocabulary tokens matching `term`, with their score."""
+        matches: dict[str, float] = {}
+        if len(term) >= FUZZY_MIN_LENGTH:
+            for variant in variants(term):
+                for token in self._variants.get(variant, ()):
+                    if token != term and one_typo_apart(term, token):
+                        matches[token] = FUZZY_SCORE * (1 - 1 / max(len(term), len(token)))
+        start = bisect.bisect_left(self._vocab, term)
+        for token in self._vocab[start:]:
+            if not token.startswith(term):
+                break
+            matches[token] = (
+                EXACT_SCORE if token == term else PREFIX_SCORE + (EXACT_SCORE - PREFIX_SCORE) * 0.8 * len(term) / len(token)
+            )
+        return matches
+
+
+class SearchIndexSync:
+    """Feeds a CustomerSearchIndex from the change feed on a background
+    thread: first every customer (the index is `ready` once caught up),
+    then whatever changed since, every `poll_seconds`."""
+
+    def __init__(
+        self,
+        index: CustomerSearchIndex,
+        sessions: Callable[[], Session] = SessionLocal,
+        poll_seconds: float = search_sync_seconds,
+        batch_size: int = search_sync_batch_size,
+    ):
+        self.index = index
+        self.sessions = sessions
+        self.poll_seconds = poll_seconds
+        self.batch_size = batch_size
+        self.cursor: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def sync_once(self) -> bool:
+        """Apply one page of changes; True if more are waiting."""
+        with self.sessions() as db:
+            page = CustomerRepository(db).changes_since(self.cursor, limit=self.batch_size)
+        # In feed order: a customer deleted and created again ends up indexed
+        upserts = []
+        for change in page.changes:
+            if change.type == "upsert":
+                c = change.customer
+                upserts.append((c.university_id, c.first_name, c.middle_name, c.last_name))
+                continue
+            self.index.put_many(upserts)
+            upserts = []
+            self.index.remove(change.university_id)
+        self.index.put_many(upserts)
+        self.cursor = page.next_cursor
+        if not page.has_more and not self.index.ready:
+            self.index.ready = True
+            logger.info("Customer search index loaded: %d customers", len(self.index))
+        return page.has_more
+
+    def _run(self) -> None:
+        backoff = self.poll_seconds
+        while not self._stop.is_set():
+            try:
+                if self.sync_once():
+                    continue
+                backoff = self.poll_seconds
+                self._stop.wait(self.poll_seconds)
+            except SQLAlchemyError as e:
+                logger.warning("Customer search sync failed, retrying in %.1fs: %s", backoff, e)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 60)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="customer-search-sync", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+customer_search = CustomerSearchIndex() if customer_search_enabled else None
@@ -0,0 +1,99 @@
+"""Request coalescing ("single flight") for identical concurrent lookups.
+
+While a lookup for a key is in flight, further callers for the same key wait
+for its result instead of running their own query. Nothing is cached: once
+the call finishes, the next caller starts a new one. Writes call `forget`
+so a lookup that started before the write committed isn't joined by
+callers that arrive after it.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+single_flight_enabled = os.environ.get("CUSTOMER_SINGLE_FLIGHT", "true").lower() in ("1", "true", "yes")
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Coalesces calls made from threads (the sync routes' threadpool)."""
+
+    def __init__(self):
+        self._calls: dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key: str, fn: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+
+    def forget(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._calls.pop(key, None)
+
+
+class AsyncSingleFlight:
+    """Coalesces calls made from coroutines on one event loop (the async routes)."""
+
+    def __init__(self):
+        self._calls: dict[str, asyncio.Future] = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            self.calls += 1
+            task.add_done_callback(lambda t: self._calls.pop(key, None) if self._calls.get(key) is t else None)
+        else:
+            self.shared += 1
+        # A cancelled waiter must not cancel the lookup the others wait on
+        return await asyncio.shield(task)
+
+    def forget(self, *keys: str) -> None:
+        for key in keys:
+            self._calls.pop(key, None)
+
+
+customer_flights = SingleFlight() if single_flight_enabled else None
+async_customer_flights = AsyncSingleFlight() if single_flight_enabled else None
@@ -0,0 +1,58 @@
+"""Canonical form and validation of customer keys (university_id, email).
+
+The patterns are shared by the pydantic models (checked in pydantic-core)
+and by the path-parameter checks here, which run before a request reaches
+the cache or the database. Both apply the same steps in the same order:
+strip surrounding whitespace, match the pattern, then case-fold (university
+IDs upper-case, emails lower-case). "uni1234" and " UNI1234 " are therefore
+one cache key and one row, as MySQL's case-insensitive collation already
+treats them.
+"""
+from __future__ import annotations
+
+import re
+from typing import Optional
+
+UNIVERSITY_ID_PATTERN = r"^[A-Za-z]{2,4}\d{3,4}$"
+EDU_EMAIL_PATTERN = r"^[\w\.-]+@[\w\.-]+\.edu$"
+
+# Longer values can't match; rejected before the regex runs
+UNIVERSITY_ID_MAX_LENGTH = 8
+EMAIL_MAX_LENGTH = 255
+
+_university_id_re = re.compile(UNIVERSITY_ID_PATTERN)
+_email_re = re.compile(EDU_EMAIL_PATTERN)
+
+
+class InvalidKey(ValueError):
+    pass
+
+
+def normalize_university_id(value: str) -> str:
+    """Canonical university ID; raises InvalidKey if `value` isn't one."""
+    value = value.strip()
+    if len(value) > UNIVERSITY_ID_MAX_LENGTH or _university_id_re.match(value) is None:
+        raise InvalidKey("Invalid university ID: expected 2-4 letters followed by 3-4 digits.")
+    return value.upper()
+
+
+def normalize_email(value: str) -> str:
+    """Canonical email; raises InvalidKey if `value` isn't a .edu address."""
+    value = value.strip()
+    if len(value) > EMAIL_MAX_LENGTH or _email_re.match(value) is None:
+        raise InvalidKey("Invalid email: must be a .edu address.")
+    return value.lower()
+
+
+def try_normalize_university_id(value: str) -> Optional[str]:
+    try:
+        return normalize_university_id(value)
+    except InvalidKey:
+        return None
+
+
+def try_normalize_email(value: str) -> Optional[str]:
+    try:
+        return normalize_email(value)
+    except InvalidKey:
+        return None